@@ -0,0 +1,29 @@
+from decimal import Decimal
+from typing import Union
+
+CENTAVOS_PER_REAL = 100
+
+# Amounts are stored as integer centavos. On the wire they are JSON numbers
+# in reais: centavos / 100 is the double nearest to the exact amount, and
+# orjson writes the shortest decimal that reads back as that double. For
+# amounts of up to 15 significant digits that decimal is the amount itself,
+# so the encoding is exact below MAX_EXACT_CENTAVOS.
+MAX_EXACT_CENTAVOS = 10**15
+
+
+def to_centavos(reais: Union[Decimal, float, int, str]) -> int:
+    """
+    Exact number of centavos in an amount in reais. Floats are read through
+    their shortest repr, so 0.1 is 10 centavos; amounts with fractions of a
+    centavo raise ValueError.
+    """
+    amount = Decimal(repr(reais)) if isinstance(reais, float) else Decimal(reais)
+    centavos = amount * CENTAVOS_PER_REAL
+    if centavos != centavos.to_integral_value():
+        raise ValueError("valor must not have more than 2 decimal places")
+    return int(centavos)
+
+
+def to_reais(centavos: int) -> float:
+    """Amount in reais of a number of centavos, as encoded on the wire"""
+    return centavos / CENTAVOS_PER_REAL
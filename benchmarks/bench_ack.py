@@ -0,0 +1,106 @@
+"""
+Stream acknowledgement cost: per-row ORM updates against one set-based UPDATE.
+
+Seeds a backlog of messages claimed by a single stream and acknowledges
+them the way `MessageProcessor.mark_messages_delivered` used to (load every
+undelivered message, flip `delivered`, flush one UPDATE per row) and the
+way it does now (`UPDATE ... WHERE stream_id = ? AND delivered = 0`).
+The backlog is reset between rounds. `executes` counts cursor executions;
+the ORM path sends its per-row UPDATEs as one executemany.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_ack --messages 10000 --rounds 3
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine
+from models.pix_message import MessageStream, PixMessage
+from utils.message_processor import MessageProcessor
+from utils.test_data_generator import create_test_messages
+
+STREAM_ID = "bench-stream"
+
+
+def orm_ack(stream_id, db):
+    messages = (
+        db.query(PixMessage)
+        .filter(PixMessage.stream_id == stream_id, PixMessage.delivered == False)
+        .all()
+    )
+    for message in messages:
+        message.delivered = True
+    stream = MessageStream.get_by_stream_id(db, stream_id)
+    if stream:
+        stream.is_active = False
+    db.commit()
+    return len(messages)
+
+
+def reset(session_factory):
+    db = session_factory()
+    try:
+        db.execute(update(PixMessage).values(stream_id=STREAM_ID, delivered=False))
+        db.execute(update(MessageStream).values(is_active=True))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = session_factory()
+        create_test_messages("12345678", args.messages, db)
+        db.add(MessageStream(stream_id=STREAM_ID, ispb="12345678"))
+        db.commit()
+        db.close()
+
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+        print(f"{args.messages} messages on one stream, {args.rounds} rounds")
+        print(f"{'path':>10} {'ms/ack':>9} {'executes':>9} {'acked':>7}")
+        for label, ack in (
+            ("orm", orm_ack),
+            ("set-based", MessageProcessor.mark_messages_delivered),
+        ):
+            elapsed = 0.0
+            for _ in range(args.rounds):
+                reset(session_factory)
+                db = session_factory()
+                try:
+                    statements.clear()
+                    start = time.perf_counter()
+                    acked = ack(STREAM_ID, db)
+                    elapsed += time.perf_counter() - start
+                finally:
+                    db.close()
+            print(
+                f"{label:>10} {elapsed / args.rounds * 1000:>9.1f} "
+                f"{len(statements):>9} {acked:>7}"
+            )
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Per-stream delivery throughput at different negotiated batch sizes.
+
+Seeds a backlog for one ISPB and drains it through the stream routes with a
+single consumer: start a stream with `Accept: multipart/json; batch=N`, then
+keep following Pull-Next (whose cursor acknowledges the previous batch)
+until every message has been received. The backlog is put back between
+runs. Larger batches amortise the per-request claim, acknowledgement and
+HTTP overhead over more messages. Pass `--ndjson` to receive the batches as
+streamed `application/x-ndjson` instead.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_batch_size --messages 5000 --sizes 1 10 100 1000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine, get_db
+from main import app
+from models.pix_message import MessageStream, PixMessage
+from utils.test_data_generator import create_test_messages
+
+ISPB = "12345678"
+
+
+def reset(session_factory):
+    db = session_factory()
+    try:
+        db.execute(
+            update(PixMessage).values(
+                stream_id=None, dispatched_at=None, delivered=False
+            )
+        )
+        db.execute(update(MessageStream).values(is_active=False))
+        db.commit()
+    finally:
+        db.close()
+
+
+def drain(client: TestClient, batch: int, total: int, media_type: str):
+    """Receive `total` messages on one stream; returns (requests, received)"""
+    headers = {"Accept": f"{media_type}; batch={batch}"}
+    url = f"/api/pix/{ISPB}/stream/start"
+    requests = received = 0
+    while received < total:
+        response = client.get(url, headers=headers)
+        requests += 1
+        if response.status_code == 200:
+            if media_type == "multipart/json":
+                received += len(response.json())
+            else:
+                received += len(response.content.splitlines())
+        url = response.headers["Pull-Next"]
+    # Acknowledge the last batch and close the stream
+    client.delete(url.split("?")[0])
+    return requests, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--ndjson", action="store_true")
+    args = parser.parse_args()
+    media_type = "application/x-ndjson" if args.ndjson else "multipart/json"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = session_factory()
+        create_test_messages(ISPB, args.messages, db)
+        db.close()
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            with TestClient(app) as client:
+                print(f"{args.messages} messages as {media_type}, one stream per run")
+                print(f"{'batch':>6} {'requests':>9} {'seconds':>8} {'msgs/s':>9}")
+                for batch in args.sizes:
+                    reset(session_factory)
+                    start = time.perf_counter()
+                    requests, received = drain(
+                        client, batch, args.messages, media_type
+                    )
+                    elapsed = time.perf_counter() - start
+                    print(
+                        f"{batch:>6} {requests:>9} {elapsed:>8.2f} "
+                        f"{received / elapsed:>9.0f}"
+                    )
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
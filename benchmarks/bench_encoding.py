@@ -0,0 +1,83 @@
+"""
+Microseconds per message to turn serialized messages into a response body.
+
+Compares the previous path (`dataHoraPagamento.isoformat()` per message and
+FastAPI's stdlib `JSONResponse`) with the current one (the datetime is kept
+and written by the orjson `MessageResponse`). Messages are serialized once,
+so only encoding is measured; both paths produce the same JSON document.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_encoding --rounds 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine
+from models.pix_message import PixMessage
+from utils.message_encoding import MessageResponse
+from utils.test_data_generator import create_test_messages
+
+
+def stdlib_body(messages):
+    content = [
+        {**message, "dataHoraPagamento": message["dataHoraPagamento"].isoformat()}
+        for message in messages
+    ]
+    return JSONResponse(content=content).body
+
+
+def orjson_body(messages):
+    return MessageResponse(content=messages).body
+
+
+def measure(fn, messages, rounds):
+    fn(messages)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(messages)
+    return (time.perf_counter() - start) / (rounds * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 1000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = session_factory()
+        create_test_messages("12345678", max(args.sizes), db)
+        ids = [row[0] for row in db.query(PixMessage.id)]
+        messages = PixMessage.serialize_by_ids(db, ids)
+        db.close()
+        engine.dispose()
+
+    assert json.loads(stdlib_body(messages)) == json.loads(orjson_body(messages))
+
+    print(f"{'batch':>6} {'stdlib us/msg':>14} {'orjson us/msg':>14} {'speedup':>8}")
+    for size in args.sizes:
+        batch = messages[:size]
+        # Keep the total work per size roughly constant
+        rounds = max(1, args.rounds * 10 // size)
+        stdlib = measure(stdlib_body, batch, rounds)
+        fast = measure(orjson_body, batch, rounds)
+        print(f"{size:>6} {stdlib:>14.2f} {fast:>14.2f} {stdlib / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Bulk ingest throughput of POST /api/pix/msgs into SQLite.
+
+Messages are generated up front and sent as NDJSON batches; only the
+requests are timed. Payers are drawn from a pool so account holders repeat
+across messages, as they do in real traffic. The database gets the
+application's connection pragmas (WAL, synchronous=NORMAL) from
+`database.create_db_engine`.
+
+With batches of 10k this measures about 6.5k messages/s when every message
+has a new receiver and about 10k messages/s with `--receivers 5000`, short
+of 20k messages/s. The time is per-item Python work rather than SQLite:
+with new receivers about a third goes to upserting account holders (an IN
+lookup plus INSERT ... RETURNING for ~10k new holders per batch), a quarter
+to pydantic validation and a quarter to SQLAlchemy's parameter processing
+for the message INSERT, whose RETURNING clause is what reports duplicates.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_ingest --messages 100000 --batch 10000
+    python -m benchmarks.bench_ingest --messages 100000 --receivers 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine, get_db
+from main import app
+from utils.test_data_generator import (
+    generate_random_account_holder,
+    generate_random_pix_message,
+)
+
+
+def build_batches(count, batch_size, receiver_ispbs, payer_pool, receiver_pool=0):
+    payers = [generate_random_account_holder() for _ in range(payer_pool)]
+    receivers = [
+        generate_random_account_holder(random.choice(receiver_ispbs))
+        for _ in range(receiver_pool)
+    ]
+    batches = []
+    for start in range(0, count, batch_size):
+        lines = []
+        for _ in range(min(batch_size, count - start)):
+            message = generate_random_pix_message(random.choice(receiver_ispbs))
+            message["pagador"] = random.choice(payers)
+            if receivers:
+                message["recebedor"] = random.choice(receivers)
+            message["dataHoraPagamento"] = message["dataHoraPagamento"].isoformat()
+            lines.append(json.dumps(message))
+        batches.append("\n".join(lines).encode())
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--ispbs", type=int, default=20)
+    parser.add_argument("--payers", type=int, default=5000)
+    parser.add_argument(
+        "--receivers",
+        type=int,
+        default=0,
+        help="size of the receiver pool; 0 gives every message a new receiver",
+    )
+    args = parser.parse_args()
+
+    receiver_ispbs = [f"{20000000 + n:08d}" for n in range(args.ispbs)]
+    print(f"Generating {args.messages} messages...")
+    batches = build_batches(
+        args.messages, args.batch, receiver_ispbs, args.payers, args.receivers
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+
+        accepted = 0
+        with TestClient(app) as client:
+            start = time.perf_counter()
+            for body in batches:
+                response = client.post(
+                    "/api/pix/msgs",
+                    content=body,
+                    headers={"Content-Type": "application/x-ndjson"},
+                )
+                response.raise_for_status()
+                accepted += response.json()["accepted"]
+            elapsed = time.perf_counter() - start
+
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+    print(
+        f"{accepted} messages in {elapsed:.2f}s: {accepted / elapsed:,.0f} messages/s "
+        f"(batches of {args.batch})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Concurrent long-poll throughput under SQLite write load.
+
+Runs the stream routes in-process through httpx's ASGI transport while a
+background thread keeps taking an exclusive write lock on the database. Each
+scenario is run twice: once with the database calls inline on the event loop
+(DB_EXECUTOR_WORKERS=0, the previous behaviour) and once on the bounded
+database executor. Alongside the consumers a probe hits `GET /`, which never
+touches the database, to show how long the event loop stays blocked.
+
+The database is created through `database.create_db_engine`, so it gets the
+same connection pragmas as the application; pass `--journal-mode DELETE` to
+compare against SQLite's rollback journal.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_long_poll_under_writes --consumers 24 --duration 5
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from httpx import AsyncClient
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import Base, create_db_engine, get_db
+from main import app
+from models.pix_message import MessageStream, PixMessage
+from utils.db_executor import configure_db_executor
+from utils.test_data_generator import create_test_messages
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed(
+    session_factory, ispbs: List[str], streams_per_ispb: int, backlog: int
+) -> List[tuple]:
+    """Create the streams used by the consumers and a backlog for each ISPB"""
+    streams = []
+    db = session_factory()
+    try:
+        for ispb in ispbs:
+            create_test_messages(ispb, backlog, db)
+            for n in range(streams_per_ispb):
+                stream_id = f"bench-{ispb}-{n}"
+                db.add(MessageStream(stream_id=stream_id, ispb=ispb))
+                streams.append((ispb, stream_id))
+            db.commit()
+    finally:
+        db.close()
+    return streams
+
+
+def release_backlog(session_factory):
+    """Put every claimed message back in the pool before the next run"""
+    db = session_factory()
+    try:
+        db.query(PixMessage).update(
+            {PixMessage.stream_id: None, PixMessage.dispatched_at: None},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def hold_write_lock(path: str, stop: threading.Event, hold: float, gap: float):
+    """Repeatedly hold an exclusive lock, simulating slow write transactions"""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    while not stop.is_set():
+        conn.execute("BEGIN EXCLUSIVE")
+        time.sleep(hold)
+        conn.execute("COMMIT")
+        time.sleep(gap)
+    conn.close()
+
+
+async def run_scenario(
+    streams: List[tuple], duration: float, db_path: str, hold: float, gap: float
+) -> Dict[str, float]:
+    poll_latencies: List[float] = []
+    probe_latencies: List[float] = []
+    deadline = time.monotonic() + duration
+
+    async with AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+
+        async def consumer(ispb: str, stream_id: str):
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                response = await client.get(
+                    f"/api/pix/{ispb}/stream/{stream_id}",
+                    headers={"Accept": "multipart/json"},
+                )
+                if response.status_code == 200:
+                    poll_latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            # Includes the time spent waiting for the loop to resume after the
+            # sleep, which is where a blocked event loop shows up
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - start - 0.01)
+
+        stop = threading.Event()
+        writer = threading.Thread(
+            target=hold_write_lock, args=(db_path, stop, hold, gap), daemon=True
+        )
+        writer.start()
+        started = time.monotonic()
+        try:
+            await asyncio.gather(probe(), *(consumer(i, s) for i, s in streams))
+        finally:
+            stop.set()
+            writer.join()
+        elapsed = time.monotonic() - started
+
+    return {
+        "polls_per_second": len(poll_latencies) / elapsed,
+        "poll_p50_ms": percentile(poll_latencies, 50) * 1000,
+        "poll_p99_ms": percentile(poll_latencies, 99) * 1000,
+        "probe_p50_ms": percentile(probe_latencies, 50) * 1000,
+        "probe_p99_ms": percentile(probe_latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--consumers", type=int, default=24)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--hold-ms", type=float, default=50.0)
+    parser.add_argument("--gap-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--backlog", type=int, default=1000, help="Messages seeded per ISPB"
+    )
+    parser.add_argument("--journal-mode", default=database.SQLITE_JOURNAL_MODE)
+    args = parser.parse_args()
+    database.SQLITE_JOURNAL_MODE = args.journal_mode
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        engine = create_db_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+
+        streams_per_ispb = 6
+        ispb_count = max(1, -(-args.consumers // streams_per_ispb))
+        ispbs = [f"{10000000 + n:08d}" for n in range(ispb_count)]
+        streams = seed(session_factory, ispbs, streams_per_ispb, args.backlog)
+        streams = streams[: args.consumers]
+
+        print(
+            f"{len(streams)} consumers, write lock held {args.hold_ms:.0f}ms "
+            f"every {args.hold_ms + args.gap_ms:.0f}ms, {args.duration:.0f}s per run, "
+            f"journal_mode={args.journal_mode}"
+        )
+        for label, workers in (("inline", 0), ("executor", args.workers)):
+            configure_db_executor(workers)
+            release_backlog(session_factory)
+            result = asyncio.run(
+                run_scenario(
+                    streams,
+                    args.duration,
+                    db_path,
+                    args.hold_ms / 1000,
+                    args.gap_ms / 1000,
+                )
+            )
+            print(
+                f"{label:>9}: {result['polls_per_second']:8.1f} polls/s  "
+                f"poll p50 {result['poll_p50_ms']:7.1f}ms p99 {result['poll_p99_ms']:7.1f}ms  "
+                f"probe p50 {result['probe_p50_ms']:6.1f}ms p99 {result['probe_p99_ms']:6.1f}ms"
+            )
+
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
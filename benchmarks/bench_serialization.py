@@ -0,0 +1,106 @@
+"""
+Queries per batch and microseconds per message for PixMessage serialization.
+
+Compares loading ORM objects and calling `PixMessage.to_dict`, which lazily
+loads `pagador` and `recebedor`, with `PixMessage.serialize_by_ids`, which
+reads the message columns in one query, takes both account holders from the
+holder document cache (querying the ones it misses) and builds the dicts
+from row tuples. Every batch uses a fresh session, as a request would.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_serialization --messages 2000 --rounds 20
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.pix_message import PixMessage
+from utils.test_data_generator import create_test_messages
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def orm_to_dict(db, ids):
+    messages = (
+        db.query(PixMessage)
+        .filter(PixMessage.id.in_(ids))
+        .order_by(PixMessage.dataHoraPagamento, PixMessage.id)
+        .all()
+    )
+    return [message.to_dict() for message in messages]
+
+
+def projection(db, ids):
+    return PixMessage.serialize_by_ids(db, ids)
+
+
+def measure(session_factory, counter, fn, all_ids, batch_size, rounds):
+    # Warm up the compiled statement cache so it is not charged to round one
+    db = session_factory()
+    fn(db, random.sample(all_ids, batch_size))
+    db.close()
+
+    queries = 0
+    elapsed = 0.0
+    for _ in range(rounds):
+        ids = random.sample(all_ids, batch_size)
+        db = session_factory()
+        try:
+            before = counter.count
+            start = time.perf_counter()
+            fn(db, ids)
+            elapsed += time.perf_counter() - start
+            queries += counter.count - before
+        finally:
+            db.close()
+    return queries / rounds, elapsed / (rounds * batch_size) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = session_factory()
+        create_test_messages("12345678", args.messages, db)
+        all_ids = [row[0] for row in db.query(PixMessage.id)]
+        db.close()
+
+        counter = QueryCounter(engine)
+        print(f"{'batch':>6} {'path':>10} {'queries/batch':>14} {'us/message':>11}")
+        for batch_size in (1, 10, 100):
+            for label, fn in (("to_dict", orm_to_dict), ("projection", projection)):
+                queries, micros = measure(
+                    session_factory, counter, fn, all_ids, batch_size, args.rounds
+                )
+                print(f"{batch_size:>6} {label:>10} {queries:>14.1f} {micros:>11.1f}")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
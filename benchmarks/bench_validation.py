@@ -0,0 +1,89 @@
+"""
+CPF/CNPJ validation throughput: validate_docbr against validators.py.
+
+Validates the same mix of CPFs and CNPJs, about a third of them with a
+corrupted check digit, with:
+
+- validate_docbr, building a validator per call as create_or_update used to
+- validators.is_valid_document with a cold cache, then again over as many
+  documents as the cache holds (DOCUMENT_CACHE_SIZE) so every call hits
+- validators.validate_documents, the NumPy batch validator
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_validation --documents 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from validate_docbr import CPF, CNPJ
+
+from validators import DOCUMENT_CACHE_SIZE, is_valid_document, validate_documents
+
+
+def build_documents(count):
+    documents = CPF().generate_list(count * 7 // 10, repeat=True)
+    documents += CNPJ().generate_list(count - len(documents), repeat=True)
+    for i in random.sample(range(count), count // 3):
+        last = (int(documents[i][-1]) + random.randint(1, 9)) % 10
+        documents[i] = documents[i][:-1] + str(last)
+    random.shuffle(documents)
+    return documents
+
+
+def validate_docbr(documents):
+    return [
+        CPF().validate(document) if len(document) == 11 else CNPJ().validate(document)
+        for document in documents
+    ]
+
+
+def memoized(documents):
+    return [is_valid_document(document) for document in documents]
+
+
+def batch(documents):
+    return validate_documents(documents).tolist()
+
+
+def timed(fn, documents):
+    start = time.perf_counter()
+    result = fn(documents)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=100000)
+    args = parser.parse_args()
+
+    documents = build_documents(args.documents)
+    expected, baseline = timed(validate_docbr, documents)
+
+    hot = documents[-DOCUMENT_CACHE_SIZE:]
+
+    is_valid_document.cache_clear()
+    runs = [("validate_docbr", documents, expected, baseline)]
+    runs.append(("memoized, cold", documents, *timed(memoized, documents)))
+    runs.append(("memoized, warm", hot, *timed(memoized, hot)))
+    runs.append(("numpy batch", documents, *timed(batch, documents)))
+
+    baseline_rate = len(documents) / baseline
+    print(f"{'validator':>15} {'documents':>10} {'seconds':>8} {'docs/s':>12} {'speedup':>8}")
+    for label, checked, result, elapsed in runs:
+        assert result == expected[-len(checked) :], f"{label} disagrees with validate_docbr"
+        rate = len(checked) / elapsed
+        print(
+            f"{label:>15} {len(checked):>10} {elapsed:>8.3f} {rate:>12,.0f} "
+            f"{rate / baseline_rate:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
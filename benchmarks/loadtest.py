@@ -0,0 +1,262 @@
+"""
+End-to-end load test of the stream API served by uvicorn over SQLite.
+
+Seeds a fresh SQLite database with N messages spread over K receiver ISPBs
+(with `utils.bulk_data_generator`), starts the application with uvicorn in
+a subprocess and drives M concurrent consumers over real HTTP. Each consumer
+starts a stream and follows Pull-Next (whose cursor acknowledges the
+previous batch) until the whole backlog has been delivered or the time
+limit is reached; the streams are then closed with DELETE.
+
+Reported: delivery throughput, p50/p99 request latency, database statements
+per delivered message (from the `pix_db_query_seconds_count` series of
+/metrics, so the background tasks are included) and the server's resident
+memory. Results are written as JSON; pass `--baseline` with the file of an
+earlier run (another commit) to print the relative change.
+
+Usage (from the repository root):
+
+    python -m benchmarks.loadtest --messages 1000000 --consumers 24 --ispbs 4 \\
+        --output loadtest-results.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import httpx
+from sqlalchemy.orm import Session
+
+from database import Base, create_db_engine
+from models.pix_message import MessageStream
+from utils.bulk_data_generator import insert_messages
+
+_QUERY_COUNT = re.compile(r'^pix_db_query_seconds_count\{statement="[^"]*"\} (\d+)', re.M)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def server_memory(pid: int) -> Dict[str, Optional[int]]:
+    """Current and peak resident set size of a process, in KiB (Linux only)"""
+    memory = {"rss_kib": None, "peak_rss_kib": None}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    memory["rss_kib"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    memory["peak_rss_kib"] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+async def query_count(client: httpx.AsyncClient) -> int:
+    response = await client.get("/metrics")
+    return sum(int(count) for count in _QUERY_COUNT.findall(response.text))
+
+
+async def consume(client, ispb, batch, state, latencies, streams):
+    headers = {"Accept": f"multipart/json; batch={batch}"}
+    url = f"/api/pix/{ispb}/stream/start"
+    while True:
+        started = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code == 429:
+            raise RuntimeError(f"Stream limit reached for ISPB {ispb}")
+        url = response.headers["Pull-Next"]
+        streams.add(url.split("?")[0])
+        if response.status_code == 200:
+            received = len(response.json())
+            state["delivered"] += received
+            if state["delivered"] >= state["total"]:
+                state["done"].set()
+
+
+async def run_consumers(base_url, args, ispbs):
+    latencies: List[float] = []
+    streams = set()
+    delivered = {"delivered": 0, "total": args.messages, "done": asyncio.Event()}
+    limits = httpx.Limits(max_connections=args.consumers + 4)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=60, limits=limits
+    ) as client:
+        queries_before = await query_count(client)
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(
+                consume(
+                    client,
+                    ispbs[n % len(ispbs)],
+                    args.batch,
+                    delivered,
+                    latencies,
+                    streams,
+                )
+            )
+            for n in range(args.consumers)
+        ]
+        done_wait = asyncio.create_task(delivered["done"].wait())
+        finished, _ = await asyncio.wait(
+            tasks + [done_wait],
+            timeout=args.duration,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        elapsed = time.perf_counter() - started
+        for task in tasks + [done_wait]:
+            task.cancel()
+        await asyncio.gather(*tasks, done_wait, return_exceptions=True)
+        for task in finished:
+            if task is not done_wait and task.exception():
+                raise task.exception()
+
+        # Acknowledge the last batches and close the streams
+        await asyncio.gather(*(client.delete(stream) for stream in streams))
+        queries = await query_count(client) - queries_before
+
+    return delivered["delivered"], elapsed, latencies, queries
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results: Dict, baseline: Dict) -> None:
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'}:")
+    for key in ("messages_per_second", "p50_ms", "p99_ms", "queries_per_message"):
+        old, new = baseline["results"].get(key), results["results"].get(key)
+        if old:
+            print(f"  {key:>22}: {old:>10.3f} -> {new:>10.3f} ({new / old - 1:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--consumers", type=int, default=12)
+    parser.add_argument("--ispbs", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--payers", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=600)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    if args.consumers > args.ispbs * MessageStream.MAX_ACTIVE_PER_ISPB:
+        parser.error(
+            f"at most {MessageStream.MAX_ACTIVE_PER_ISPB} consumers per ISPB "
+            f"({args.ispbs * MessageStream.MAX_ACTIVE_PER_ISPB} for {args.ispbs} ISPBs)"
+        )
+
+    ispbs = [f"{30000000 + n:08d}" for n in range(args.ispbs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'loadtest.db')}"
+        engine = create_db_engine(url)
+        Base.metadata.create_all(bind=engine)
+        print(f"Seeding {args.messages} messages over {args.ispbs} ISPBs...")
+        started = time.perf_counter()
+        with Session(engine) as session:
+            for _ in insert_messages(session, args.messages, ispbs, args.payers):
+                pass
+        seed_seconds = time.perf_counter() - started
+        engine.dispose()
+        print(f"Seeded in {seed_seconds:.1f}s")
+
+        base_url = f"http://127.0.0.1:{args.port}"
+        env = {**os.environ, "SQLALCHEMY_DATABASE_URL": url}
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "main:app",
+                "--port",
+                str(args.port),
+                "--log-level",
+                "warning",
+            ],
+            cwd=ROOT,
+            env=env,
+        )
+        try:
+            wait_for_server(base_url, process)
+            delivered, elapsed, latencies, queries = asyncio.run(
+                run_consumers(base_url, args, ispbs)
+            )
+            memory = server_memory(process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "params": vars(args),
+        "results": {
+            "seed_seconds": round(seed_seconds, 3),
+            "delivered": delivered,
+            "seconds": round(elapsed, 3),
+            "messages_per_second": round(delivered / elapsed, 1),
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "queries_per_message": round(queries / delivered, 4) if delivered else None,
+            **memory,
+        },
+    }
+    for key, value in results["results"].items():
+        print(f"{key:>22}: {value}")
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            print_comparison(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
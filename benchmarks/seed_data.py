@@ -0,0 +1,70 @@
+"""
+Seed a benchmark database, or CSV files, with the bulk message generator.
+
+Messages are generated as columnar NumPy batches by
+`utils.bulk_data_generator` and either inserted into the database at
+`--database-url` (tables are created when missing) or, with `--csv DIR`,
+written as account_holders.csv and pix_messages.csv for a bulk loader such
+as Postgres COPY. Reports rows per second.
+
+Usage (from the repository root):
+
+    python -m benchmarks.seed_data --messages 10000000 --ispbs 4 \\
+        --database-url sqlite:///./bench.db
+    python -m benchmarks.seed_data --messages 10000000 --csv ./seed
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy.orm import Session
+
+from database import Base, create_db_engine
+from utils.bulk_data_generator import BULK_CHUNK_SIZE, insert_messages, write_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--ispbs", type=int, default=4)
+    parser.add_argument("--payers", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--database-url")
+    target.add_argument("--csv", metavar="DIR")
+    args = parser.parse_args()
+
+    ispbs = [f"{30000000 + n:08d}" for n in range(args.ispbs)]
+    options = dict(payers=args.payers, chunk_size=args.chunk_size, seed=args.seed)
+    started = time.perf_counter()
+
+    if args.csv:
+        os.makedirs(args.csv, exist_ok=True)
+        paths = write_csv(args.csv, args.messages, ispbs, **options)
+        print(f"Wrote {', '.join(paths)}")
+    else:
+        engine = create_db_engine(args.database_url)
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as session:
+            inserted = 0
+            for size in insert_messages(session, args.messages, ispbs, **options):
+                inserted += size
+                elapsed = time.perf_counter() - started
+                print(f"\r{inserted} messages, {inserted / elapsed:,.0f}/s", end="")
+            print()
+        engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"{args.messages} messages over {args.ispbs} ISPBs in {elapsed:.1f}s "
+        f"({args.messages / elapsed:,.0f} messages/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
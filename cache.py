@@ -0,0 +1,171 @@
+import functools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe mapping bounded to `maxsize` entries that evicts the least
+    recently used entry when full. Keeps hit/miss counters.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class ByteCache(LRUCache):
+    """
+    LRUCache of bytes values bounded by their total length, `maxbytes`,
+    rather than by the number of entries. Values larger than the bound are
+    not cached.
+    """
+
+    def __init__(self, maxbytes: int):
+        super().__init__(maxbytes)
+        self.nbytes = 0
+
+    def put(self, key, value):
+        if len(value) > self.maxsize:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self._data[key] = value
+            self.nbytes += len(value)
+            while self.nbytes > self.maxsize:
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value = self._data.pop(key, None)
+            if value is None:
+                return default
+            self.nbytes -= len(value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+class TTLCache(LRUCache):
+    """
+    LRUCache whose entries also expire `ttl` seconds after they are put.
+    Expired entries count as misses and are dropped when looked up.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires < time.monotonic():
+            with self._lock:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+                self.hits -= 1
+                self.misses += 1
+            return default
+        return value
+
+    def put(self, key, value):
+        super().put(key, (time.monotonic() + self.ttl, value))
+
+    def pop(self, key, default=None):
+        entry = super().pop(key)
+        return default if entry is None else entry[1]
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+
+class _PerEngine:
+    def __init__(self, factory):
+        functools.update_wrapper(self, factory)
+        self._factory = factory
+        self._instances = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def __call__(self, bind):
+        engine = bind.engine
+        with self._lock:
+            instance = self._instances.get(engine)
+            if instance is None:
+                instance = self._instances[engine] = self._factory()
+            return instance
+
+    def items(self):
+        """Every engine that has an instance, with its instance"""
+        with self._lock:
+            return list(self._instances.items())
+
+    def clear(self):
+        """Forget every instance; the next call for an engine builds a new one"""
+        with self._lock:
+            self._instances.clear()
+
+
+def per_engine(factory):
+    """
+    Turn `factory`, which builds a new object, into a getter of one object
+    per database: `getter(bind)` returns the object of the bind's engine,
+    building it on first use. Objects are dropped with their engine.
+    """
+    return _PerEngine(factory)
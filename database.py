@@ -1,13 +1,87 @@
-from sqlalchemy import create_engine
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+MIGRATIONS_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "migrations"
 )
 
+SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL", "sqlite:///./app.db")
+
+# Pooling; the defaults leave room for every database executor worker
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# SQLite tuning, applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Connect hook for SQLite. WAL lets the long-polling readers run while a
+    writer commits, and synchronous=NORMAL is durable in WAL mode except
+    for the last transactions before a power loss.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # A negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def create_db_engine(url=SQLALCHEMY_DATABASE_URL, **kwargs):
+    """
+    Create an engine configured from the environment. SQLite file databases
+    get the connect hook above; in-memory SQLite keeps SQLAlchemy's default
+    single-connection pooling.
+    """
+    url = make_url(url)
+
+    if url.get_backend_name() != "sqlite":
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+        options.update(kwargs)
+        return create_engine(url, **options)
+
+    options = {"connect_args": {"check_same_thread": False}}
+    in_memory = url.database in (None, "", ":memory:")
+    if not in_memory:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    options.update(kwargs)
+
+    engine = create_engine(url, **options)
+    if not in_memory:
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -18,3 +92,40 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def upsert_insert(session, table):
+    """
+    INSERT construct for the session's dialect that supports ON CONFLICT
+    clauses (Postgres and SQLite)
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def upgrade_database(bind) -> None:
+    """
+    Apply the pending migrations to the bind's database, creating it from
+    scratch when it is empty.
+
+    Databases created by `create_all` before migrations existed have the
+    tables but no alembic_version; they are stamped with the baseline
+    revision first. Unversioned databases with any later schema cannot be
+    placed automatically and must be stamped by hand (see the README).
+    """
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIRECTORY)
+    with bind.engine.begin() as connection:
+        config.attributes["connection"] = connection
+        inspector = inspect(connection)
+        tables = inspector.get_table_names()
+        if "pix_messages" in tables and "alembic_version" not in tables:
+            columns = {c["name"] for c in inspector.get_columns("pix_messages")}
+            if "dispatched_at" in columns:
+                raise RuntimeError(
+                    "The database has no migration version and is newer than the "
+                    "baseline schema; stamp it with `alembic stamp <revision>`"
+                )
+            command.stamp(config, "0001")
+        command.upgrade(config, "head")
@@ -1,18 +1,26 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager, suppress
 
 import uvicorn
 from dotenv import load_dotenv
+
+# Load environment variables before the modules that read them on import
+load_dotenv()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from database import Base, engine
-from routes import message_routes, utility_routes
+from database import engine, upgrade_database
+from routes import ingest_routes, message_routes, metrics_routes, utility_routes
+from utils.db_executor import shutdown_db_executor
+from utils.generation_jobs import generation_jobs
+from utils.metrics import instrument_engine
+from utils.stream_reaper import run_stream_reaper
+from utils.stream_registry import run_activity_writeback, stream_registry
 
-# Create all tables if they don't exist
-Base.metadata.create_all(bind=engine)
-
-# Load environment variables
-load_dotenv()
+# Create the database or bring it to the current schema
+upgrade_database(engine)
 
 # Define API tags metadata
 tags_metadata = [
@@ -20,12 +28,44 @@ tags_metadata = [
         "name": "PIX Messages",
         "description": "Operations for retrieving PIX messages with long polling support",
     },
+    {
+        "name": "Ingest",
+        "description": "Bulk ingestion of PIX messages",
+    },
+    {
+        "name": "Monitoring",
+        "description": "Prometheus metrics of the stream pipeline",
+    },
     {
         "name": "Utilities",
         "description": "Utility operations for testing and administration",
     },
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup and shutdown hooks
+    """
+    # Registering the engine makes the background tasks cover it from the
+    # start, not only after its first stream request
+    stream_registry(engine)
+    instrument_engine(engine)
+    tasks = [
+        asyncio.create_task(run_activity_writeback()),
+        asyncio.create_task(run_stream_reaper()),
+    ]
+    yield
+    await generation_jobs.shutdown()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    shutdown_db_executor()
+
+
 app = FastAPI(
     title="PIX Message Collection API",
     description="""
@@ -36,6 +76,7 @@ app = FastAPI(
     * Long polling support for efficient message retrieval
     * Stream-based message delivery to ensure all messages are processed
     * Support for both single and multiple message retrieval
+    * Bulk ingestion of PIX messages (JSON array or NDJSON)
     * Test utilities for generating sample messages
     """,
     version="1.0.0",
@@ -48,6 +89,7 @@ app = FastAPI(
         "url": "https://www.placeholder.com/support",
     },
     swagger_ui_parameters={"defaultModelsExpandDepth": -1},
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -60,6 +102,8 @@ app.add_middleware(
 
 # Include routers
 app.include_router(message_routes.router, tags=["PIX Messages"])
+app.include_router(ingest_routes.router, tags=["Ingest"])
+app.include_router(metrics_routes.router, tags=["Monitoring"])
 app.include_router(utility_routes.router, prefix="/api", tags=["Utilities"])
 
 
@@ -0,0 +1,88 @@
+"""Baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 00:00:00.000000
+
+Schema created by `Base.metadata.create_all` before migrations were
+introduced. Existing databases should be stamped with this revision
+(`alembic stamp 0001`) and then upgraded.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "account_holders",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("nome", sa.String(), nullable=False),
+        sa.Column("cpfCnpj", sa.String(), nullable=False),
+        sa.Column("ispb", sa.String(), nullable=False),
+        sa.Column("agencia", sa.String(), nullable=False),
+        sa.Column("contaTransacional", sa.String(), nullable=False),
+        sa.Column("tipoConta", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_account_holders_cpfCnpj", "account_holders", ["cpfCnpj"])
+    op.create_index("ix_account_holders_id", "account_holders", ["id"])
+    op.create_index("ix_account_holders_ispb", "account_holders", ["ispb"])
+
+    op.create_table(
+        "message_streams",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("stream_id", sa.String(), nullable=False),
+        sa.Column("ispb", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("last_active", sa.DateTime(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("stream_id", name="uix_stream_id"),
+    )
+    op.create_index("ix_message_streams_id", "message_streams", ["id"])
+    op.create_index("ix_message_streams_ispb", "message_streams", ["ispb"])
+    op.create_index(
+        "ix_message_streams_stream_id", "message_streams", ["stream_id"], unique=True
+    )
+
+    op.create_table(
+        "pix_messages",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("endToEndId", sa.String(), nullable=False),
+        sa.Column("valor", sa.Float(), nullable=False),
+        sa.Column("payer_id", sa.Integer(), nullable=False),
+        sa.Column("receiver_id", sa.Integer(), nullable=False),
+        sa.Column("campoLivre", sa.Text(), nullable=True),
+        sa.Column("txId", sa.String(), nullable=False),
+        sa.Column("dataHoraPagamento", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("delivered", sa.Boolean(), nullable=True),
+        sa.Column("stream_id", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["payer_id"], ["account_holders.id"]),
+        sa.ForeignKeyConstraint(["receiver_id"], ["account_holders.id"]),
+        sa.ForeignKeyConstraint(["stream_id"], ["message_streams.stream_id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("endToEndId", "stream_id", name="uix_message_stream"),
+    )
+    op.create_index(
+        "ix_pix_messages_endToEndId", "pix_messages", ["endToEndId"], unique=True
+    )
+    op.create_index("ix_pix_messages_id", "pix_messages", ["id"])
+    op.create_index("ix_pix_messages_stream_id", "pix_messages", ["stream_id"])
+    op.create_index("ix_pix_messages_txId", "pix_messages", ["txId"])
+
+
+def downgrade() -> None:
+    op.drop_table("pix_messages")
+    op.drop_table("message_streams")
+    op.drop_table("account_holders")
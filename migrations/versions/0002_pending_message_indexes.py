@@ -0,0 +1,48 @@
+"""Dispatch tracking and partial indexes for pending messages
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:00.000000
+
+Adds pix_messages.dispatched_at, used when claiming messages for a stream,
+and partial indexes serving the per-stream undelivered query and the
+per-receiver claim query without touching delivered rows.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.add_column(sa.Column("dispatched_at", sa.DateTime(), nullable=True))
+
+    op.create_index(
+        "ix_pix_messages_stream_undelivered",
+        "pix_messages",
+        ["stream_id", "dataHoraPagamento"],
+        sqlite_where=sa.text("delivered = 0"),
+        postgresql_where=sa.text("delivered = false"),
+    )
+    op.create_index(
+        "ix_pix_messages_receiver_pending",
+        "pix_messages",
+        ["receiver_id", "dataHoraPagamento"],
+        sqlite_where=sa.text("delivered = 0 AND dispatched_at IS NULL"),
+        postgresql_where=sa.text("delivered = false AND dispatched_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pix_messages_receiver_pending", table_name="pix_messages")
+    op.drop_index("ix_pix_messages_stream_undelivered", table_name="pix_messages")
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.drop_column("dispatched_at")
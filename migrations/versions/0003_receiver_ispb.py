@@ -0,0 +1,62 @@
+"""Denormalize the receiver ISPB onto pix_messages
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:00.000000
+
+Adds pix_messages.receiver_ispb, backfilled from account_holders, and
+replaces the pending-message index on receiver_id with one on
+receiver_ispb so claims no longer join account_holders.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index("ix_pix_messages_receiver_pending", table_name="pix_messages")
+
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.add_column(sa.Column("receiver_ispb", sa.String(), nullable=True))
+
+    op.execute(
+        "UPDATE pix_messages SET receiver_ispb = ("
+        "SELECT account_holders.ispb FROM account_holders "
+        "WHERE account_holders.id = pix_messages.receiver_id)"
+    )
+
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.alter_column(
+            "receiver_ispb", existing_type=sa.String(), nullable=False
+        )
+
+    op.create_index(
+        "ix_pix_messages_ispb_pending",
+        "pix_messages",
+        ["receiver_ispb", "dataHoraPagamento"],
+        sqlite_where=sa.text("delivered = 0 AND dispatched_at IS NULL"),
+        postgresql_where=sa.text("delivered = false AND dispatched_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pix_messages_ispb_pending", table_name="pix_messages")
+
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.drop_column("receiver_ispb")
+
+    op.create_index(
+        "ix_pix_messages_receiver_pending",
+        "pix_messages",
+        ["receiver_id", "dataHoraPagamento"],
+        sqlite_where=sa.text("delivered = 0 AND dispatched_at IS NULL"),
+        postgresql_where=sa.text("delivered = false AND dispatched_at IS NULL"),
+    )
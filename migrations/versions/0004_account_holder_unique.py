@@ -0,0 +1,55 @@
+"""Unique account holder per document and ISPB
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 00:00:00.000000
+
+AccountHolder.create_or_update already treats (cpfCnpj, ispb) as the
+identity of a holder; the constraint lets bulk ingest upsert holders with
+INSERT ... ON CONFLICT. Duplicates left behind by earlier bulk ingests are
+merged into the oldest row first, with their messages repointed to it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Each duplicated holder with the oldest (lowest) id sharing its document and ISPB
+DUPLICATE_HOLDERS = (
+    "SELECT duplicate.id AS id, MIN(survivor.id) AS survivor_id "
+    "FROM account_holders AS duplicate JOIN account_holders AS survivor "
+    'ON survivor."cpfCnpj" = duplicate."cpfCnpj" AND survivor.ispb = duplicate.ispb '
+    "AND survivor.id < duplicate.id "
+    "GROUP BY duplicate.id"
+)
+
+
+def upgrade() -> None:
+    for column in ("payer_id", "receiver_id"):
+        op.execute(
+            f"UPDATE pix_messages SET {column} = ("
+            f"SELECT survivor_id FROM ({DUPLICATE_HOLDERS}) AS duplicates "
+            f"WHERE duplicates.id = pix_messages.{column}) "
+            f"WHERE {column} IN (SELECT id FROM ({DUPLICATE_HOLDERS}) AS duplicates)"
+        )
+    op.execute(
+        "DELETE FROM account_holders "
+        f"WHERE id IN (SELECT id FROM ({DUPLICATE_HOLDERS}) AS duplicates)"
+    )
+
+    with op.batch_alter_table("account_holders") as batch_op:
+        batch_op.create_unique_constraint(
+            "uix_account_holder_document_ispb", ["cpfCnpj", "ispb"]
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("account_holders") as batch_op:
+        batch_op.drop_constraint("uix_account_holder_document_ispb", type_="unique")
@@ -0,0 +1,36 @@
+"""Partial index for finding idle streams
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 00:00:00.000000
+
+Indexes message_streams.last_active over active streams only, so the
+stream reaper's UPDATE touches the idle streams and nothing else.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_message_streams_active_last_active",
+        "message_streams",
+        ["last_active"],
+        sqlite_where=sa.text("is_active = 1"),
+        postgresql_where=sa.text("is_active = true"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_message_streams_active_last_active", table_name="message_streams"
+    )
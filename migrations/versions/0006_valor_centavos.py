@@ -0,0 +1,57 @@
+"""Store message amounts as integer centavos
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00.000000
+
+Replaces the floating point pix_messages.valor (reais) with the BIGINT
+valor_centavos, backfilled by rounding valor * 100, and adds the covering
+index used by the per-ISPB totals.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.add_column(
+            sa.Column("valor_centavos", sa.BigInteger(), nullable=True)
+        )
+
+    op.execute(
+        "UPDATE pix_messages SET valor_centavos = CAST(ROUND(valor * 100) AS BIGINT)"
+    )
+
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.alter_column(
+            "valor_centavos", existing_type=sa.BigInteger(), nullable=False
+        )
+        batch_op.drop_column("valor")
+
+    op.create_index(
+        "ix_pix_messages_paid_at_totals",
+        "pix_messages",
+        ["dataHoraPagamento", "receiver_ispb", "valor_centavos"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pix_messages_paid_at_totals", table_name="pix_messages")
+
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.add_column(sa.Column("valor", sa.Float(), nullable=True))
+
+    op.execute("UPDATE pix_messages SET valor = valor_centavos / 100.0")
+
+    with op.batch_alter_table("pix_messages") as batch_op:
+        batch_op.alter_column("valor", existing_type=sa.Float(), nullable=False)
+        batch_op.drop_column("valor_centavos")
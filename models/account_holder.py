@@ -1,10 +1,77 @@
 import datetime
+import os
 
-from sqlalchemy import Column, Integer, String, DateTime
-from sqlalchemy.orm import relationship
-from validate_docbr import CPF, CNPJ
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    UniqueConstraint,
+    event,
+    select,
+)
+from sqlalchemy.orm import Session, relationship
 
-from database import Base
+from cache import LRUCache, TTLCache, per_engine
+from database import Base, upsert_insert
+import validators
+
+HOLDER_ID_CACHE_SIZE = int(os.getenv("HOLDER_ID_CACHE_SIZE", 100000))
+HOLDER_DOCUMENT_CACHE_SIZE = int(os.getenv("HOLDER_DOCUMENT_CACHE_SIZE", 20000))
+HOLDER_DOCUMENT_CACHE_TTL = float(os.getenv("HOLDER_DOCUMENT_CACHE_TTL", 300))
+
+# Recently written holders per engine: (cpfCnpj, ispb) -> (id, mutable fields).
+# Entries are staged in session.info and only published once the session
+# commits, so a rolled back transaction never leaves ids behind.
+_PENDING_KEY = "account_holder_ids"
+
+# Serialized pagador/recebedor sub-documents per engine: id -> dict. Entries
+# of holders written in a session are dropped when it writes them and again
+# once it commits; the TTL bounds how long a document read concurrently with
+# an update can stay stale.
+_STALE_KEY = "account_holder_documents"
+
+
+@per_engine
+def holder_id_cache():
+    """LRU of recently written account holder ids for the bind's engine"""
+    return LRUCache(HOLDER_ID_CACHE_SIZE)
+
+
+@per_engine
+def holder_document_cache():
+    """LRU+TTL cache of serialized account holders for the bind's engine"""
+    return TTLCache(HOLDER_DOCUMENT_CACHE_SIZE, HOLDER_DOCUMENT_CACHE_TTL)
+
+
+def _invalidate_documents(session, holder_ids):
+    cache = holder_document_cache(session.get_bind())
+    stale = session.info.setdefault(_STALE_KEY, set())
+    for holder_id in holder_ids:
+        cache.pop(holder_id)
+        stale.add(holder_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_holder_ids(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        cache = holder_id_cache(session.get_bind())
+        for key, value in pending.items():
+            cache.put(key, value)
+
+    stale = session.info.pop(_STALE_KEY, None)
+    if stale:
+        cache = holder_document_cache(session.get_bind())
+        for holder_id in stale:
+            cache.pop(holder_id)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_holder_ids(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+        session.info.pop(_STALE_KEY, None)
 
 
 class AccountHolder(Base):
@@ -28,6 +95,13 @@ class AccountHolder(Base):
         "PixMessage", foreign_keys="PixMessage.receiver_id", back_populates="recebedor"
     )
 
+    __table_args__ = (
+        UniqueConstraint("cpfCnpj", "ispb", name="uix_account_holder_document_ispb"),
+    )
+
+    FIELDS = ("nome", "cpfCnpj", "ispb", "agencia", "contaTransacional", "tipoConta")
+    MUTABLE_FIELDS = ("nome", "agencia", "contaTransacional", "tipoConta")
+
     def __repr__(self):
         return f"<AccountHolder(nome='{self.nome}', cpfCnpj='{self.cpfCnpj}', ispb='{self.ispb}')>"
 
@@ -38,19 +112,19 @@ class AccountHolder(Base):
             session.query(cls).filter(cls.cpfCnpj == cpfCnpj, cls.ispb == ispb).first()
         )
 
+    @staticmethod
+    def validate_cpfCnpj(cpfCnpj):
+        """Raise ValueError unless cpfCnpj is a valid CPF or CNPJ"""
+        validators.validate_document(cpfCnpj)
+
     @classmethod
     def create_or_update(cls, session, account_data):
         """Create a new account holder or update if exists"""
 
-        cpfCnpj = account_data["cpfCnpj"]
-        if len(cpfCnpj) == 11:
-            if not CPF().validate(cpfCnpj):
-                raise ValueError("Invalid CPF")
-        elif len(cpfCnpj) == 14:
-            if not CNPJ().validate(cpfCnpj):
-                raise ValueError("Invalid CNPJ")
-        else:
-            raise ValueError("cpfCnpj must be either 11 (CPF) or 14 (CNPJ) digits")
+        cls.validate_cpfCnpj(account_data["cpfCnpj"])
+        holder_id_cache(session.get_bind()).pop(
+            (account_data["cpfCnpj"], account_data["ispb"])
+        )
 
         account = cls.get_by_cpfCnpj_and_ispb(
             session, account_data["cpfCnpj"], account_data["ispb"]
@@ -62,11 +136,120 @@ class AccountHolder(Base):
         else:
             for key, value in account_data.items():
                 setattr(account, key, value)
+            _invalidate_documents(session, [account.id])
 
         return account
 
+    @classmethod
+    def bulk_create_or_update(cls, session, holders, chunk_size=500):
+        """
+        Create or update many account holders and return their ids keyed by
+        (cpfCnpj, ispb). Holders must already be validated; when the same
+        holder appears more than once, the last occurrence wins.
+
+        Holders recently written with the same data are answered from an
+        in-memory LRU. The rest are looked up with one IN query per chunk,
+        and only new or changed holders are written, with
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING.
+        """
+        unique = {}
+        for holder in holders:
+            unique[(holder["cpfCnpj"], holder["ispb"])] = {
+                field: holder[field] for field in cls.FIELDS
+            }
+
+        cache = holder_id_cache(session.get_bind())
+        ids = {}
+        unresolved = []
+        for key, row in unique.items():
+            cached = cache.get(key)
+            if cached is not None and cached[1] == cls._mutable_values(row):
+                ids[key] = cached[0]
+            else:
+                unresolved.append(key)
+
+        staged = session.info.setdefault(_PENDING_KEY, {})
+        connection = session.connection()
+        columns = [cls.__table__.c[field] for field in cls.MUTABLE_FIELDS]
+        lookup = select(cls.__table__.c.id, cls.cpfCnpj, cls.ispb, *columns)
+        to_write = []
+        for start in range(0, len(unresolved), chunk_size):
+            keys = unresolved[start : start + chunk_size]
+            # Filtering on cpfCnpj alone keeps the lookup on the unique index;
+            # SQLite scans the table for row-value IN lists
+            existing = {}
+            for holder_id, cpfCnpj, ispb, *values in connection.execute(
+                lookup.where(cls.cpfCnpj.in_({cpfCnpj for cpfCnpj, _ in keys}))
+            ):
+                existing[(cpfCnpj, ispb)] = (holder_id, tuple(values))
+            for key in keys:
+                values = cls._mutable_values(unique[key])
+                found = existing.get(key)
+                if found is not None and found[1] == values:
+                    ids[key] = found[0]
+                    staged[key] = found
+                else:
+                    to_write.append(unique[key])
+
+        if to_write:
+            stmt = upsert_insert(session, cls.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["cpfCnpj", "ispb"],
+                set_={field: stmt.excluded[field] for field in cls.MUTABLE_FIELDS},
+            ).returning(cls.id, cls.cpfCnpj, cls.ispb)
+
+            # Executed as executemany, which SQLAlchemy batches into multi-row
+            # INSERT statements ("insertmanyvalues") while keeping RETURNING
+            for start in range(0, len(to_write), chunk_size):
+                for holder_id, cpfCnpj, ispb in connection.execute(
+                    stmt, to_write[start : start + chunk_size]
+                ):
+                    key = (cpfCnpj, ispb)
+                    ids[key] = holder_id
+                    staged[key] = (holder_id, cls._mutable_values(unique[key]))
+            _invalidate_documents(
+                session, [ids[(row["cpfCnpj"], row["ispb"])] for row in to_write]
+            )
+
+        return ids
+
+    @classmethod
+    def documents_by_id(cls, session, holder_ids, chunk_size=500):
+        """
+        Serialized holders (the pagador/recebedor sub-documents of a message)
+        keyed by id. Cached documents are reused and the rest are read with
+        one IN query per chunk. The dicts are shared between callers and
+        must not be modified.
+        """
+        cache = holder_document_cache(session.get_bind())
+        documents = {}
+        missing = []
+        for holder_id in set(holder_ids):
+            document = cache.get(holder_id)
+            if document is None:
+                missing.append(holder_id)
+            else:
+                documents[holder_id] = document
+
+        columns = [cls.__table__.c[field] for field in cls.FIELDS]
+        for start in range(0, len(missing), chunk_size):
+            rows = session.execute(
+                select(cls.__table__.c.id, *columns).where(
+                    cls.__table__.c.id.in_(missing[start : start + chunk_size])
+                )
+            )
+            for holder_id, *values in rows:
+                document = dict(zip(cls.FIELDS, values))
+                cache.put(holder_id, document)
+                documents[holder_id] = document
+        return documents
+
+    @classmethod
+    def _mutable_values(cls, row):
+        return tuple(row[field] for field in cls.MUTABLE_FIELDS)
+
     def is_valid_cpf(cpf: str) -> bool:
-        return CPF().validate(cpf)
+        return validators.is_valid_cpf(cpf)
 
     def is_valid_cnpj(cnpj: str) -> bool:
-        return CNPJ().validate(cnpj)
+        return validators.is_valid_cnpj(cnpj)
@@ -1,7 +1,12 @@
-from typing import Optional
+import datetime
+from decimal import Decimal
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
+from amounts import CENTAVOS_PER_REAL, MAX_EXACT_CENTAVOS
+from timestamps import to_naive_utc
+
 
 class ISPBPathParam(BaseModel):
     """Path parameter model for ISPB validation"""
@@ -152,6 +157,153 @@ class GenerateMessagesResponse(BaseModel):
     }
 
 
+class GenerationJobStatus(BaseModel):
+    """Progress of a background test message generation"""
+
+    job_id: str = Field(
+        ...,
+        description="Identifier of the generation job",
+        examples=["0b6c2a52-0d6f-4b7e-9a4e-2f5f1b8a9c10"],
+    )
+    status: str = Field(
+        ...,
+        description="queued, running, completed, failed or cancelled",
+        examples=["running"],
+    )
+    receiver_ispb: str = Field(
+        ..., description="ISPB of the receiving institution", examples=["12345678"]
+    )
+    messages_requested: int = Field(
+        ..., description="Number of messages to generate", examples=[1000000]
+    )
+    messages_generated: int = Field(
+        ..., description="Number of messages inserted so far", examples=[250000]
+    )
+    progress: float = Field(
+        ..., description="Fraction of the messages inserted so far", examples=[0.25]
+    )
+    rate: float = Field(
+        ..., description="Messages inserted per second", examples=[41250.3]
+    )
+    elapsed_seconds: float = Field(
+        ..., description="Seconds since the job started", examples=[6.061]
+    )
+    error: Optional[str] = Field(None, description="Why the job failed")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "job_id": "0b6c2a52-0d6f-4b7e-9a4e-2f5f1b8a9c10",
+                "status": "running",
+                "receiver_ispb": "12345678",
+                "messages_requested": 1000000,
+                "messages_generated": 250000,
+                "progress": 0.25,
+                "rate": 41250.3,
+                "elapsed_seconds": 6.061,
+                "error": None,
+            }
+        }
+    }
+
+
+class IspbTotals(BaseModel):
+    """Count and total amount of the messages received by one ISPB"""
+
+    ispb: str = Field(
+        ..., description="ISPB of the receiving institution", examples=["12345678"]
+    )
+    count: int = Field(..., description="Number of messages", examples=[1520])
+    total_centavos: int = Field(
+        ..., description="Exact total amount in centavos", examples=[7625043]
+    )
+    total: float = Field(..., description="Total amount in reais", examples=[76250.43])
+
+
+class AccountHolderPayload(BaseModel):
+    """Payer or receiver of an ingested PIX message"""
+
+    nome: str = Field(..., min_length=1, examples=["Maria Silva"])
+    cpfCnpj: str = Field(
+        ...,
+        description="CPF (11 digits) or CNPJ (14 digits) without punctuation",
+        examples=["12345678909"],
+    )
+    ispb: str = Field(..., min_length=8, max_length=8, examples=["12345678"])
+    agencia: str = Field(..., min_length=1, examples=["0001"])
+    contaTransacional: str = Field(..., min_length=1, examples=["123456"])
+    tipoConta: str = Field(..., min_length=1, examples=["CACC"])
+
+    @field_validator("ispb")
+    @classmethod
+    def validate_ispb(cls, v):
+        if not v.isdigit():
+            raise ValueError("ISPB must be an 8-digit code")
+        return v
+
+
+class PixMessageIngestItem(BaseModel):
+    """PIX message accepted by the ingest endpoint"""
+
+    endToEndId: str = Field(
+        ..., min_length=1, examples=["E12345678202205121456789ABCDEF"]
+    )
+    valor: Decimal = Field(
+        ...,
+        gt=0,
+        lt=MAX_EXACT_CENTAVOS // CENTAVOS_PER_REAL,
+        decimal_places=2,
+        description="Amount in reais, stored as integer centavos",
+        examples=[123.45],
+    )
+    pagador: AccountHolderPayload
+    recebedor: AccountHolderPayload
+    campoLivre: Optional[str] = Field(None, examples=["Pagamento de aluguel"])
+    txId: str = Field(..., min_length=1, examples=["TX123456789"])
+    dataHoraPagamento: datetime.datetime = Field(
+        ...,
+        description="Payment time; times without a UTC offset are taken as UTC",
+        examples=["2023-05-12T14:56:00Z"],
+    )
+
+    @field_validator("dataHoraPagamento")
+    @classmethod
+    def normalize_dataHoraPagamento(cls, v):
+        return to_naive_utc(v)
+
+
+class IngestError(BaseModel):
+    """Reason why a single item of an ingest batch was rejected"""
+
+    index: int = Field(..., description="Position of the item in the batch")
+    endToEndId: Optional[str] = Field(None, examples=["E12345678202205121456789ABCDEF"])
+    detail: str = Field(..., examples=["Duplicate endToEndId"])
+
+
+class IngestMessagesResponse(BaseModel):
+    """Response model for bulk message ingest"""
+
+    accepted: int = Field(..., description="Number of messages stored", examples=[2])
+    rejected: int = Field(..., description="Number of messages rejected", examples=[1])
+    errors: List[IngestError] = Field(default_factory=list)
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "accepted": 2,
+                "rejected": 1,
+                "errors": [
+                    {
+                        "index": 2,
+                        "endToEndId": "E12345678202205121456789ABCDEF",
+                        "detail": "Duplicate endToEndId",
+                    }
+                ],
+            }
+        }
+    }
+
+
 class TerminateStreamResponse(BaseModel):
     model_config = {"json_schema_extra": {"example": {}}}
 
@@ -211,6 +363,21 @@ EXAMPLES = {
             "message": "Successfully generated 10 test messages for ISPB 12345678",
         },
     },
+    "generation_job": {
+        "summary": "Generation job",
+        "description": "Example response after enqueuing a large generation",
+        "value": {
+            "job_id": "0b6c2a52-0d6f-4b7e-9a4e-2f5f1b8a9c10",
+            "status": "queued",
+            "receiver_ispb": "12345678",
+            "messages_requested": 1000000,
+            "messages_generated": 0,
+            "progress": 0.0,
+            "rate": 0.0,
+            "elapsed_seconds": 0.0,
+            "error": None,
+        },
+    },
     "terminate_stream": {
         "summary": "Terminate stream",
         "description": "Empty response after successfully terminating a stream",
@@ -1,20 +1,104 @@
 import datetime
+import functools
 
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
     DateTime,
     Boolean,
     ForeignKey,
-    Float,
+    Index,
     Text,
     UniqueConstraint,
+    and_,
+    bindparam,
     func,
+    or_,
+    select,
+    update,
 )
 from sqlalchemy.orm import relationship
 
+from amounts import to_centavos, to_reais
 from database import Base
+from models.account_holder import AccountHolder
+
+
+def _receiver_ispb_default(context):
+    """
+    Fill PixMessage.receiver_ispb from the receiver when an insert omits it.
+    Ingest paths set it explicitly and never pay for this lookup.
+    """
+    receiver_id = context.get_current_parameters()["receiver_id"]
+    return context.connection.execute(
+        select(AccountHolder.ispb).where(AccountHolder.id == receiver_id)
+    ).scalar_one()
+
+
+def _serialize_select():
+    """
+    Message columns of the API representation. Payer and receiver come from
+    AccountHolder.documents_by_id, which caches them, instead of a join.
+    """
+    return select(
+        PixMessage.endToEndId,
+        PixMessage.valor_centavos,
+        PixMessage.campoLivre,
+        PixMessage.txId,
+        PixMessage.dataHoraPagamento,
+        PixMessage.payer_id,
+        PixMessage.receiver_id,
+    ).order_by(PixMessage.dataHoraPagamento, PixMessage.id)
+
+
+@functools.lru_cache(maxsize=None)
+def _serialize_statement():
+    """
+    Statement used by PixMessage.serialize_by_ids. Building the select costs
+    more than running it for small batches, so it is built once.
+    """
+    return _serialize_select().where(
+        PixMessage.id.in_(bindparam("ids", expanding=True))
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _serialize_batch_statement():
+    """Statement used by PixMessage.iter_serialized_batch, built once"""
+    return _serialize_select().where(
+        PixMessage.stream_id == bindparam("stream_id"),
+        PixMessage.dispatched_at == bindparam("dispatched_at"),
+        PixMessage.delivered == False,
+    )
+
+
+def _rows_to_dicts(session, rows):
+    """Map PixMessage.serialize_by_ids rows to the API representation"""
+    holders = AccountHolder.documents_by_id(
+        session, [holder_id for row in rows for holder_id in row[5:]]
+    )
+    return [
+        {
+            "endToEndId": end_to_end_id,
+            "valor": to_reais(valor_centavos),
+            "pagador": holders[payer_id],
+            "recebedor": holders[receiver_id],
+            "campoLivre": campo_livre,
+            "txId": tx_id,
+            "dataHoraPagamento": data_hora_pagamento,
+        }
+        for (
+            end_to_end_id,
+            valor_centavos,
+            campo_livre,
+            tx_id,
+            data_hora_pagamento,
+            payer_id,
+            receiver_id,
+        ) in rows
+    ]
 
 
 class PixMessage(Base):
@@ -22,9 +106,12 @@ class PixMessage(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     endToEndId = Column(String, unique=True, index=True, nullable=False)
-    valor = Column(Float, nullable=False)
+    # Amount in centavos; `valor` is the same amount in reais
+    valor_centavos = Column(BigInteger, nullable=False)
     payer_id = Column(Integer, ForeignKey("account_holders.id"), nullable=False)
     receiver_id = Column(Integer, ForeignKey("account_holders.id"), nullable=False)
+    # Copy of the receiver's ISPB so streams can find their messages without a join
+    receiver_ispb = Column(String, nullable=False, default=_receiver_ispb_default)
     campoLivre = Column(Text, nullable=True)
     txId = Column(String, index=True, nullable=False)
     dataHoraPagamento = Column(DateTime, nullable=False)
@@ -35,6 +122,7 @@ class PixMessage(Base):
     stream_id = Column(
         String, ForeignKey("message_streams.stream_id"), nullable=True, index=True
     )
+    dispatched_at = Column(DateTime, nullable=True)
 
     pagador = relationship(
         "AccountHolder",
@@ -50,11 +138,44 @@ class PixMessage(Base):
 
     __table_args__ = (
         UniqueConstraint("endToEndId", "stream_id", name="uix_message_stream"),
+        # Undelivered messages of a stream in payment order (polling and acks)
+        Index(
+            "ix_pix_messages_stream_undelivered",
+            "stream_id",
+            "dataHoraPagamento",
+            sqlite_where=delivered == False,
+            postgresql_where=delivered == False,
+        ),
+        # Messages waiting to be claimed by the streams of a receiver ISPB
+        Index(
+            "ix_pix_messages_ispb_pending",
+            "receiver_ispb",
+            "dataHoraPagamento",
+            sqlite_where=and_(delivered == False, dispatched_at.is_(None)),
+            postgresql_where=and_(delivered == False, dispatched_at.is_(None)),
+        ),
+        # Covers PixMessage.totals_by_ispb, which reads a payment time window
+        # from the index alone
+        Index(
+            "ix_pix_messages_paid_at_totals",
+            "dataHoraPagamento",
+            "receiver_ispb",
+            "valor_centavos",
+        ),
     )
 
     def __repr__(self):
         return f"<PixMessage(endToEndId='{self.endToEndId}', valor={self.valor}, txId='{self.txId}')>"
 
+    @property
+    def valor(self):
+        """Amount in reais"""
+        return to_reais(self.valor_centavos)
+
+    @valor.setter
+    def valor(self, reais):
+        self.valor_centavos = to_centavos(reais)
+
     @classmethod
     def get_by_endToEndId(cls, session, endToEndId):
         """Find a message by its endToEndId"""
@@ -71,6 +192,232 @@ class PixMessage(Base):
             .all()
         )
 
+    @classmethod
+    def claim_for_stream(
+        cls, session, stream_id, ispb, limit=10, dispatched_at=None, keys=False
+    ):
+        """
+        Atomically assign up to `limit` pending messages received by an ISPB to
+        a stream and return their ids ordered by payment time, or
+        (id, endToEndId) pairs with `keys`.
+
+        A message is pending while it is undelivered and has not been sent on
+        any stream; it can be claimed if it is unassigned or already assigned
+        to this stream. The claim is a single UPDATE ... RETURNING, and on
+        Postgres the candidate rows are locked with FOR UPDATE SKIP LOCKED so
+        parallel streams never wait on or return the same message.
+
+        Claimed messages are stamped with `dispatched_at` (now by default),
+        which identifies the batch when it is acknowledged.
+        """
+        now = dispatched_at or datetime.datetime.now(datetime.timezone.utc)
+        candidates = (
+            select(cls.id)
+            .where(
+                cls.delivered == False,
+                cls.dispatched_at.is_(None),
+                or_(cls.stream_id.is_(None), cls.stream_id == stream_id),
+                cls.receiver_ispb == ispb,
+            )
+            .order_by(cls.dataHoraPagamento, cls.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        if session.get_bind().dialect.update_returning:
+            stmt = (
+                update(cls)
+                .where(cls.id.in_(candidates.scalar_subquery()))
+                .values(stream_id=stream_id, dispatched_at=now)
+                .returning(cls.id, cls.dataHoraPagamento, cls.endToEndId)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = session.execute(stmt).all()
+        else:
+            # Databases without UPDATE ... RETURNING: claim by id, guarded so
+            # rows taken concurrently by another stream are skipped
+            ids = session.scalars(candidates).all()
+            if not ids:
+                return []
+            session.execute(
+                update(cls)
+                .where(
+                    cls.id.in_(ids),
+                    cls.dispatched_at.is_(None),
+                    or_(cls.stream_id.is_(None), cls.stream_id == stream_id),
+                )
+                .values(stream_id=stream_id, dispatched_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = session.execute(
+                select(cls.id, cls.dataHoraPagamento, cls.endToEndId).where(
+                    cls.id.in_(ids),
+                    cls.stream_id == stream_id,
+                    cls.dispatched_at == now,
+                )
+            ).all()
+
+        claimed = sorted(claimed, key=lambda row: (row[1], row[0]))
+        if keys:
+            return [(message_id, key) for message_id, _, key in claimed]
+        return [message_id for message_id, _, _ in claimed]
+
+    @classmethod
+    def acknowledge(cls, session, stream_id, dispatched_until=None, keys=False):
+        """
+        Mark the undelivered messages of a stream as delivered with a single
+        UPDATE and return how many were acknowledged, or their endToEndIds
+        with `keys`. With `dispatched_until`, only the batches dispatched up
+        to that time are acknowledged.
+        """
+        conditions = [cls.stream_id == stream_id, cls.delivered == False]
+        if dispatched_until is not None:
+            conditions.append(cls.dispatched_at <= dispatched_until)
+        stmt = (
+            update(cls)
+            .where(*conditions)
+            .values(delivered=True)
+            .execution_options(synchronize_session=False)
+        )
+        if not keys:
+            return session.execute(stmt).rowcount
+        if session.get_bind().dialect.update_returning:
+            return session.scalars(stmt.returning(cls.endToEndId)).all()
+        acknowledged = session.scalars(select(cls.endToEndId).where(*conditions)).all()
+        session.execute(stmt)
+        return acknowledged
+
+    @classmethod
+    def unacknowledged_batch(cls, session, stream_id, dispatched_after):
+        """
+        The first batch sent to a stream after `dispatched_after` that has
+        not been acknowledged: its dispatch time and (id, endToEndId) pairs
+        in payment order, or (None, []). Both reads go through the stream's
+        undelivered-messages index.
+        """
+        pending = [
+            cls.stream_id == stream_id,
+            cls.delivered == False,
+            cls.dispatched_at > dispatched_after,
+        ]
+        dispatched_at = session.scalar(
+            select(func.min(cls.dispatched_at)).where(*pending)
+        )
+        if dispatched_at is None:
+            return None, []
+        claimed = session.execute(
+            select(cls.id, cls.endToEndId)
+            .where(
+                cls.stream_id == stream_id,
+                cls.delivered == False,
+                cls.dispatched_at == dispatched_at,
+            )
+            .order_by(cls.dataHoraPagamento, cls.id)
+        ).all()
+        return dispatched_at, claimed
+
+    @classmethod
+    def count_undelivered_by_ispb(cls, session):
+        """
+        (receiver ispb, state, count) of the undelivered messages, where
+        state is "pending" (waiting to be claimed) or "dispatched" (sent on
+        an active stream, not yet acknowledged). Both counts go through
+        partial indexes, so they cost O(undelivered messages).
+        """
+        pending = session.execute(
+            select(cls.receiver_ispb, func.count())
+            .where(cls.delivered == False, cls.dispatched_at.is_(None))
+            .group_by(cls.receiver_ispb)
+        ).all()
+        dispatched = session.execute(
+            select(MessageStream.ispb, func.count())
+            .select_from(cls)
+            .join(MessageStream, MessageStream.stream_id == cls.stream_id)
+            .where(
+                MessageStream.is_active == True,
+                cls.delivered == False,
+                cls.dispatched_at.is_not(None),
+            )
+            .group_by(MessageStream.ispb)
+        ).all()
+        return [(ispb, "pending", count) for ispb, count in pending] + [
+            (ispb, "dispatched", count) for ispb, count in dispatched
+        ]
+
+    @classmethod
+    def totals_by_ispb(cls, session, start=None, end=None, ispb=None):
+        """
+        (receiver ispb, message count, total in centavos) of the messages
+        paid in [start, end), optionally for one ISPB. Summed in SQL over
+        integer centavos, so totals are exact, and read from the covering
+        index on (dataHoraPagamento, receiver_ispb, valor_centavos).
+        """
+        stmt = select(
+            cls.receiver_ispb, func.count(), func.sum(cls.valor_centavos)
+        ).group_by(cls.receiver_ispb)
+        if start is not None:
+            stmt = stmt.where(cls.dataHoraPagamento >= start)
+        if end is not None:
+            stmt = stmt.where(cls.dataHoraPagamento < end)
+        if ispb is not None:
+            stmt = stmt.where(cls.receiver_ispb == ispb)
+        return session.execute(stmt.order_by(cls.receiver_ispb)).all()
+
+    @classmethod
+    def release_streams(cls, session, stream_ids, chunk_size=500):
+        """
+        Put the unacknowledged messages of the given streams back in the
+        pending pool and return how many were released. Served by the
+        partial index on undelivered messages per stream, so the cost grows
+        with the released messages, not with the table.
+        """
+        stream_ids = list(stream_ids)
+        released = 0
+        for start in range(0, len(stream_ids), chunk_size):
+            result = session.execute(
+                update(cls)
+                .where(
+                    cls.stream_id.in_(stream_ids[start : start + chunk_size]),
+                    cls.delivered == False,
+                )
+                .values(stream_id=None, dispatched_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            released += result.rowcount
+        return released
+
+    @classmethod
+    def serialize_by_ids(cls, session, ids):
+        """
+        Build the API representation of the given messages.
+
+        Messages are read in a single query and payer and receiver come from
+        the account holder document cache (one more query for the holders
+        it misses). The dicts are built straight from the result tuples, so
+        no ORM objects or lazy relationship loads are involved. Messages are
+        returned ordered by payment time.
+        """
+        if not ids:
+            return []
+
+        rows = session.execute(_serialize_statement(), {"ids": list(ids)}).all()
+        return _rows_to_dicts(session, rows)
+
+    @classmethod
+    def iter_serialized_batch(cls, session, stream_id, dispatched_at, yield_per=100):
+        """
+        Yield the API representation of the batch a stream was sent at
+        `dispatched_at`, in payment order. Rows are fetched `yield_per` at a
+        time, from a server-side cursor where the driver has one, so memory
+        stays flat whatever the size of the batch.
+        """
+        result = session.execute(
+            _serialize_batch_statement().execution_options(yield_per=yield_per),
+            {"stream_id": stream_id, "dispatched_at": dispatched_at},
+        )
+        for rows in result.partitions():
+            yield from _rows_to_dicts(session, rows)
+
     def to_dict(self):
         """Convert the message to a dictionary format matching the API spec"""
         return {
@@ -94,7 +441,7 @@ class PixMessage(Base):
             },
             "campoLivre": self.campoLivre,
             "txId": self.txId,
-            "dataHoraPagamento": self.dataHoraPagamento.isoformat(),
+            "dataHoraPagamento": self.dataHoraPagamento,
         }
 
 
@@ -115,7 +462,18 @@ class MessageStream(Base):
     messages = relationship("PixMessage", back_populates="stream")
     messages = relationship("PixMessage", back_populates="stream")
 
-    __table_args__ = (UniqueConstraint("stream_id", name="uix_stream_id"),)
+    __table_args__ = (
+        UniqueConstraint("stream_id", name="uix_stream_id"),
+        # Lets the reaper find idle streams without scanning inactive ones
+        Index(
+            "ix_message_streams_active_last_active",
+            "last_active",
+            sqlite_where=is_active == True,
+            postgresql_where=is_active == True,
+        ),
+    )
+
+    MAX_ACTIVE_PER_ISPB = 6
 
     def __repr__(self):
         return f"<MessageStream(stream_id='{self.stream_id}', ispb='{self.ispb}', is_active={self.is_active})>"
@@ -134,6 +492,25 @@ class MessageStream(Base):
             .scalar()
         )
 
+    @classmethod
+    def get_active_stream_ids(cls, session, ispb):
+        """Ids of the active streams of a specific ISPB"""
+        return [
+            stream_id
+            for (stream_id,) in session.query(cls.stream_id).filter(
+                cls.ispb == ispb, cls.is_active == True
+            )
+        ]
+
+    @classmethod
+    def count_active_by_ispb(cls, session):
+        """(ispb, active stream count) pairs"""
+        return session.execute(
+            select(cls.ispb, func.count())
+            .where(cls.is_active == True)
+            .group_by(cls.ispb)
+        ).all()
+
     @classmethod
     def get_by_stream_id(cls, session, stream_id):
         """Find a stream by its ID"""
@@ -143,27 +520,58 @@ class MessageStream(Base):
     def create_stream(cls, session, ispb, stream_id):
         """Create a new message stream if ISPB limit not exceeded"""
         active_streams = cls.get_active_streams_count_by_ispb(session, ispb)
-        if active_streams >= 6:
+        if active_streams >= cls.MAX_ACTIVE_PER_ISPB:
             return None
 
         stream = cls(stream_id=stream_id, ispb=ispb)
         session.add(stream)
         return stream
 
+    @classmethod
+    def deactivate(cls, session, stream_id):
+        """Deactivate a stream without loading it"""
+        session.execute(
+            update(cls)
+            .where(cls.stream_id == stream_id)
+            .values(is_active=False)
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def deactivate_idle_streams(cls, session, cutoff):
+        """
+        Deactivate every active stream whose last activity is older than
+        `cutoff` with a single UPDATE and return their (stream_id, ispb)
+        """
+        idle = and_(cls.is_active == True, cls.last_active < cutoff)
+
+        if session.get_bind().dialect.update_returning:
+            stmt = (
+                update(cls)
+                .where(idle)
+                .values(is_active=False)
+                .returning(cls.stream_id, cls.ispb)
+                .execution_options(synchronize_session=False)
+            )
+            return [tuple(row) for row in session.execute(stmt)]
+
+        streams = [
+            tuple(row) for row in session.execute(select(cls.stream_id, cls.ispb).where(idle))
+        ]
+        if streams:
+            stream_ids = [stream_id for stream_id, _ in streams]
+            session.execute(
+                update(cls)
+                .where(idle, cls.stream_id.in_(stream_ids))
+                .values(is_active=False)
+                .execution_options(synchronize_session=False)
+            )
+        return streams
+
     @classmethod
     def deactivate_inactive_streams(cls, session, timeout_minutes=30):
         """Deactivate streams that have been inactive for a specified period"""
         timeout = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
             minutes=timeout_minutes
         )
-        inactive_streams = (
-            session.query(cls)
-            .filter(cls.is_active == True, cls.last_active < timeout)
-            .all()
-        )
-
-        for stream in inactive_streams:
-            stream.is_active = False
-            session.add(stream)
-
-        return len(inactive_streams)
+        return len(cls.deactivate_idle_streams(session, timeout))
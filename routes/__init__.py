@@ -1,2 +1,4 @@
+from routes.ingest_routes import router as ingest_router
 from routes.message_routes import router as message_router
+from routes.metrics_routes import router as metrics_router
 from routes.utility_routes import router as utility_router
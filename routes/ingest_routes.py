@@ -0,0 +1,80 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import get_db
+from models.api_models import IngestMessagesResponse
+from utils.db_executor import run_in_db_executor
+from utils.message_ingest import (
+    ingest_messages,
+    parse_ingest_items,
+    split_ingest_body,
+)
+
+MAX_INGEST_BATCH = int(os.getenv("MAX_INGEST_BATCH", 50000))
+
+router = APIRouter(prefix="/api/pix")
+
+
+@router.post(
+    "/msgs",
+    summary="Ingest PIX messages in bulk",
+    description="""
+    Stores a batch of PIX messages. The body is either a JSON array of messages or
+    NDJSON (`Content-Type: application/x-ndjson`, one message per line).
+
+    Items are validated individually: invalid items and items whose endToEndId already
+    exists are reported in `errors` with their position in the batch, while the rest of
+    the batch is stored. Account holders are created or updated as needed.
+    """,
+    response_model=IngestMessagesResponse,
+    responses={
+        200: {"description": "Batch processed; see `errors` for rejected items"},
+        400: {"description": "Malformed body"},
+        413: {"description": "Batch larger than the configured maximum"},
+        500: {"description": "Internal server error"},
+    },
+)
+async def ingest_pix_messages(
+    request: Request,
+    content_type: str = Header(
+        "application/json",
+        description="application/json for a JSON array, application/x-ndjson for NDJSON",
+    ),
+    db: Session = Depends(get_db),
+):
+    """
+    Ingest PIX messages in bulk
+    """
+    body = await request.body()
+    ndjson = "ndjson" in content_type.lower()
+
+    try:
+        items = await run_in_threadpool(split_ingest_body, body, ndjson=ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if len(items) > MAX_INGEST_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds the maximum of {MAX_INGEST_BATCH} messages",
+        )
+
+    messages, errors = await run_in_threadpool(
+        parse_ingest_items, items, ndjson=ndjson
+    )
+
+    try:
+        accepted, store_errors = await run_in_db_executor(
+            ingest_messages, db, messages
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while ingesting messages: {str(e)}",
+        )
+
+    errors = sorted(errors + store_errors, key=lambda error: error["index"])
+    return {"accepted": len(accepted), "rejected": len(errors), "errors": errors}
@@ -1,15 +1,42 @@
+import datetime
 from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Header, Response, status, Path
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Header,
+    Response,
+    status,
+    Path,
+    Query,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from amounts import to_reais
 from database import get_db
-from models.api_models import PixMessageResponse, TerminateStreamResponse, EXAMPLES
-from models.pix_message import MessageStream
-from utils.message_processor import MessageProcessor
+from models.api_models import (
+    IspbTotals,
+    PixMessageResponse,
+    TerminateStreamResponse,
+    EXAMPLES,
+)
+from models.pix_message import MessageStream, PixMessage
+from timestamps import to_naive_utc
+from utils.db_executor import run_in_db_executor
+from utils.message_encoding import MessageResponse, encode_fragments
+from utils.message_processor import (
+    DEFAULT_BATCH_SIZE,
+    LONG_POLL_TIMEOUT,
+    MAX_BATCH_SIZE,
+    NDJSON_MEDIA_TYPE,
+    MessageProcessor,
+)
+from utils.notification_hub import notification_hub
+from utils.stream_events import iter_stream_events
 
-router = APIRouter(prefix="/api/pix")
+router = APIRouter(prefix="/api/pix", default_response_class=MessageResponse)
 
 
 @router.get(
@@ -31,7 +58,8 @@ router = APIRouter(prefix="/api/pix")
                         "single": EXAMPLES["single_message"],
                         "multiple": EXAMPLES["multiple_messages"],
                     }
-                }
+                },
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}},
             },
         },
         204: {
@@ -47,7 +75,7 @@ router = APIRouter(prefix="/api/pix")
                 },
             },
         },
-        400: {"description": "Invalid ISPB format"},
+        400: {"description": "Invalid ISPB format or batch size"},
         500: {"description": "Internal server error"},
     },
 )
@@ -58,9 +86,13 @@ async def start_stream(
         example="12345678",
     ),
     response: Response = None,
+    batch: Optional[int] = Query(
+        None,
+        description="Messages per multipart/json or NDJSON response (default 10, capped by the server)",
+    ),
     accept: Optional[str] = Header(
         None,
-        description="Determines response format - application/json for single message, multipart/json for multiple messages",
+        description="Determines response format - application/json for single message, multipart/json for multiple messages (optionally `multipart/json; batch=N`), application/x-ndjson to stream multiple messages one per line",
     ),
     db: Session = Depends(get_db),
 ):
@@ -73,30 +105,49 @@ async def start_stream(
             detail="ISPB must be an 8-digit code",
         )
 
-    single_message = True
-    if accept and "multipart/json" in accept.lower():
-        single_message = False
+    media_type, batch_size = MessageProcessor.negotiate_batch(accept, batch)
+    single_message = batch_size is None
+    streaming = media_type == NDJSON_MEDIA_TYPE
 
     try:
-        messages, stream_id = await MessageProcessor.fetch_messages(
+        messages, stream_id, cursor = await MessageProcessor.fetch_messages(
             ispb=ispb,
             stream_id=None,
             db=db,
-            max_wait=8,
+            max_wait=LONG_POLL_TIMEOUT,
             single_message=single_message,
+            batch_size=batch_size or DEFAULT_BATCH_SIZE,
+            serialize=not streaming,
         )
 
         headers = MessageProcessor.format_response_headers(
-            ispb=ispb, stream_id=stream_id, has_messages=len(messages) > 0
+            ispb=ispb,
+            stream_id=stream_id,
+            has_messages=len(messages) > 0,
+            cursor=cursor,
+            batch=batch,
         )
 
         if not messages:
             return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
 
+        if streaming:
+            return StreamingResponse(
+                MessageProcessor.iter_ndjson(db, stream_id, cursor),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=headers,
+            )
+        # Messages arrive pre-encoded, so they are sent as raw JSON bytes
         if single_message:
-            return JSONResponse(content=messages[0], headers=headers)
+            return Response(
+                content=messages[0], media_type="application/json", headers=headers
+            )
         else:
-            return JSONResponse(content=messages, headers=headers)
+            return Response(
+                content=encode_fragments(messages),
+                media_type="application/json",
+                headers=headers,
+            )
 
     except HTTPException as e:
         raise e
@@ -114,6 +165,11 @@ async def start_stream(
     Continues message retrieval from a previously started stream. This endpoint uses long polling 
     (up to 8 seconds) to efficiently retrieve messages. If no messages are available within 
     the polling period, a 204 No Content response is returned.
+
+    After a batch, the `Pull-Next` header carries a `cursor`. Following it acknowledges
+    every message the stream was sent up to that batch, so the stream can keep running
+    without being terminated to confirm receipt. Retrying the same Pull-Next after a
+    lost response returns the lost batch again, with the same cursor.
     """,
     response_model=Union[PixMessageResponse, List[PixMessageResponse]],
     response_model_exclude_none=True,
@@ -126,7 +182,8 @@ async def start_stream(
                         "single": EXAMPLES["single_message"],
                         "multiple": EXAMPLES["multiple_messages"],
                     }
-                }
+                },
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}},
             },
         },
         204: {
@@ -142,7 +199,7 @@ async def start_stream(
                 },
             },
         },
-        400: {"description": "Invalid ISPB format"},
+        400: {"description": "Invalid ISPB format, cursor or batch size"},
         404: {"description": "Stream not found"},
         500: {"description": "Internal server error"},
     },
@@ -158,10 +215,18 @@ async def continue_stream(
         description="The stream ID from a previous request",
         example="3fa85f64-5717-4562-b3fc-2c963f66afa6",
     ),
+    cursor: Optional[str] = Query(
+        None,
+        description="Cursor from the Pull-Next header; acknowledges the batches sent up to it",
+    ),
     response: Response = None,
+    batch: Optional[int] = Query(
+        None,
+        description="Messages per multipart/json or NDJSON response (default 10, capped by the server)",
+    ),
     accept: Optional[str] = Header(
         None,
-        description="Determines response format - application/json for single message, multipart/json for multiple messages",
+        description="Determines response format - application/json for single message, multipart/json for multiple messages (optionally `multipart/json; batch=N`), application/x-ndjson to stream multiple messages one per line",
     ),
     db: Session = Depends(get_db),
 ):
@@ -175,30 +240,50 @@ async def continue_stream(
             detail="ISPB must be an 8-digit code",
         )
 
-    single_message = True
-    if accept and "multipart/json" in accept.lower():
-        single_message = False
+    media_type, batch_size = MessageProcessor.negotiate_batch(accept, batch)
+    single_message = batch_size is None
+    streaming = media_type == NDJSON_MEDIA_TYPE
 
     try:
-        messages, stream_id = await MessageProcessor.fetch_messages(
+        messages, stream_id, next_cursor = await MessageProcessor.fetch_messages(
             ispb=ispb,
             stream_id=interationId,
             db=db,
-            max_wait=8,
+            max_wait=LONG_POLL_TIMEOUT,
             single_message=single_message,
+            cursor=cursor,
+            batch_size=batch_size or DEFAULT_BATCH_SIZE,
+            serialize=not streaming,
         )
 
         headers = MessageProcessor.format_response_headers(
-            ispb=ispb, stream_id=stream_id, has_messages=len(messages) > 0
+            ispb=ispb,
+            stream_id=stream_id,
+            has_messages=len(messages) > 0,
+            cursor=next_cursor,
+            batch=batch,
         )
 
         if not messages:
             return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
 
+        if streaming:
+            return StreamingResponse(
+                MessageProcessor.iter_ndjson(db, stream_id, next_cursor),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=headers,
+            )
+        # Messages arrive pre-encoded, so they are sent as raw JSON bytes
         if single_message:
-            return JSONResponse(content=messages[0], headers=headers)
+            return Response(
+                content=messages[0], media_type="application/json", headers=headers
+            )
         else:
-            return JSONResponse(content=messages, headers=headers)
+            return Response(
+                content=encode_fragments(messages),
+                media_type="application/json",
+                headers=headers,
+            )
 
     except HTTPException as e:
         raise e
@@ -209,6 +294,86 @@ async def continue_stream(
         )
 
 
+@router.get(
+    "/{ispb}/stream/{interationId}/events",
+    summary="Receive the messages of a stream as Server-Sent Events",
+    description="""
+    Push alternative to long polling. Keeps one connection open and sends every message
+    as a `message` event as soon as it is assigned to the stream. The last event of each
+    batch carries the batch cursor as its `id`.
+
+    Messages are acknowledged by reconnecting with `Last-Event-ID` (done automatically by
+    EventSource clients), by following a Pull-Next link with that cursor, or with the
+    DELETE endpoint, which also ends the event stream. The server closes the connection
+    periodically; clients reconnect with `Last-Event-ID`.
+    """,
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "Event stream of PIX messages",
+            "content": {"text/event-stream": {"schema": {"type": "string"}}},
+        },
+        400: {"description": "Invalid ISPB format, Last-Event-ID or batch size"},
+        404: {"description": "Stream not found"},
+        410: {"description": "Stream is no longer active"},
+    },
+)
+async def stream_events(
+    ispb: str = Path(
+        ...,
+        description="8-digit code identifying a payment institution",
+        example="12345678",
+    ),
+    interationId: str = Path(
+        ...,
+        description="The stream ID from a previous request",
+        example="3fa85f64-5717-4562-b3fc-2c963f66afa6",
+    ),
+    batch: Optional[int] = Query(
+        None,
+        description="Maximum messages claimed at a time (default 10, capped by the server)",
+    ),
+    last_event_id: Optional[str] = Header(
+        None,
+        alias="Last-Event-ID",
+        description="Id of the last event received; acknowledges the batches sent up to it",
+    ),
+    db: Session = Depends(get_db),
+):
+    """
+    Pushes the messages of a stream as Server-Sent Events
+    """
+    if not ispb.isdigit() or len(ispb) != 8:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ISPB must be an 8-digit code",
+        )
+    if batch is not None and batch < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="batch must be a positive integer",
+        )
+
+    dispatched_until = (
+        MessageProcessor.decode_cursor(last_event_id) if last_event_id else None
+    )
+    await MessageProcessor.resume_stream(ispb, interationId, db)
+    if dispatched_until is not None:
+        await MessageProcessor.acknowledge_batches(interationId, dispatched_until, db)
+
+    return StreamingResponse(
+        iter_stream_events(
+            ispb,
+            interationId,
+            db,
+            min(batch or DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE),
+            dispatched_until,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.delete(
     "/{ispb}/stream/{interationId}",
     summary="Terminate a message stream",
@@ -256,7 +421,9 @@ async def terminate_stream(
         )
 
     try:
-        stream = MessageStream.get_by_stream_id(db, interationId)
+        stream = await run_in_db_executor(
+            MessageStream.get_by_stream_id, db, interationId
+        )
         if not stream:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -269,12 +436,17 @@ async def terminate_stream(
                 detail=f"Stream {interationId} does not belong to ISPB {ispb}",
             )
 
-        success = MessageProcessor.mark_messages_delivered(interationId, db)
-        if not success:
+        try:
+            await run_in_db_executor(
+                MessageProcessor.mark_messages_delivered, interationId, db
+            )
+        except Exception:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to mark messages as delivered",
             )
+        # Wake the stream's event connection, if any, so it ends right away
+        notification_hub.notify(ispb)
 
         return {}
 
@@ -285,3 +457,59 @@ async def terminate_stream(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred while processing the request: {str(e)}",
         )
+
+
+@router.get(
+    "/totals",
+    summary="Message counts and totals per ISPB",
+    description="""
+    Number of messages and total amount received by each ISPB, for the messages paid in
+    the window `[start, end)` (both optional). Amounts are summed in the database over
+    integer centavos, so `total_centavos` is exact over any window; `total` is the same
+    amount in reais.
+    """,
+    response_model=List[IspbTotals],
+    responses={400: {"description": "Invalid ISPB format or window"}},
+)
+async def message_totals(
+    start: Optional[datetime.datetime] = Query(
+        None,
+        description="Include messages paid at or after this time; UTC unless it has an offset",
+    ),
+    end: Optional[datetime.datetime] = Query(
+        None,
+        description="Include messages paid before this time; UTC unless it has an offset",
+    ),
+    ispb: Optional[str] = Query(
+        None, description="Only the messages received by this ISPB"
+    ),
+    db: Session = Depends(get_db),
+):
+    """
+    Aggregate the messages received per ISPB
+    """
+    if ispb is not None and (not ispb.isdigit() or len(ispb) != 8):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ISPB must be an 8-digit code",
+        )
+    if start is not None:
+        start = to_naive_utc(start)
+    if end is not None:
+        end = to_naive_utc(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end",
+        )
+
+    rows = await run_in_db_executor(PixMessage.totals_by_ispb, db, start, end, ispb)
+    return [
+        {
+            "ispb": receiver_ispb,
+            "count": count,
+            "total_centavos": total,
+            "total": to_reais(total),
+        }
+        for receiver_ispb, count, total in rows
+    ]
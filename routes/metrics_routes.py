@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.orm import Session
+
+from database import get_db
+from utils import metrics
+from utils.db_executor import run_in_db_executor
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    summary="Metrics in the Prometheus text format",
+    description="""
+    Histograms of poll wait, time to first message, batch sizes, stream acquisition and
+    acknowledgement times and database statement latency, recorded by this worker, the
+    hits and misses of its in-process caches, plus gauges of active streams and
+    undelivered messages per ISPB read from the database when scraped.
+    """,
+    response_class=Response,
+    responses={200: {"content": {metrics.CONTENT_TYPE: {}}}},
+)
+async def get_metrics(db: Session = Depends(get_db)):
+    """
+    Expose the application metrics for Prometheus
+    """
+    await run_in_db_executor(metrics.refresh_database_gauges, db)
+    metrics.refresh_cache_counters(db.get_bind())
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,8 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Path
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
+from amounts import to_centavos, to_reais
 from database import get_db
-from models.api_models import GenerateMessagesResponse, EXAMPLES
+from models.api_models import (
+    GenerateMessagesResponse,
+    GenerationJobStatus,
+    EXAMPLES,
+)
+from utils.db_executor import run_in_db_executor
+from utils.generation_jobs import (
+    GENERATE_MAX_MESSAGES,
+    GENERATE_SYNC_MAX,
+    generation_jobs,
+)
+from utils.metrics import in_process_caches
 from utils.test_data_generator import create_test_messages
 
 router = APIRouter()
@@ -12,7 +25,7 @@ router = APIRouter()
     "/util/msgs/{ispb}/{number}",
     status_code=status.HTTP_201_CREATED,
     summary="Generate test PIX messages",
-    description="""
+    description=f"""
     Generate and insert random PIX messages for testing purposes. This endpoint creates 
     the specified number of random PIX messages with the given ISPB as the receiver.
     
@@ -23,6 +36,11 @@ router = APIRouter()
     - Transaction types
     - Additional information
     
+    Up to {GENERATE_SYNC_MAX} messages are generated within the request (201). Larger
+    counts, up to {GENERATE_MAX_MESSAGES}, are inserted in chunks by a background job:
+    the response is 202 with the job, and its progress and insert rate are available
+    from `GET /api/util/jobs/{{job_id}}` (the `Location` header).
+    
     This endpoint is intended for testing and development purposes only.
     """,
     response_model=GenerateMessagesResponse,
@@ -33,11 +51,19 @@ router = APIRouter()
                 "application/json": {"example": EXAMPLES["generate_messages"]["value"]}
             },
         },
+        202: {
+            "description": "Generation job started",
+            "model": GenerationJobStatus,
+            "content": {
+                "application/json": {"example": EXAMPLES["generation_job"]["value"]}
+            },
+        },
         400: {"description": "Invalid ISPB format or number of messages"},
         500: {"description": "Internal server error"},
     },
 )
 async def generate_test_messages(
+    request: Request,
     ispb: str = Path(
         ...,
         description="Institution to set as receiver (8-digit code)",
@@ -45,10 +71,8 @@ async def generate_test_messages(
     ),
     number: int = Path(
         ...,
-        description="Number of messages to generate (1-100)",
+        description=f"Number of messages to generate (1-{GENERATE_MAX_MESSAGES})",
         example=10,
-        gt=0,
-        le=100,
     ),
     db: Session = Depends(get_db),
 ):
@@ -61,22 +85,33 @@ async def generate_test_messages(
             detail="ISPB must be an 8-digit code",
         )
 
-    if number <= 0 or number > 100:
+    if number <= 0 or number > GENERATE_MAX_MESSAGES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Number of messages must be between 1 and 100",
+            detail=f"Number of messages must be between 1 and {GENERATE_MAX_MESSAGES}",
+        )
+
+    if number > GENERATE_SYNC_MAX:
+        job = generation_jobs.start(db.get_bind(), ispb, number)
+        location = request.url_for("get_generation_job", job_id=job.job_id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=job.to_dict(),
+            headers={"Location": str(location)},
         )
 
     try:
-        created_messages = create_test_messages(ispb, number, db)
+        created_messages = await run_in_db_executor(
+            create_test_messages, ispb, number, db
+        )
 
-        total_value = sum(msg["valor"] for msg in created_messages)
+        total_centavos = sum(to_centavos(msg["valor"]) for msg in created_messages)
 
         return {
             "status": "success",
             "messages_generated": number,
             "receiver_ispb": ispb,
-            "total_value": round(total_value, 2),
+            "total_value": to_reais(total_centavos),
             "message": f"Successfully generated {number} test messages for ISPB {ispb}",
         }
 
@@ -85,3 +120,52 @@ async def generate_test_messages(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred while generating test messages: {str(e)}",
         )
+
+
+@router.get(
+    "/util/jobs/{job_id}",
+    summary="Status of a test message generation job",
+    description="""
+    Progress of a background generation started by
+    `POST /api/util/msgs/{ispb}/{number}`: messages inserted so far, the fraction of the
+    requested count and the insert rate in messages per second. Jobs are kept in the
+    memory of the worker that started them.
+    """,
+    response_model=GenerationJobStatus,
+    responses={404: {"description": "Unknown job"}},
+)
+async def get_generation_job(job_id: str):
+    """
+    Report the progress of a generation job
+    """
+    job = generation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found",
+        )
+    return job.to_dict()
+
+
+@router.get(
+    "/util/cache-stats",
+    summary="In-process cache statistics",
+    description="""
+    Size, hits, misses and hit rate of the in-process caches of this worker: serialized
+    account holders (`holder_documents`), recently written holder ids (`holder_ids`) and
+    encoded messages (`messages`).
+    """,
+)
+async def cache_stats(db: Session = Depends(get_db)):
+    """
+    Report the hit rate of the in-process caches
+    """
+    return {
+        name: {
+            "entries": len(cache),
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "hit_rate": round(cache.hit_rate, 4),
+        }
+        for name, cache in in_process_caches(db.get_bind()).items()
+    }
@@ -1,5 +1,6 @@
 import os
 import sys
+import uuid
 from typing import Generator, Dict, Any
 
 import pytest
@@ -11,19 +12,25 @@ from sqlalchemy.pool import StaticPool
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+# Polls that end without messages wait the full timeout; keep it short
+os.environ.setdefault("LONG_POLL_TIMEOUT", "2")
+
 from database import Base, get_db
 from main import app
 from models.pix_message import PixMessage, MessageStream
-from models.account_holder import AccountHolder
+from models.account_holder import (
+    AccountHolder,
+    holder_document_cache,
+    holder_id_cache,
+)
+from utils.message_cache import message_cache
+from utils.stream_registry import stream_registry
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
     pool_recycle=1800,
 )
 
@@ -41,6 +48,19 @@ def override_get_db():
 app.dependency_overrides[get_db] = override_get_db
 
 
+@pytest.fixture(autouse=True)
+def clear_engine_state():
+    """Leave no cached holders, messages or registered streams behind a test"""
+    yield
+    for getter in (
+        holder_id_cache,
+        holder_document_cache,
+        message_cache,
+        stream_registry,
+    ):
+        getter.clear()
+
+
 @pytest.fixture(scope="function")
 def test_db():
     Base.metadata.create_all(bind=engine)
@@ -73,12 +93,46 @@ async def async_client():
         yield client
 
 
+@pytest.fixture
+def make_message():
+    """Build an ingest payload; keyword arguments override its fields"""
+
+    def build(receiver_ispb="12345678", **overrides):
+        message = {
+            "endToEndId": f"E{uuid.uuid4().hex}",
+            "valor": 150.75,
+            "pagador": {
+                "nome": "Maria Silva",
+                "cpfCnpj": "11144477735",
+                "ispb": "87654321",
+                "agencia": "0001",
+                "contaTransacional": "123456",
+                "tipoConta": "CACC",
+            },
+            "recebedor": {
+                "nome": "Loja Exemplo Ltda",
+                "cpfCnpj": "11222333000181",
+                "ispb": receiver_ispb,
+                "agencia": "0002",
+                "contaTransacional": "654321",
+                "tipoConta": "CACC",
+            },
+            "campoLivre": "Pagamento de fatura",
+            "txId": "TX123456789",
+            "dataHoraPagamento": "2024-05-12T14:56:00Z",
+        }
+        message.update(overrides)
+        return message
+
+    return build
+
+
 @pytest.fixture(scope="function")
 def test_account_holder(db_session) -> Dict[str, Any]:
     """Create a test account holder"""
     account_data = {
         "nome": "Test User",
-        "cpfCnpj": "12345678901",
+        "cpfCnpj": "12345678909",
         "ispb": "12345678",
         "agencia": "1234",
         "contaTransacional": "123456",
@@ -104,7 +158,7 @@ def test_message(db_session, test_account_holder) -> Dict[str, Any]:
     """Create a test PIX message"""
     receiver_data = {
         "nome": "Receiver User",
-        "cpfCnpj": "98765432101",
+        "cpfCnpj": "98765432100",
         "ispb": "12345678",
         "agencia": "5678",
         "contaTransacional": "654321",
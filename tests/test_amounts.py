@@ -0,0 +1,107 @@
+import random
+from decimal import Decimal
+
+import orjson
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from amounts import MAX_EXACT_CENTAVOS, to_centavos, to_reais
+
+
+def test_to_centavos():
+    """Test that amounts in reais convert to exact centavos"""
+    assert to_centavos(0.29) == 29
+    assert to_centavos(150.75) == 15075
+    assert to_centavos(Decimal("1234567.89")) == 123456789
+    assert to_centavos("10") == 1000
+    assert to_centavos(3) == 300
+    with pytest.raises(ValueError):
+        to_centavos(1.234)
+
+
+def test_wire_encoding_is_lossless():
+    """Test that the encoded amount is exactly the stored number of centavos"""
+    rng = random.Random(1)
+    samples = [0, 1, 29, 10, MAX_EXACT_CENTAVOS - 1] + [
+        rng.randrange(MAX_EXACT_CENTAVOS) for _ in range(10000)
+    ]
+    for centavos in samples:
+        encoded = orjson.dumps(to_reais(centavos))
+        assert Decimal(encoded.decode()) * 100 == centavos
+
+
+def test_ingest_stores_exact_centavos(client: TestClient, db_session, make_message):
+    messages = [
+        make_message(valor=0.29),
+        make_message(valor=1.005),
+        make_message(valor=MAX_EXACT_CENTAVOS // 100),
+    ]
+
+    response = client.post("/api/pix/msgs", json=messages)
+
+    data = response.json()
+    assert data["accepted"] == 1
+    assert "decimal places" in data["errors"][0]["detail"]
+    assert "valor" in data["errors"][1]["detail"]
+
+    from models.pix_message import PixMessage
+
+    stored = db_session.query(PixMessage).one()
+    assert stored.valor_centavos == 29
+    assert stored.valor == 0.29
+
+    response = client.get("/api/pix/12345678/stream/start")
+    assert b'"valor":0.29,' in response.content
+
+
+def test_message_totals(client: TestClient, db_session, make_message):
+    messages = [
+        make_message(valor=0.1, dataHoraPagamento="2024-05-01T10:00:00"),
+        make_message(valor=0.2, dataHoraPagamento="2024-05-02T10:00:00"),
+        make_message(valor=1000.07, dataHoraPagamento="2024-06-01T10:00:00"),
+        make_message("87654321", valor=5, dataHoraPagamento="2024-05-03T10:00:00"),
+    ]
+    assert client.post("/api/pix/msgs", json=messages).json()["accepted"] == 4
+
+    response = client.get("/api/pix/totals")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [
+        {"ispb": "12345678", "count": 3, "total_centavos": 100037, "total": 1000.37},
+        {"ispb": "87654321", "count": 1, "total_centavos": 500, "total": 5.0},
+    ]
+
+    response = client.get(
+        "/api/pix/totals",
+        params={"start": "2024-05-01T00:00:00", "end": "2024-06-01T10:00:00"},
+    )
+    assert response.json() == [
+        {"ispb": "12345678", "count": 2, "total_centavos": 30, "total": 0.3},
+        {"ispb": "87654321", "count": 1, "total_centavos": 500, "total": 5.0},
+    ]
+
+    # 07:00-03:00 is 10:00 UTC, so the window ends right at the June message
+    response = client.get(
+        "/api/pix/totals",
+        params={"start": "2024-05-01T00:00:00Z", "end": "2024-06-01T07:00:00-03:00"},
+    )
+    assert [row["count"] for row in response.json()] == [2, 1]
+    response = client.get(
+        "/api/pix/totals",
+        params={"start": "2024-05-01T00:00:00Z", "end": "2024-06-01T07:00:01-03:00"},
+    )
+    assert [row["count"] for row in response.json()] == [3, 1]
+
+    response = client.get("/api/pix/totals", params={"ispb": "87654321"})
+    assert [row["ispb"] for row in response.json()] == ["87654321"]
+
+
+def test_message_totals_invalid_parameters(client: TestClient):
+    response = client.get("/api/pix/totals", params={"ispb": "1234"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.get(
+        "/api/pix/totals",
+        params={"start": "2024-06-01T00:00:00", "end": "2024-05-01T00:00:00"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
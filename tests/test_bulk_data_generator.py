@@ -0,0 +1,95 @@
+import csv
+import datetime
+import os
+
+import numpy as np
+
+from models.account_holder import AccountHolder
+from models.pix_message import PixMessage
+from utils.bulk_data_generator import (
+    BulkMessageGenerator,
+    generate_documents,
+    generate_holders,
+    insert_messages,
+    write_csv,
+)
+from validators import CNPJ_LENGTH, CPF_LENGTH, validate_documents
+
+
+def test_generate_documents_are_valid():
+    rng = np.random.default_rng(1)
+    for length in (CPF_LENGTH, CNPJ_LENGTH):
+        documents = generate_documents(rng, 5000, length).tolist()
+        assert all(len(document) == length for document in documents)
+        assert validate_documents(documents).all()
+
+
+def test_generate_holders():
+    holders = generate_holders(np.random.default_rng(2), 1000, ["12345678", "87654321"])
+
+    assert set(holders) == set(AccountHolder.FIELDS)
+    assert all(len(column) == 1000 for column in holders.values())
+    assert set(holders["ispb"].tolist()) == {"12345678", "87654321"}
+    assert validate_documents(holders["cpfCnpj"].tolist()).all()
+    assert all(5 <= len(conta) <= 10 for conta in holders["contaTransacional"])
+
+
+def test_message_columns_are_unique_across_batches():
+    since = datetime.datetime(2025, 1, 1)
+    generator = BulkMessageGenerator(["12345678"], payers=10, seed=3, since=since)
+    payer_ids, receiver_ids = np.arange(2, 12), np.array([1])
+
+    batches = [
+        generator.message_columns(500, payer_ids, receiver_ids) for _ in range(3)
+    ]
+    ids = [e2e for batch in batches for e2e in batch["endToEndId"].tolist()]
+    assert len(set(ids)) == 1500
+    assert all(len(e2e) == 32 and e2e.startswith("E12345678") for e2e in ids)
+
+    first = batches[0]
+    centavos = first["valor_centavos"]
+    assert ((centavos >= 100) & (centavos <= 1000000)).all()
+    assert set(first["payer_id"].tolist()) <= set(payer_ids.tolist())
+    assert (np.diff(first["dataHoraPagamento"]) >= np.timedelta64(0)).all()
+    assert first["dataHoraPagamento"][0] >= np.datetime64(since)
+
+
+def test_insert_messages(db_session):
+    inserted = list(
+        insert_messages(
+            db_session, 2500, ["12345678", "87654321"], payers=50, chunk_size=1000
+        )
+    )
+    assert inserted == [1000, 1000, 500]
+
+    messages = db_session.query(PixMessage).all()
+    assert len(messages) == 2500
+    assert {message.receiver_ispb for message in messages} == {"12345678", "87654321"}
+    assert not any(message.delivered for message in messages)
+    assert all(message.stream_id is None for message in messages)
+
+    serialized = PixMessage.serialize_by_ids(db_session, [messages[0].id])[0]
+    assert serialized["recebedor"]["ispb"] == messages[0].receiver_ispb
+    assert isinstance(serialized["dataHoraPagamento"], datetime.datetime)
+    assert validate_documents(
+        [holder.cpfCnpj for holder in db_session.query(AccountHolder)]
+    ).all()
+
+
+def test_write_csv(tmp_path):
+    holders_path, messages_path = write_csv(
+        str(tmp_path), 1200, ["12345678"], payers=20, chunk_size=500, seed=4
+    )
+
+    with open(holders_path, newline="") as holders_file:
+        holders = list(csv.DictReader(holders_file))
+    with open(messages_path, newline="") as messages_file:
+        messages = list(csv.DictReader(messages_file))
+
+    assert os.path.basename(messages_path) == "pix_messages.csv"
+    assert len(holders) == 21
+    assert holders[0]["ispb"] == "12345678"
+    assert len(messages) == 1200
+    assert {message["receiver_id"] for message in messages} == {"1"}
+    holder_ids = {holder["id"] for holder in holders}
+    assert {message["payer_id"] for message in messages} <= holder_ids
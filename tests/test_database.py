@@ -0,0 +1,30 @@
+from database import create_db_engine
+
+
+def test_sqlite_file_engine_pragmas(tmp_path):
+    """Test that file-backed SQLite connections get the tuning pragmas"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    try:
+        with engine.connect() as connection:
+            pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            assert pragma("journal_mode") == "wal"
+            # 1 is NORMAL
+            assert pragma("synchronous") == 1
+            assert pragma("busy_timeout") == 5000
+            assert pragma("cache_size") == -64 * 1024
+        assert engine.pool.size() == 10
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_memory_engine():
+    """Test that in-memory SQLite keeps the default pooling and journal"""
+    engine = create_db_engine("sqlite://")
+    try:
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("SELECT 1").scalar() == 1
+            assert (
+                connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "memory"
+            )
+    finally:
+        engine.dispose()
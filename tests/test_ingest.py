@@ -0,0 +1,168 @@
+import datetime
+import json
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+
+def test_ingest_json_array(client: TestClient, db_session, make_message):
+    """Test ingesting a JSON array with valid and invalid items"""
+    messages = [make_message(), make_message()]
+    invalid_document = make_message()
+    invalid_document["pagador"] = dict(invalid_document["pagador"], cpfCnpj="11111111112")
+    messages += [invalid_document, make_message(valor=-1), messages[0]]
+
+    response = client.post("/api/pix/msgs", json=messages)
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["rejected"] == 3
+    assert [error["index"] for error in data["errors"]] == [2, 3, 4]
+    assert data["errors"][0]["detail"] == "Invalid CPF"
+    assert "valor" in data["errors"][1]["detail"]
+    assert data["errors"][2]["detail"] == "Duplicate endToEndId in batch"
+
+    from models.account_holder import AccountHolder
+    from models.pix_message import PixMessage
+
+    stored = db_session.query(PixMessage).all()
+    assert len(stored) == 2
+    assert {message.receiver_ispb for message in stored} == {"12345678"}
+    # Both messages share the same payer and receiver
+    assert db_session.query(AccountHolder).count() == 2
+
+
+def test_ingest_ndjson_reports_existing_messages(
+    client: TestClient, db_session, make_message
+):
+    """Test NDJSON ingest and that already stored endToEndIds are rejected"""
+    first = make_message()
+    response = client.post("/api/pix/msgs", json=[first])
+    assert response.json()["accepted"] == 1
+
+    updated_receiver = make_message()["recebedor"]
+    updated_receiver["nome"] = "Loja Renomeada Ltda"
+    body = "\n".join(
+        [
+            json.dumps(first),
+            "{not json",
+            json.dumps(make_message(recebedor=updated_receiver)),
+        ]
+    )
+    response = client.post(
+        "/api/pix/msgs",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["accepted"] == 1
+    assert [(e["index"], e["detail"][:12]) for e in data["errors"]] == [
+        (0, "Duplicate en"),
+        (1, "Invalid JSON"),
+    ]
+
+    from models.account_holder import AccountHolder
+
+    receiver = (
+        db_session.query(AccountHolder)
+        .filter(AccountHolder.cpfCnpj == "11222333000181")
+        .one()
+    )
+    assert receiver.nome == "Loja Renomeada Ltda"
+
+
+def test_ingest_rejects_non_array_body(client: TestClient, db_session, make_message):
+    """Test that a JSON body that is not an array is rejected"""
+    response = client.post("/api/pix/msgs", json=make_message())
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_ingested_messages_are_streamed(client: TestClient, db_session, make_message):
+    """Test that ingested messages are delivered to the receiver's streams"""
+    messages = [make_message() for _ in range(3)]
+    client.post("/api/pix/msgs", json=messages)
+
+    response = client.get(
+        "/api/pix/12345678/stream/start", headers={"Accept": "multipart/json"}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert {m["endToEndId"] for m in response.json()} == {
+        m["endToEndId"] for m in messages
+    }
+
+
+def test_ingest_converts_payment_times_to_utc(
+    client: TestClient, db_session, make_message
+):
+    """Test that payment times with a UTC offset are stored as the same instant"""
+    messages = [
+        make_message(dataHoraPagamento="2024-01-01T12:00:00-03:00"),
+        make_message(dataHoraPagamento="2024-01-01T12:00:00Z"),
+        make_message(dataHoraPagamento="2024-01-01T12:00:00"),
+    ]
+    response = client.post("/api/pix/msgs", json=messages)
+    assert response.json()["accepted"] == 3
+
+    from models.pix_message import PixMessage
+
+    stored = {
+        message.endToEndId: message.dataHoraPagamento
+        for message in db_session.query(PixMessage)
+    }
+    assert [stored[message["endToEndId"]] for message in messages] == [
+        datetime.datetime(2024, 1, 1, 15, 0, 0),
+        datetime.datetime(2024, 1, 1, 12, 0, 0),
+        datetime.datetime(2024, 1, 1, 12, 0, 0),
+    ]
+
+    response = client.get(
+        "/api/pix/12345678/stream/start", headers={"Accept": "multipart/json"}
+    )
+    paid_at = {m["endToEndId"]: m["dataHoraPagamento"] for m in response.json()}
+    assert paid_at[messages[0]["endToEndId"]].startswith("2024-01-01T15:00:00")
+
+
+def test_ingest_rejects_invalid_receiver_document(
+    client: TestClient, db_session, make_message
+):
+    """Test that every item with an invalid document is reported as rejected"""
+    message = make_message()
+    message["recebedor"] = dict(message["recebedor"], cpfCnpj="11222333000182")
+
+    response = client.post("/api/pix/msgs", json=[message, make_message()])
+
+    data = response.json()
+    assert data["accepted"] == 1
+    assert data["rejected"] == 1
+    assert data["errors"] == [
+        {"index": 0, "endToEndId": message["endToEndId"], "detail": "Invalid CNPJ"}
+    ]
+
+
+def test_ingest_rejects_large_batch_before_validation(
+    client: TestClient, db_session, monkeypatch, make_message
+):
+    """Test that an oversized batch is rejected before its items are validated"""
+    from routes import ingest_routes
+
+    def fail(*args, **kwargs):
+        raise AssertionError("items were validated")
+
+    monkeypatch.setattr(ingest_routes, "MAX_INGEST_BATCH", 2)
+    monkeypatch.setattr(ingest_routes, "parse_ingest_items", fail)
+
+    response = client.post("/api/pix/msgs", json=[make_message()] * 3)
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+    body = "\n".join(json.dumps(make_message()) for _ in range(3))
+    response = client.post(
+        "/api/pix/msgs",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
@@ -0,0 +1,53 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from cache import ByteCache
+from models.pix_message import PixMessage
+from utils.message_cache import message_cache
+
+
+def test_byte_cache_bounds_total_size():
+    """Test that the cache evicts by total byte length"""
+    cache = ByteCache(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.put("c", b"1234")
+
+    assert "a" not in cache
+    assert cache.nbytes == 8
+
+    cache.put("big", b"x" * 11)
+    assert "big" not in cache
+
+    assert cache.pop("b") == b"1234"
+    assert cache.nbytes == 4
+
+
+def test_sent_messages_cached_until_acknowledged(client: TestClient, db_session):
+    """Test that encoded messages are reused on redelivery and evicted on ack"""
+    response = client.post("/api/util/msgs/12345678/4")
+    assert response.status_code == status.HTTP_201_CREATED
+    cache = message_cache(db_session.get_bind())
+
+    headers = {"Accept": "multipart/json"}
+    response = client.get("/api/pix/12345678/stream/start", headers=headers)
+    first = response.json()
+    keys = [message["endToEndId"] for message in first]
+    assert len(keys) == 4
+    assert all(key in cache for key in keys)
+    assert cache.misses == 4
+
+    # Put the batch back in the pool, as the reaper does, and send it again
+    pull_next = response.headers["Pull-Next"]
+    stream_id = pull_next.split("/")[-1].split("?")[0]
+    PixMessage.release_streams(db_session, [stream_id])
+    db_session.commit()
+
+    response = client.get(f"/api/pix/12345678/stream/{stream_id}", headers=headers)
+    assert response.json() == first
+    assert cache.hits == 4
+
+    response = client.delete(f"/api/pix/12345678/stream/{stream_id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert not any(key in cache for key in keys)
+    assert cache.nbytes == 0
@@ -0,0 +1,79 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from utils import metrics
+from utils.metrics import Histogram, instrument_engine, statement_label
+
+
+def test_histogram_text_format():
+    """Test the cumulative buckets, sum and count of a histogram"""
+    histogram = Histogram("test_seconds", "Test histogram", (0.1, 1.0), ("kind",))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5, "a")
+
+    assert list(histogram.collect()) == [
+        "# HELP test_seconds Test histogram",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{kind="a",le="0.1"} 1',
+        'test_seconds_bucket{kind="a",le="1.0"} 2',
+        'test_seconds_bucket{kind="a",le="+Inf"} 3',
+        'test_seconds_sum{kind="a"} 5.55',
+        'test_seconds_count{kind="a"} 3',
+    ]
+
+
+def test_statement_label():
+    """Test that statements are labelled by verb and table"""
+    assert (
+        statement_label("UPDATE pix_messages SET x=? WHERE id IN (SELECT id FROM y)")
+        == "update pix_messages"
+    )
+    assert statement_label('SELECT id FROM "account_holders"') == "select account_holders"
+    assert statement_label("INSERT INTO pix_messages (id) VALUES (?)") == (
+        "insert pix_messages"
+    )
+
+
+def test_metrics_endpoint(client: TestClient, db_session, test_stream):
+    """Test that stream activity and the database gauges are exposed"""
+    instrument_engine(db_session.get_bind().engine)
+
+    response = client.post("/api/util/msgs/12345678/3")
+    assert response.status_code == status.HTTP_201_CREATED
+    response = client.get(
+        f"/api/pix/12345678/stream/{test_stream['stream_id']}?batch=2",
+        headers={"Accept": "multipart/json"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith(metrics.CONTENT_TYPE)
+    body = response.text
+
+    assert "# TYPE pix_poll_wait_seconds histogram" in body
+    assert 'pix_batch_size_messages_bucket{le="2"}' in body
+    assert 'pix_db_query_seconds_count{statement="update pix_messages"}' in body
+    assert 'pix_active_streams{ispb="12345678"} 1' in body
+    assert 'pix_undelivered_messages{ispb="12345678",state="pending"} 1' in body
+    assert 'pix_undelivered_messages{ispb="12345678",state="dispatched"} 2' in body
+
+
+def test_cursor_acknowledgements_and_cache_counters(client: TestClient, db_session):
+    """Test that cursor acks are counted and cache hits are exported as counters"""
+    acknowledged = metrics.acknowledged_messages._values.get((), 0)
+
+    client.post("/api/util/msgs/12345678/3")
+    response = client.get(
+        "/api/pix/12345678/stream/start", headers={"Accept": "multipart/json"}
+    )
+    assert len(response.json()) == 3
+    client.get(response.headers["Pull-Next"], headers={"Accept": "multipart/json"})
+
+    assert metrics.acknowledged_messages._values[()] == acknowledged + 3
+
+    body = client.get("/metrics").text
+    assert "# TYPE pix_cache_hits_total counter" in body
+    assert 'pix_cache_misses_total{cache="messages"} 3' in body
+    assert 'pix_cache_hits_total{cache="holder_documents"}' in body
@@ -0,0 +1,254 @@
+import datetime
+import os
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from database import upgrade_database
+from models.pix_message import PixMessage
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "alembic.ini")
+
+
+@pytest.fixture(scope="function")
+def migrated_engine():
+    """In-memory database built by running every migration"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    config = Config(ALEMBIC_INI)
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+    yield engine
+    engine.dispose()
+
+
+def test_migrations_match_models(migrated_engine):
+    """Test that the migrations produce the schema declared by the models"""
+    with migrated_engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        assert compare_metadata(context, PixMessage.metadata) == []
+
+
+def test_receiver_ispb_backfill():
+    """Test that upgrading fills receiver_ispb for existing messages"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    config = Config(ALEMBIC_INI)
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "0002")
+        connection.exec_driver_sql(
+            "INSERT INTO account_holders "
+            '(id, nome, "cpfCnpj", ispb, agencia, "contaTransacional", "tipoConta") '
+            "VALUES (1, 'Payer', '12345678909', '87654321', '0001', '1', 'CACC'), "
+            "(2, 'Receiver', '98765432100', '12345678', '0001', '2', 'CACC')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO pix_messages "
+            '("endToEndId", valor, payer_id, receiver_id, "txId", "dataHoraPagamento", delivered) '
+            "VALUES ('E1', 10.0, 1, 2, 'TX1', '2024-01-01 00:00:00', 0)"
+        )
+        command.upgrade(config, "head")
+
+        receiver_ispb = connection.exec_driver_sql(
+            "SELECT receiver_ispb FROM pix_messages"
+        ).scalar()
+    engine.dispose()
+
+    assert receiver_ispb == "12345678"
+
+
+def test_duplicate_account_holders_merged():
+    """Test that upgrading merges duplicate holders before adding the constraint"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    config = Config(ALEMBIC_INI)
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "0003")
+        connection.exec_driver_sql(
+            "INSERT INTO account_holders "
+            '(id, nome, "cpfCnpj", ispb, agencia, "contaTransacional", "tipoConta") '
+            "VALUES (1, 'Payer', '12345678909', '87654321', '0001', '1', 'CACC'), "
+            "(2, 'Receiver', '98765432100', '12345678', '0001', '2', 'CACC'), "
+            "(3, 'Payer', '12345678909', '87654321', '0001', '1', 'CACC'), "
+            "(4, 'Receiver', '98765432100', '12345678', '0001', '2', 'CACC'), "
+            "(5, 'Payer', '12345678909', '87654321', '0001', '1', 'CACC')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO pix_messages "
+            '("endToEndId", valor, payer_id, receiver_id, receiver_ispb, "txId", '
+            '"dataHoraPagamento", delivered) '
+            "VALUES ('E1', 10.0, 1, 2, '12345678', 'TX1', '2024-01-01 00:00:00', 0), "
+            "('E2', 10.0, 3, 4, '12345678', 'TX2', '2024-01-01 00:00:00', 0), "
+            "('E3', 10.0, 5, 2, '12345678', 'TX3', '2024-01-01 00:00:00', 0)"
+        )
+        command.upgrade(config, "0004")
+
+        holder_ids = connection.exec_driver_sql(
+            "SELECT id FROM account_holders ORDER BY id"
+        ).scalars().all()
+        parties = connection.exec_driver_sql(
+            'SELECT payer_id, receiver_id FROM pix_messages ORDER BY "endToEndId"'
+        ).all()
+    engine.dispose()
+
+    assert holder_ids == [1, 2]
+    assert parties == [(1, 2), (1, 2), (1, 2)]
+
+
+def test_valor_centavos_backfill():
+    """Test that upgrading converts valor to exact centavos and back"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    config = Config(ALEMBIC_INI)
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "0005")
+        connection.exec_driver_sql(
+            "INSERT INTO account_holders "
+            '(id, nome, "cpfCnpj", ispb, agencia, "contaTransacional", "tipoConta") '
+            "VALUES (1, 'Payer', '12345678909', '87654321', '0001', '1', 'CACC')"
+        )
+        # 0.29 * 100 is 28.999999999999996 in floating point
+        connection.exec_driver_sql(
+            "INSERT INTO pix_messages "
+            '("endToEndId", valor, payer_id, receiver_id, receiver_ispb, "txId", '
+            '"dataHoraPagamento", delivered) '
+            "VALUES ('E1', 0.29, 1, 1, '87654321', 'TX1', '2024-01-01 00:00:00', 0), "
+            "('E2', 1234567.89, 1, 1, '87654321', 'TX2', '2024-01-01 00:00:00', 0)"
+        )
+        command.upgrade(config, "head")
+        centavos = connection.exec_driver_sql(
+            'SELECT valor_centavos FROM pix_messages ORDER BY "endToEndId"'
+        ).scalars().all()
+
+        command.downgrade(config, "0005")
+        valores = connection.exec_driver_sql(
+            'SELECT valor FROM pix_messages ORDER BY "endToEndId"'
+        ).scalars().all()
+    engine.dispose()
+
+    assert centavos == [29, 123456789]
+    assert valores == [0.29, 1234567.89]
+
+
+def test_upgrade_database_stamps_unversioned_baseline():
+    """Test that startup upgrades a database created before migrations existed"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    config = Config(ALEMBIC_INI)
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "0001")
+        # What `create_all` used to leave behind: the tables, no version
+        connection.exec_driver_sql("DROP TABLE alembic_version")
+
+    upgrade_database(engine)
+
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        assert compare_metadata(context, PixMessage.metadata) == []
+    engine.dispose()
+
+
+def explain(connection, statement, parameters):
+    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return " | ".join(row[3] for row in plan)
+
+
+def test_pending_message_indexes_used_at_scale(migrated_engine):
+    """Test that the poll, claim and reaper queries use indexes at 1M rows"""
+    from models.pix_message import MessageStream
+
+    with migrated_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO account_holders "
+            '(id, nome, "cpfCnpj", ispb, agencia, "contaTransacional", "tipoConta") '
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 1000) "
+            "SELECT x, 'Holder', printf('%011d', x), printf('%08d', x % 200), "
+            "'0001', '123456', 'CACC' FROM n"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO message_streams (stream_id, ispb, is_active) "
+            "VALUES ('stream-1', '00000001', 1)"
+        )
+        # Streams closed long ago, which the reaper must not walk through
+        connection.exec_driver_sql(
+            "INSERT INTO message_streams (stream_id, ispb, is_active, last_active) "
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 10000) "
+            "SELECT 'closed-' || x, '00000002', 0, '2024-01-01' FROM n"
+        )
+        # One million messages, 99.9% already delivered
+        connection.exec_driver_sql(
+            "INSERT INTO pix_messages "
+            '("endToEndId", valor_centavos, payer_id, receiver_id, receiver_ispb, '
+            '"txId", "dataHoraPagamento", delivered, stream_id) '
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 1000000) "
+            "SELECT 'E' || x, 1000, 1 + x % 1000, 1 + (x * 7) % 1000, "
+            "printf('%08d', (1 + (x * 7) % 1000) % 200), 'TX' || x, "
+            "datetime('2024-01-01', '+' || x || ' seconds'), x % 1000 != 0, "
+            "CASE WHEN x % 2000 = 0 THEN 'stream-1' END FROM n"
+        )
+        connection.exec_driver_sql("ANALYZE")
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(migrated_engine, "before_cursor_execute", capture)
+    try:
+        with Session(migrated_engine) as session:
+            PixMessage.get_undelivered_messages(session, "stream-1", limit=10)
+            poll_statement = captured[-1]
+
+            claimed = PixMessage.claim_for_stream(session, "stream-2", "00000001", 10)
+            claim_statement = captured[-1]
+
+            MessageStream.deactivate_idle_streams(session, datetime.datetime(2024, 6, 1))
+            reap_statement = captured[-1]
+            PixMessage.release_streams(session, ["stream-1"])
+            release_statement = captured[-1]
+            session.rollback()
+    finally:
+        event.remove(migrated_engine, "before_cursor_execute", capture)
+
+    assert claimed
+
+    with migrated_engine.connect() as connection:
+        poll_plan = explain(connection, *poll_statement)
+        claim_plan = explain(connection, *claim_statement)
+        reap_plan = explain(connection, *reap_statement)
+        release_plan = explain(connection, *release_statement)
+
+    assert "ix_pix_messages_stream_undelivered" in poll_plan
+    assert "TEMP B-TREE" not in poll_plan
+    assert "ix_pix_messages_ispb_pending" in claim_plan
+    assert "SCAN pix_messages" not in claim_plan
+    assert "account_holders" not in claim_plan
+    assert "TEMP B-TREE" not in claim_plan
+    assert "ix_message_streams_active_last_active" in reap_plan
+    assert "SCAN pix_messages" not in release_plan
@@ -10,7 +10,7 @@ def test_account_holder_model(db_session):
     # Create a new account holder
     account_data = {
         "nome": "Test User",
-        "cpfCnpj": "12345678901",
+        "cpfCnpj": "12345678909",
         "ispb": "12345678",
         "agencia": "1234",
         "contaTransacional": "123456",
@@ -24,13 +24,13 @@ def test_account_holder_model(db_session):
     # Retrieve the account holder
     retrieved = (
         db_session.query(AccountHolder)
-        .filter(AccountHolder.cpfCnpj == "12345678901")
+        .filter(AccountHolder.cpfCnpj == "12345678909")
         .first()
     )
 
     # Verify attributes
     assert retrieved.nome == "Test User"
-    assert retrieved.cpfCnpj == "12345678901"
+    assert retrieved.cpfCnpj == "12345678909"
     assert retrieved.ispb == "12345678"
     assert retrieved.agencia == "1234"
     assert retrieved.contaTransacional == "123456"
@@ -49,14 +49,14 @@ def test_account_holder_model(db_session):
 
     # Test creating a new account
     new_data = account_data.copy()
-    new_data["cpfCnpj"] = "98765432101"
+    new_data["cpfCnpj"] = "98765432100"
 
     new_account = AccountHolder.create_or_update(db_session, new_data)
     db_session.commit()
 
     # Verify new account
     assert new_account.id != account.id  # Different record
-    assert new_account.cpfCnpj == "98765432101"
+    assert new_account.cpfCnpj == "98765432100"
 
 
 def test_pix_message_model(db_session):
@@ -183,3 +183,178 @@ def test_message_stream_model(db_session):
     # Verify the stream is now inactive
     updated = MessageStream.get_by_stream_id(db_session, stream_id)
     assert updated.is_active is False
+
+
+def test_claim_for_stream(db_session):
+    """Test that claiming assigns each pending message to a single stream"""
+    from models.pix_message import PixMessage, MessageStream
+    from models.account_holder import AccountHolder
+
+    payer = AccountHolder(
+        nome="Payer",
+        cpfCnpj="11144477735",
+        ispb="87654321",
+        agencia="1234",
+        contaTransacional="123456",
+        tipoConta="CACC",
+    )
+    receiver = AccountHolder(
+        nome="Receiver",
+        cpfCnpj="52998224725",
+        ispb="12345678",
+        agencia="5678",
+        contaTransacional="654321",
+        tipoConta="SVGS",
+    )
+    db_session.add_all([payer, receiver])
+    db_session.flush()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for i in range(5):
+        db_session.add(
+            PixMessage(
+                endToEndId=str(uuid.uuid4()),
+                valor=10.0 + i,
+                payer_id=payer.id,
+                receiver_id=receiver.id,
+                txId=str(uuid.uuid4())[:30],
+                dataHoraPagamento=now - datetime.timedelta(minutes=i),
+                delivered=False,
+            )
+        )
+
+    first_stream, second_stream = str(uuid.uuid4()), str(uuid.uuid4())
+    db_session.add_all(
+        [
+            MessageStream(stream_id=first_stream, ispb="12345678"),
+            MessageStream(stream_id=second_stream, ispb="12345678"),
+        ]
+    )
+    db_session.commit()
+
+    first = PixMessage.claim_for_stream(db_session, first_stream, "12345678", 3)
+    db_session.commit()
+    second = PixMessage.claim_for_stream(db_session, second_stream, "12345678", 3)
+    db_session.commit()
+    other_ispb = PixMessage.claim_for_stream(db_session, second_stream, "87654321", 3)
+
+    assert len(first) == 3
+    assert len(second) == 2
+    assert other_ispb == []
+    assert not set(first) & set(second)
+
+    claimed = {m.id: m for m in db_session.query(PixMessage)}
+    assert [claimed[i].dataHoraPagamento for i in first] == sorted(
+        claimed[i].dataHoraPagamento for i in first
+    )
+    assert all(claimed[i].stream_id == first_stream for i in first)
+    assert all(claimed[i].dispatched_at is not None for i in first + second)
+    assert PixMessage.claim_for_stream(db_session, first_stream, "12345678", 3) == []
+
+    serialized = PixMessage.serialize_by_ids(db_session, first)
+    assert serialized == [claimed[i].to_dict() for i in first]
+
+
+def test_bulk_create_or_update(db_session):
+    """Test batched holder upserts and the recently written holder cache"""
+    from sqlalchemy import event
+
+    from models.account_holder import AccountHolder
+
+    def holder(cpfCnpj, nome):
+        return {
+            "nome": nome,
+            "cpfCnpj": cpfCnpj,
+            "ispb": "12345678",
+            "agencia": "0001",
+            "contaTransacional": "123456",
+            "tipoConta": "CACC",
+        }
+
+    statements = []
+    connection = db_session.connection()
+    event.listen(
+        connection, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+
+    existing = AccountHolder(**holder("11144477735", "Existing"))
+    db_session.add(existing)
+    db_session.flush()
+    statements.clear()
+
+    ids = AccountHolder.bulk_create_or_update(
+        db_session,
+        [
+            holder("11144477735", "Existing"),
+            holder("52998224725", "First"),
+            holder("52998224725", "Renamed"),
+        ],
+    )
+    assert ids[("11144477735", "12345678")] == existing.id
+    assert len(ids) == 2
+    # One lookup for both holders and one insert for the new one
+    assert len(statements) == 2
+    assert db_session.query(AccountHolder).count() == 2
+    renamed = AccountHolder.get_by_cpfCnpj_and_ispb(db_session, "52998224725", "12345678")
+    assert renamed.nome == "Renamed"
+
+    db_session.commit()
+    statements.clear()
+    assert (
+        AccountHolder.bulk_create_or_update(
+            db_session, [holder("11144477735", "Existing"), holder("52998224725", "Renamed")]
+        )
+        == ids
+    )
+    assert statements == []
+
+    AccountHolder.bulk_create_or_update(db_session, [holder("11144477735", "Updated")])
+    db_session.expire_all()
+    assert db_session.get(AccountHolder, existing.id).nome == "Updated"
+
+
+def test_holder_document_cache(db_session, test_account_holder):
+    """Test that serialized holders are cached and invalidated on update"""
+    from cache import TTLCache
+    from models.account_holder import AccountHolder, holder_document_cache
+
+    holder_id = test_account_holder["id"]
+    cache = holder_document_cache(db_session.get_bind())
+
+    document = AccountHolder.documents_by_id(db_session, [holder_id])[holder_id]
+    assert document["nome"] == "Test User"
+    assert AccountHolder.documents_by_id(db_session, [holder_id])[holder_id] is document
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate == 0.5
+
+    AccountHolder.create_or_update(db_session, {**document, "nome": "Renamed"})
+    db_session.commit()
+    assert holder_id not in cache
+    renamed = AccountHolder.documents_by_id(db_session, [holder_id])[holder_id]
+    assert renamed["nome"] == "Renamed"
+
+    expired = TTLCache(10, ttl=-1)
+    expired.put("key", "value")
+    assert expired.get("key") is None
+    assert (expired.hits, expired.misses, len(expired)) == (0, 1, 0)
+
+
+def test_mark_messages_delivered(db_session, test_message, test_stream):
+    """Test that acknowledging a stream counts and closes it in one transaction"""
+    from models.pix_message import PixMessage, MessageStream
+    from utils.message_processor import MessageProcessor
+
+    message = db_session.get(PixMessage, test_message["id"])
+    message.stream_id = test_stream["stream_id"]
+    db_session.commit()
+
+    acknowledged = MessageProcessor.mark_messages_delivered(
+        test_stream["stream_id"], db_session
+    )
+    assert acknowledged == 1
+    assert MessageProcessor.mark_messages_delivered(test_stream["stream_id"], db_session) == 0
+
+    db_session.expire_all()
+    assert db_session.get(PixMessage, test_message["id"]).delivered is True
+    stream = MessageStream.get_by_stream_id(db_session, test_stream["stream_id"])
+    assert stream.is_active is False
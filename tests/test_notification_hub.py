@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.notification_hub import NotificationBackend, NotificationHub
+
+
+@pytest.mark.asyncio
+async def test_wait_wakes_on_notify():
+    """Test that a waiting poller is woken by a notification for its ISPB"""
+    hub = NotificationHub()
+    version = hub.version("12345678")
+
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.05, hub.notify, "12345678")
+
+    start = time.monotonic()
+    woke = await hub.wait("12345678", version, timeout=5)
+
+    assert woke is True
+    assert time.monotonic() - start < 1
+    assert hub.version("12345678") == version + 1
+
+
+@pytest.mark.asyncio
+async def test_wait_ignores_other_ispbs():
+    """Test that notifications for another ISPB do not wake the poller"""
+    hub = NotificationHub()
+    version = hub.version("12345678")
+
+    asyncio.get_running_loop().call_later(0.01, hub.notify, "87654321")
+
+    woke = await hub.wait("12345678", version, timeout=0.2)
+
+    assert woke is False
+
+
+@pytest.mark.asyncio
+async def test_notification_before_wait_is_not_lost():
+    """Test that a notification sent between reading the version and waiting is kept"""
+    hub = NotificationHub()
+    version = hub.version("12345678")
+
+    hub.notify("12345678")
+
+    woke = await hub.wait("12345678", version, timeout=5)
+    assert woke is True
+
+
+@pytest.mark.asyncio
+async def test_notify_from_another_thread():
+    """Test that notify can be called outside the event loop"""
+    hub = NotificationHub()
+    version = hub.version("12345678")
+
+    threading.Timer(0.05, hub.notify, args=("12345678",)).start()
+
+    woke = await hub.wait("12345678", version, timeout=5)
+    assert woke is True
+
+
+def test_incomplete_backend_cannot_be_created():
+    """Test that a backend missing publish fails when it is instantiated"""
+
+    class StartOnlyBackend(NotificationBackend):
+        def start(self, listener):
+            pass
+
+    with pytest.raises(TypeError):
+        StartOnlyBackend()
@@ -283,3 +283,207 @@ def test_duplicate_message_prevention(client: TestClient, db_session, test_messa
     # Start a new stream - should not get the same message again (it's marked as delivered)
     response4 = client.get("/api/pix/12345678/stream/start")
     assert response4.status_code == status.HTTP_204_NO_CONTENT
+
+
+def test_parallel_streams_share_backlog(client: TestClient, db_session):
+    """Test that parallel streams claim disjoint batches of the ISPB backlog"""
+    response = client.post("/api/util/msgs/12345678/15")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    headers = {"Accept": "multipart/json"}
+    response1 = client.get("/api/pix/12345678/stream/start", headers=headers)
+    response2 = client.get("/api/pix/12345678/stream/start", headers=headers)
+
+    assert response1.status_code == status.HTTP_200_OK
+    assert response2.status_code == status.HTTP_200_OK
+
+    first = [message["endToEndId"] for message in response1.json()]
+    second = [message["endToEndId"] for message in response2.json()]
+
+    assert len(first) == 10
+    assert len(second) == 5
+    assert not set(first) & set(second)
+
+    from models.pix_message import PixMessage
+
+    stream_ids = {
+        message.stream_id
+        for message in db_session.query(PixMessage).filter(
+            PixMessage.endToEndId.in_(first + second)
+        )
+    }
+    assert len(stream_ids) == 2
+
+
+def test_continue_stream_wakes_on_new_messages(
+    client: TestClient, db_session, test_stream
+):
+    """Test that a waiting poll returns as soon as messages are generated"""
+    import threading
+    import time
+
+    result = {}
+
+    def poll():
+        start = time.monotonic()
+        result["response"] = client.get(
+            f"/api/pix/12345678/stream/{test_stream['stream_id']}"
+        )
+        result["elapsed"] = time.monotonic() - start
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    time.sleep(0.5)
+
+    response = client.post("/api/util/msgs/12345678/1")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    poller.join(timeout=10)
+    assert result["response"].status_code == status.HTTP_200_OK
+    assert result["elapsed"] < 4
+
+
+def test_pull_next_cursor_acknowledges_batches(client: TestClient, db_session):
+    """Test that following Pull-Next acknowledges the previous batch only"""
+    from models.pix_message import MessageStream, PixMessage
+
+    response = client.post("/api/util/msgs/12345678/15")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    headers = {"Accept": "multipart/json"}
+    response = client.get("/api/pix/12345678/stream/start", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    first = [message["endToEndId"] for message in response.json()]
+    pull_next = response.headers["Pull-Next"]
+    assert "?cursor=" in pull_next
+
+    def delivered():
+        db_session.expire_all()
+        return {
+            message.endToEndId
+            for message in db_session.query(PixMessage).filter(PixMessage.delivered)
+        }
+
+    assert delivered() == set()
+
+    response = client.get(pull_next, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    second = [message["endToEndId"] for message in response.json()]
+    assert len(second) == 5
+    assert delivered() == set(first)
+
+    # Nothing left to send: the next Pull-Next acks the second batch and
+    # has no cursor of its own
+    pull_next = response.headers["Pull-Next"]
+    stream_id = pull_next.split("/")[-1].split("?")[0]
+    response = client.get(pull_next)
+    assert delivered() == set(first + second)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert response.headers["Pull-Next"] == f"/api/pix/12345678/stream/{stream_id}"
+    assert MessageStream.get_by_stream_id(db_session, stream_id).is_active is True
+
+
+def test_retried_pull_next_resends_the_lost_batch(client: TestClient, db_session):
+    """Test that retrying a Pull-Next returns the batch whose response was lost"""
+    from models.pix_message import PixMessage
+
+    client.post("/api/util/msgs/12345678/30")
+    headers = {"Accept": "multipart/json"}
+    response = client.get("/api/pix/12345678/stream/start", headers=headers)
+    pull_next = response.headers["Pull-Next"]
+
+    # The response to this request is lost
+    lost = client.get(pull_next, headers=headers)
+    lost_batch = [message["endToEndId"] for message in lost.json()]
+
+    retried = client.get(pull_next, headers=headers)
+    assert retried.status_code == status.HTTP_200_OK
+    assert [message["endToEndId"] for message in retried.json()] == lost_batch
+    assert retried.headers["Pull-Next"] == lost.headers["Pull-Next"]
+
+    response = client.get(retried.headers["Pull-Next"], headers=headers)
+    third = [message["endToEndId"] for message in response.json()]
+    assert len(third) == 10
+    assert not set(third) & set(lost_batch)
+
+    db_session.expire_all()
+    delivered = {
+        message.endToEndId
+        for message in db_session.query(PixMessage).filter(PixMessage.delivered)
+    }
+    assert set(lost_batch) <= delivered
+    assert not set(third) & delivered
+
+
+def test_invalid_cursor(client: TestClient, db_session, test_stream):
+    """Test that a malformed cursor is rejected"""
+    response = client.get(
+        f"/api/pix/12345678/stream/{test_stream['stream_id']}?cursor=abc"
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_negotiated_batch_size(client: TestClient, db_session):
+    """Test batch sizes requested through the Accept header and the query"""
+    response = client.post("/api/util/msgs/12345678/30")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = client.get(
+        "/api/pix/12345678/stream/start",
+        headers={"Accept": "multipart/json; batch=25"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 25
+
+    # The query parameter is carried over to Pull-Next
+    stream_id = response.headers["Pull-Next"].split("/")[-1].split("?")[0]
+    response = client.get(
+        f"/api/pix/12345678/stream/{stream_id}?batch=3",
+        headers={"Accept": "multipart/json"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 3
+    assert "batch=3" in response.headers["Pull-Next"]
+
+    # Without multipart/json the response still carries a single message
+    response = client.get(f"/api/pix/12345678/stream/{stream_id}?batch=3")
+    assert isinstance(response.json(), dict)
+
+
+def test_invalid_batch_size(client: TestClient, db_session):
+    """Test that non-positive batch sizes are rejected"""
+    response = client.get(
+        "/api/pix/12345678/stream/start?batch=0",
+        headers={"Accept": "multipart/json"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.get(
+        "/api/pix/12345678/stream/start",
+        headers={"Accept": "multipart/json; batch=abc"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_ndjson_stream(client: TestClient, db_session):
+    """Test streaming a batch as newline-delimited JSON"""
+    import json
+
+    response = client.post("/api/util/msgs/12345678/12")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    headers = {"Accept": "application/x-ndjson"}
+    response = client.get("/api/pix/12345678/stream/start?batch=5", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    first = [json.loads(line) for line in response.text.splitlines()]
+    assert len(first) == 5
+    assert all("pagador" in message for message in first)
+    assert [m["dataHoraPagamento"] for m in first] == sorted(
+        m["dataHoraPagamento"] for m in first
+    )
+
+    response = client.get(response.headers["Pull-Next"], headers=headers)
+    second = [json.loads(line) for line in response.text.splitlines()]
+    assert len(second) == 5
+    assert not {m["endToEndId"] for m in first} & {m["endToEndId"] for m in second}
@@ -0,0 +1,55 @@
+import json
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+import utils.stream_events
+from models.pix_message import PixMessage
+
+
+def parse_events(body: str):
+    """Split an event stream into (id, data) pairs of its message events"""
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if ": " in line
+        )
+        if fields.get("event") == "message":
+            events.append((fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+def test_stream_events(client: TestClient, db_session, test_stream, monkeypatch):
+    """Test pushing messages as events and acknowledging with Last-Event-ID"""
+    monkeypatch.setattr(utils.stream_events, "STREAM_EVENTS_MAX_DURATION", 0.5)
+    stream_id = test_stream["stream_id"]
+
+    response = client.post("/api/util/msgs/12345678/3")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    url = f"/api/pix/12345678/stream/{stream_id}/events?batch=2"
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert len(events) == 3
+    # Only the last event of each batch carries the batch cursor
+    assert [event_id is not None for event_id, _ in events] == [False, True, True]
+
+    db_session.expire_all()
+    assert db_session.query(PixMessage).filter(PixMessage.delivered).count() == 0
+
+    # Reconnecting acknowledges everything up to the last event id
+    response = client.get(url, headers={"Last-Event-ID": events[-1][0]})
+    assert response.status_code == status.HTTP_200_OK
+    assert parse_events(response.text) == []
+
+    db_session.expire_all()
+    assert db_session.query(PixMessage).filter(PixMessage.delivered).count() == 3
+
+
+def test_stream_events_unknown_stream(client: TestClient, db_session):
+    """Test that events are only served for existing streams"""
+    response = client.get("/api/pix/12345678/stream/unknown/events")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,69 @@
+import datetime
+import uuid
+
+from models.pix_message import MessageStream, PixMessage
+from utils.stream_reaper import reap_idle_streams
+from utils.stream_registry import stream_registry
+
+
+def test_reap_idle_streams(db_session, test_message):
+    """Test that idle streams are deactivated and their messages released"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    idle_id, live_id = str(uuid.uuid4()), str(uuid.uuid4())
+    db_session.add_all(
+        [
+            MessageStream(
+                stream_id=idle_id,
+                ispb="12345678",
+                last_active=now - datetime.timedelta(minutes=10),
+            ),
+            MessageStream(stream_id=live_id, ispb="12345678", last_active=now),
+        ]
+    )
+    message = db_session.get(PixMessage, test_message["id"])
+    message.stream_id = idle_id
+    message.dispatched_at = now
+    db_session.commit()
+
+    registry = stream_registry(db_session.get_bind())
+    registry.add("12345678", idle_id)
+
+    reaped, released = reap_idle_streams(db_session, idle_timeout=60)
+
+    assert reaped == [(idle_id, "12345678")]
+    assert released == 1
+    assert registry.get_ispb(idle_id) is None
+
+    db_session.expire_all()
+    assert MessageStream.get_by_stream_id(db_session, idle_id).is_active is False
+    assert MessageStream.get_by_stream_id(db_session, live_id).is_active is True
+    message = db_session.get(PixMessage, test_message["id"])
+    assert message.stream_id is None
+    assert message.dispatched_at is None
+    assert message.delivered is False
+
+    # The released message can be claimed by another stream
+    assert PixMessage.claim_for_stream(db_session, live_id, "12345678") == [message.id]
+
+
+def test_reaper_keeps_streams_with_recent_activity(db_session):
+    """Test that activity still held by the registry protects a stream"""
+    stream_id = str(uuid.uuid4())
+    db_session.add(
+        MessageStream(
+            stream_id=stream_id,
+            ispb="12345678",
+            last_active=datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(minutes=10),
+        )
+    )
+    db_session.commit()
+
+    registry = stream_registry(db_session.get_bind())
+    registry.add("12345678", stream_id)
+    registry.touch(stream_id)
+
+    reaped, _ = reap_idle_streams(db_session, idle_timeout=60)
+
+    assert reaped == []
+    assert registry.get_ispb(stream_id) == "12345678"
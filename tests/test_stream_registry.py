@@ -0,0 +1,53 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from models.pix_message import MessageStream, PixMessage
+from utils.stream_registry import StreamRegistry, flush_stream_activity, stream_registry
+
+
+def test_registry_enforces_stream_limit():
+    """Test slot reservation against the in-memory count"""
+    registry = StreamRegistry()
+    registry.load("12345678", ["a", "b"])
+    registry.load("12345678", [])
+
+    assert registry.active_count("12345678") == 2
+    assert registry.reserve("12345678", "c", 3)
+    assert not registry.reserve("12345678", "d", 3)
+
+    registry.discard("a")
+    assert registry.get_ispb("a") is None
+    assert registry.reserve("12345678", "d", 3)
+    assert registry.get_ispb("d") == "12345678"
+
+
+def test_continue_stream_defers_activity_write(
+    client: TestClient, db_session, test_stream, test_message
+):
+    """Test that a continue-poll records activity without writing the stream"""
+    stream_id = test_stream["stream_id"]
+    message = db_session.get(PixMessage, test_message["id"])
+    message.stream_id = stream_id
+    db_session.commit()
+
+    stream = MessageStream.get_by_stream_id(db_session, stream_id)
+    last_active = stream.last_active
+
+    statements = []
+    engine = db_session.get_bind().engine
+    capture = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(f"/api/pix/12345678/stream/{stream_id}")
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not [sql for sql in statements if sql.startswith("UPDATE message_streams")]
+    assert stream_registry(engine).get_ispb(stream_id) == "12345678"
+
+    assert flush_stream_activity() >= 1
+    db_session.expire_all()
+    stream = MessageStream.get_by_stream_id(db_session, stream_id)
+    assert stream.last_active > last_active
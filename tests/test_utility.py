@@ -1,6 +1,17 @@
+import asyncio
+import time
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
+from utils.generation_jobs import (
+    GENERATE_MAX_MESSAGES,
+    GENERATE_SYNC_MAX,
+    GenerationJob,
+    GenerationJobs,
+)
+
 
 def test_generate_test_messages(client: TestClient, db_session):
     """Test generating test messages"""
@@ -49,7 +60,7 @@ def test_generate_test_messages_invalid_ispb(client: TestClient, db_session):
 
 def test_generate_test_messages_invalid_number(client: TestClient, db_session):
     """Test generating test messages with an invalid number"""
-    response = client.post("/api/util/msgs/12345678/101")
+    response = client.post(f"/api/util/msgs/12345678/{GENERATE_MAX_MESSAGES + 1}")
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
 
@@ -66,6 +77,80 @@ def test_generate_test_messages_invalid_number(client: TestClient, db_session):
     assert "Number of messages" in data["detail"]
 
 
+def wait_for_job(client: TestClient, location: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(location).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("Generation job did not finish in time")
+
+
+def test_generate_test_messages_background_job(client: TestClient, db_session):
+    """Counts above the inline limit are generated by a background job"""
+    number = GENERATE_SYNC_MAX + 150
+    response = client.post(f"/api/util/msgs/12345678/{number}")
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job = response.json()
+    assert job["messages_requested"] == number
+    assert job["receiver_ispb"] == "12345678"
+    location = response.headers["Location"]
+    assert location.endswith(f"/api/util/jobs/{job['job_id']}")
+
+    job = wait_for_job(client, location)
+    assert job["status"] == "completed"
+    assert job["messages_generated"] == number
+    assert job["progress"] == 1
+    assert job["rate"] > 0
+    assert job["error"] is None
+
+    from models.pix_message import PixMessage
+
+    messages = db_session.query(PixMessage).all()
+    assert len(messages) == number
+    assert {message.receiver_ispb for message in messages} == {"12345678"}
+
+    response = client.get(
+        "/api/pix/12345678/stream/start",
+        headers={"Accept": "multipart/json; batch=100"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 100
+
+
+def test_generation_job_not_found(client: TestClient):
+    """Test that an unknown job id is answered with 404"""
+    response = client.get("/api/util/jobs/unknown")
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_generation_job_chunks_and_cancel(db_session):
+    """Test that a job reports progress after every chunk and can be cancelled"""
+    jobs = GenerationJobs()
+    job = jobs.start(db_session.get_bind(), "12345678", 35, chunk_size=10)
+    # The job hands every chunk to the executor and resumes on the event
+    # loop, so yielding once per iteration observes every committed chunk
+    progress = []
+    while not job.finished:
+        if not progress or progress[-1] != job.generated:
+            progress.append(job.generated)
+        await asyncio.sleep(0)
+    assert job.status == GenerationJob.COMPLETED
+    assert progress == [0, 10, 20, 30, 35]
+    assert job.to_dict()["progress"] == 1
+
+    job = jobs.start(db_session.get_bind(), "12345678", 100000, chunk_size=100)
+    while job.generated == 0:
+        await asyncio.sleep(0.01)
+    await jobs.shutdown()
+    assert job.status == GenerationJob.CANCELLED
+    assert 0 < job.generated < 100000
+
+
 def test_generate_test_messages_verify_content(client: TestClient, db_session):
     """Test the content of generated test messages"""
     response = client.post("/api/util/msgs/12345678/1")
@@ -87,3 +172,4 @@ def test_generate_test_messages_verify_content(client: TestClient, db_session):
     assert message.pagador is not None
     assert message.recebedor is not None
     assert message.recebedor.ispb == "12345678"
+    assert message.receiver_ispb == "12345678"
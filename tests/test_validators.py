@@ -0,0 +1,63 @@
+import random
+import re
+
+import pytest
+from validate_docbr import CPF, CNPJ
+
+from validators import (
+    is_valid_document,
+    validate_document,
+    validate_documents,
+)
+
+
+def sample_documents(count=2000):
+    documents = CPF().generate_list(count // 2) + CNPJ().generate_list(count // 2)
+    # Corrupt a check digit on roughly a third of them
+    for i in random.sample(range(len(documents)), len(documents) // 3):
+        last = (int(documents[i][-1]) + random.randint(1, 9)) % 10
+        documents[i] = documents[i][:-1] + str(last)
+    edge_cases = [
+        "11111111111",
+        "00000000000000",
+        "1114447773a",
+        "111.444.777-35",
+        "11.222.333/0001-81",
+        "1234567890",
+        "",
+        "11144477735",
+        "11222333000181",
+    ]
+    return documents + edge_cases
+
+
+def reference(document):
+    if len(document) == 11:
+        return CPF().validate(document)
+    if len(document) == 14:
+        return CNPJ().validate(document)
+    return False
+
+
+def test_validators_match_validate_docbr():
+    """Test that scalar and batch validation agree with validate_docbr"""
+    documents = sample_documents()
+    expected = [reference(document) for document in documents]
+
+    assert [is_valid_document(document) for document in documents] == expected
+    assert validate_documents(documents).tolist() == expected
+    assert validate_documents([]).tolist() == []
+
+
+@pytest.mark.parametrize(
+    "document,detail",
+    [
+        ("11144477736", "Invalid CPF"),
+        ("11222333000182", "Invalid CNPJ"),
+        ("123", "cpfCnpj must be either 11 (CPF) or 14 (CNPJ) digits"),
+    ],
+)
+def test_validate_document_errors(document, detail):
+    """Test the error raised for each kind of invalid document"""
+    with pytest.raises(ValueError, match=re.escape(detail)):
+        validate_document(document)
@@ -0,0 +1,15 @@
+import datetime
+
+# Timestamps are stored as naive UTC: SQLite's DateTime drops any tzinfo, so
+# an aware value must be converted before it reaches the database or it
+# would be stored with its local wall-clock time.
+
+
+def to_naive_utc(value: datetime.datetime) -> datetime.datetime:
+    """
+    The same instant as a naive UTC datetime. Naive values are taken to be
+    in UTC already and are returned unchanged.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
@@ -1,4 +1,5 @@
 from utils.message_processor import MessageProcessor
+from utils.notification_hub import NotificationHub, notification_hub
 from utils.test_data_generator import (
     generate_random_pix_message,
     generate_random_account,
@@ -0,0 +1,398 @@
+import csv
+import datetime
+import os
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models.account_holder import AccountHolder
+from models.pix_message import PixMessage
+from utils.test_data_generator import (
+    ACCOUNT_TYPES,
+    BANK_NAMES,
+    TRANSACTION_DESCRIPTIONS,
+)
+from validators import CNPJ_LENGTH, CPF_LENGTH, check_digits
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 50000))
+
+FIRST_NAMES = (
+    "Ana",
+    "Beatriz",
+    "Bruno",
+    "Camila",
+    "Carlos",
+    "Daniel",
+    "Eduarda",
+    "Felipe",
+    "Fernanda",
+    "Gabriel",
+    "Helena",
+    "Igor",
+    "Juliana",
+    "Lucas",
+    "Mariana",
+    "Pedro",
+    "Rafael",
+    "Sofia",
+    "Thiago",
+    "Vitória",
+)
+LAST_NAMES = (
+    "Almeida",
+    "Araújo",
+    "Barbosa",
+    "Cardoso",
+    "Costa",
+    "Ferreira",
+    "Gomes",
+    "Lima",
+    "Martins",
+    "Oliveira",
+    "Pereira",
+    "Ribeiro",
+    "Rodrigues",
+    "Santos",
+    "Silva",
+    "Souza",
+)
+COMPANY_SUFFIXES = ("Ltda", "S.A.", "Inc.")
+
+# Share of generated holders that are people (CPF) rather than companies (CNPJ)
+PERSON_RATIO = 0.7
+# Share of generated messages with a campoLivre
+CAMPO_LIVRE_RATIO = 0.8
+# Amounts are drawn in centavos, from R$ 1,00 to R$ 10.000,00
+MIN_CENTAVOS = 100
+MAX_CENTAVOS = 1000000
+TX_ID_LENGTH = 25
+RUN_TOKEN_LENGTH = 12
+SEQUENCE_DIGITS = 11
+
+_ALPHANUMERIC = np.frombuffer(
+    b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz", dtype=np.uint8
+)
+
+MESSAGE_COLUMNS = (
+    "endToEndId",
+    "valor_centavos",
+    "payer_id",
+    "receiver_id",
+    "receiver_ispb",
+    "campoLivre",
+    "txId",
+    "dataHoraPagamento",
+    "delivered",
+)
+
+
+def _to_strings(codes: np.ndarray) -> np.ndarray:
+    """Turn a matrix of ASCII codes into an array of strings, one per row"""
+    codes = np.ascontiguousarray(codes, dtype=np.uint8)
+    return codes.view(f"S{codes.shape[1]}").ravel().astype(str)
+
+
+def _ascii_codes(strings: Sequence[str], length: int) -> np.ndarray:
+    """Matrix of ASCII codes of fixed-length strings, one row per string"""
+    raw = "".join(strings).encode("ascii")
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, length)
+
+
+def _digit_codes(numbers: np.ndarray, width: int) -> np.ndarray:
+    """ASCII codes of zero-padded non-negative integers"""
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (numbers[:, None] // powers % 10 + 48).astype(np.uint8)
+
+
+def _digit_strings(digits: np.ndarray) -> np.ndarray:
+    return _to_strings(digits + 48)
+
+
+def _number_strings(numbers: np.ndarray, width: int) -> np.ndarray:
+    """Zero-padded decimal representation of non-negative integers"""
+    return _to_strings(_digit_codes(numbers, width))
+
+
+def _alphanumeric(rng: np.random.Generator, count: int, length: int) -> np.ndarray:
+    return _ALPHANUMERIC[rng.integers(0, len(_ALPHANUMERIC), (count, length))]
+
+
+def _sample(rng: np.random.Generator, pool: Sequence[str], count: int) -> np.ndarray:
+    return np.array(pool)[rng.integers(0, len(pool), count)]
+
+
+def _join_names(rng, count, first_pool, last_pool):
+    """`count` names made of a word sampled from each pool"""
+    first = _sample(rng, first_pool, count)
+    return np.char.add(np.char.add(first, " "), _sample(rng, last_pool, count))
+
+
+def generate_documents(
+    rng: np.random.Generator, count: int, length: int = CPF_LENGTH
+) -> np.ndarray:
+    """
+    Generate `count` valid CPFs (length 11) or CNPJs (length 14). Base digits
+    are drawn as one matrix and completed with their check digits.
+    """
+    base = rng.integers(0, 10, (count, length - 2), dtype=np.int32)
+    # Documents with a single repeated digit are rejected by the validators
+    repeated = (base == base[:, :1]).all(axis=1)
+    base[repeated, 0] = (base[repeated, 0] + 1) % 10
+    return _digit_strings(check_digits(base, length))
+
+
+def generate_holders(
+    rng: np.random.Generator, count: int, ispbs: Optional[Sequence[str]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Columns of `count` random account holders, keyed by AccountHolder field.
+    Names are sampled by index from small pools. Holders are spread over
+    `ispbs` in turn, or get random ISPBs when none are given.
+    """
+    person = rng.random(count) < PERSON_RATIO
+    people = int(person.sum())
+
+    nome = np.empty(count, dtype=object)
+    nome[person] = _join_names(rng, people, FIRST_NAMES, LAST_NAMES)
+    nome[~person] = _join_names(rng, count - people, BANK_NAMES, COMPANY_SUFFIXES)
+
+    cpfCnpj = np.empty(count, dtype=object)
+    cpfCnpj[person] = generate_documents(rng, people, CPF_LENGTH)
+    cpfCnpj[~person] = generate_documents(rng, count - people, CNPJ_LENGTH)
+
+    if ispbs is not None and len(ispbs):
+        ispb = np.array(ispbs)[np.arange(count) % len(ispbs)]
+    else:
+        ispb = _number_strings(rng.integers(0, 10**8, count), 8)
+
+    # 5 to 10 digits, without leading zeros
+    lengths = rng.integers(5, 11, count)
+    conta = rng.integers(10 ** (lengths - 1), 10**lengths, dtype=np.int64)
+
+    return {
+        "nome": nome,
+        "cpfCnpj": cpfCnpj,
+        "ispb": ispb,
+        "agencia": _number_strings(rng.integers(0, 10000, count), 4),
+        "contaTransacional": conta.astype(str),
+        "tipoConta": _sample(rng, ACCOUNT_TYPES, count),
+    }
+
+
+class BulkMessageGenerator:
+    """
+    Columnar generator of random PIX messages for seeding large databases.
+
+    Each batch is drawn as NumPy arrays: amounts in centavos, payment times
+    as offsets from `since`, payer and receiver indexes, campoLivre as an
+    index into a pool and txIds as character matrices. endToEndIds are a run
+    token followed by a sequence number, so they are unique across batches
+    without any lookup. Only the final conversion to Python rows is per
+    message.
+    """
+
+    def __init__(
+        self,
+        receiver_ispbs: Sequence[str],
+        payers: int = 10000,
+        seed: Optional[int] = None,
+        since: Optional[datetime.datetime] = None,
+        window: datetime.timedelta = datetime.timedelta(days=30),
+    ):
+        if len(receiver_ispbs) == 0:
+            raise ValueError("At least one receiver ISPB is required")
+        self.rng = np.random.default_rng(seed)
+        self.receiver_ispbs = np.array(receiver_ispbs)
+        self._receiver_codes = _ascii_codes(receiver_ispbs, 8)
+        self.payers = payers
+        self.window_seconds = int(window.total_seconds())
+        self.since = since or datetime.datetime.now().replace(microsecond=0) - window
+        self._run_token = _alphanumeric(self.rng, 1, RUN_TOKEN_LENGTH)
+        self.sequence = 0
+        self._campo_livre = np.array(
+            list(TRANSACTION_DESCRIPTIONS) + [None], dtype=object
+        )
+
+    def holders(self) -> Dict[str, np.ndarray]:
+        """One holder per receiver ISPB followed by the payers"""
+        receivers = generate_holders(
+            self.rng, len(self.receiver_ispbs), self.receiver_ispbs
+        )
+        payers = generate_holders(self.rng, self.payers)
+        return {
+            field: np.concatenate([receivers[field], payers[field]])
+            for field in AccountHolder.FIELDS
+        }
+
+    def message_columns(
+        self, count: int, payer_ids: np.ndarray, receiver_ids: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """
+        Columns of the next `count` messages, keyed by PixMessage column.
+        `receiver_ids` are aligned with the receiver ISPBs.
+        """
+        rng = self.rng
+        receiver = rng.integers(0, len(self.receiver_ispbs), count)
+        receiver_ispb = self.receiver_ispbs[receiver]
+
+        # "E", receiver ISPB, run token, sequence number: 32 characters
+        sequence = self.sequence + np.arange(count, dtype=np.int64)
+        self.sequence += count
+        end_to_end_id = np.concatenate(
+            [
+                np.full((count, 1), ord("E"), dtype=np.uint8),
+                self._receiver_codes[receiver],
+                np.broadcast_to(self._run_token, (count, RUN_TOKEN_LENGTH)),
+                _digit_codes(sequence, SEQUENCE_DIGITS),
+            ],
+            axis=1,
+        )
+
+        campo_livre = rng.integers(0, len(TRANSACTION_DESCRIPTIONS), count)
+        campo_livre[rng.random(count) >= CAMPO_LIVRE_RATIO] = len(
+            TRANSACTION_DESCRIPTIONS
+        )
+
+        # Sorted, so a batch is in payment order and the indexes on
+        # dataHoraPagamento are written in order rather than at random
+        offsets = np.sort(rng.integers(0, self.window_seconds, count))
+        offsets = offsets.astype("timedelta64[s]")
+        paid_at = np.datetime64(self.since, "us") + offsets
+
+        return {
+            "endToEndId": _to_strings(end_to_end_id),
+            "valor_centavos": rng.integers(MIN_CENTAVOS, MAX_CENTAVOS + 1, count),
+            "payer_id": np.asarray(payer_ids)[rng.integers(0, len(payer_ids), count)],
+            "receiver_id": np.asarray(receiver_ids)[receiver],
+            "receiver_ispb": receiver_ispb,
+            "campoLivre": self._campo_livre[campo_livre],
+            "txId": _to_strings(_alphanumeric(rng, count, TX_ID_LENGTH)),
+            "dataHoraPagamento": paid_at,
+            "delivered": np.zeros(count, dtype=bool),
+        }
+
+
+def _sqlite_datetimes(values: np.ndarray) -> np.ndarray:
+    """datetime64 values in the storage format of SQLAlchemy's SQLite DateTime"""
+    codes = _ascii_codes(np.datetime_as_string(values, unit="us").tolist(), 26).copy()
+    codes[:, 10] = ord(" ")
+    return _to_strings(codes)
+
+
+def _execute_rows(connection, table, columns: Dict[str, np.ndarray]) -> None:
+    """
+    INSERT the columns with one DBAPI executemany. SQLAlchemy's per-row
+    parameter processing costs more than SQLite's insert itself, so values
+    are converted per column instead: datetimes are formatted for SQLite
+    and everything else is passed as native Python values.
+    """
+    compiled = insert(table).compile(dialect=connection.dialect, column_keys=columns)
+    if connection.dialect.name == "sqlite":
+        columns = {
+            key: _sqlite_datetimes(values) if values.dtype.kind == "M" else values
+            for key, values in columns.items()
+        }
+    values = {key: column.tolist() for key, column in columns.items()}
+    if compiled.positional:
+        rows = list(zip(*(values[key] for key in compiled.positiontup)))
+    else:
+        rows = [dict(zip(values, row)) for row in zip(*values.values())]
+    connection.exec_driver_sql(str(compiled), rows)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _chunks(count: int, chunk_size: int) -> Iterator[int]:
+    for start in range(0, count, chunk_size):
+        yield min(chunk_size, count - start)
+
+
+def insert_messages(
+    session: Session,
+    count: int,
+    receiver_ispbs: Sequence[str],
+    payers: int = 10000,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    seed: Optional[int] = None,
+) -> Iterator[int]:
+    """
+    Insert `count` random pending messages received by `receiver_ispbs`,
+    yielding the number of messages inserted after each chunk.
+
+    Account holders are upserted once with
+    AccountHolder.bulk_create_or_update; messages are written with a plain
+    executemany INSERT per chunk, each chunk in its own transaction, so
+    progress is visible to other connections while the backlog grows.
+    """
+    generator = BulkMessageGenerator(receiver_ispbs, payers, seed)
+    holders = generator.holders()
+    rows = [
+        dict(zip(AccountHolder.FIELDS, values))
+        for values in zip(*(holders[field].tolist() for field in AccountHolder.FIELDS))
+    ]
+    ids = AccountHolder.bulk_create_or_update(session, rows)
+    session.commit()
+
+    holder_ids = np.array([ids[(row["cpfCnpj"], row["ispb"])] for row in rows])
+    receiver_ids = holder_ids[: len(receiver_ispbs)]
+    payer_ids = holder_ids[len(receiver_ispbs) :]
+
+    for size in _chunks(count, chunk_size):
+        columns = generator.message_columns(size, payer_ids, receiver_ids)
+        columns["created_at"] = np.full(size, np.datetime64(_utcnow(), "us"))
+        _execute_rows(session.connection(), PixMessage.__table__, columns)
+        session.commit()
+        yield size
+
+
+def write_csv(
+    directory: str,
+    count: int,
+    receiver_ispbs: Sequence[str],
+    payers: int = 10000,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    seed: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Tuple[str, str]:
+    """
+    Write `count` random messages and their account holders as
+    account_holders.csv and pix_messages.csv in `directory`, with a header
+    row of column names and holder ids numbered from 1, ready for a bulk
+    loader such as Postgres COPY ... CSV HEADER into empty tables. Returns
+    both paths.
+    """
+    generator = BulkMessageGenerator(receiver_ispbs, payers, seed)
+    holders = generator.holders()
+    holder_ids = np.arange(1, len(holders["cpfCnpj"]) + 1)
+
+    holders_path = os.path.join(directory, "account_holders.csv")
+    with open(holders_path, "w", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(("id",) + AccountHolder.FIELDS)
+        writer.writerows(
+            zip(
+                holder_ids.tolist(),
+                *(holders[field].tolist() for field in AccountHolder.FIELDS),
+            )
+        )
+
+    receiver_ids = holder_ids[: len(receiver_ispbs)]
+    payer_ids = holder_ids[len(receiver_ispbs) :]
+    messages_path = os.path.join(directory, "pix_messages.csv")
+    with open(messages_path, "w", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(MESSAGE_COLUMNS)
+        for size in _chunks(count, chunk_size):
+            columns = generator.message_columns(size, payer_ids, receiver_ids)
+            columns["dataHoraPagamento"] = np.datetime_as_string(
+                columns["dataHoraPagamento"], unit="s"
+            )
+            writer.writerows(zip(*(column.tolist() for column in columns.values())))
+            if progress:
+                progress(size)
+
+    return holders_path, messages_path
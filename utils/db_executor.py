@@ -0,0 +1,54 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", 8))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_max_workers = DB_EXECUTOR_WORKERS
+
+
+def configure_db_executor(max_workers: int) -> None:
+    """
+    Resize the database executor. A value of 0 runs database calls inline on
+    the event loop, which is only meant for debugging and benchmarks.
+    """
+    global _executor, _max_workers
+    shutdown_db_executor()
+    _max_workers = max_workers
+
+
+def shutdown_db_executor() -> None:
+    """Stop the worker threads; a new pool is created on the next call"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=_max_workers, thread_name_prefix="db-worker"
+        )
+    return _executor
+
+
+async def run_in_db_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking SQLAlchemy call on the bounded database thread pool so it
+    does not stall the event loop. A Session must only be used by one call at
+    a time, which holds as long as callers await each call before the next.
+    """
+    if _max_workers <= 0:
+        return func(*args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), functools.partial(func, *args, **kwargs)
+    )
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from utils.bulk_data_generator import insert_messages
+from utils.db_executor import run_in_db_executor
+from utils.notification_hub import notification_hub
+
+# Requests for up to this many messages are generated inline; larger ones
+# run as a background job
+GENERATE_SYNC_MAX = int(os.getenv("GENERATE_SYNC_MAX", 100))
+# Largest number of messages a single request may generate
+GENERATE_MAX_MESSAGES = int(os.getenv("GENERATE_MAX_MESSAGES", 10000000))
+# Messages per INSERT transaction of a job. On SQLite every chunk holds the
+# write lock while it is inserted, so smaller chunks interleave better with
+# the stream claims
+GENERATE_JOB_CHUNK_SIZE = int(os.getenv("GENERATE_JOB_CHUNK_SIZE", 10000))
+# Distinct payers of the messages of a job
+GENERATE_JOB_PAYERS = int(os.getenv("GENERATE_JOB_PAYERS", 10000))
+# Finished jobs kept for the status endpoint
+GENERATE_JOB_HISTORY = int(os.getenv("GENERATE_JOB_HISTORY", 100))
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationJob:
+    """Progress of one background generation of test messages"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, ispb: str, requested: int):
+        self.job_id = str(uuid.uuid4())
+        self.ispb = ispb
+        self.requested = requested
+        self.generated = 0
+        self.status = self.QUEUED
+        self.error: Optional[str] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.COMPLETED, self.FAILED, self.CANCELLED)
+
+    @property
+    def elapsed(self) -> float:
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.monotonic()) - self._started
+
+    @property
+    def rate(self) -> float:
+        """Messages inserted per second since the job started"""
+        elapsed = self.elapsed
+        return self.generated / elapsed if elapsed else 0.0
+
+    def cancel(self) -> None:
+        """Stop the job after the chunk being inserted"""
+        self._cancel.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "receiver_ispb": self.ispb,
+            "messages_requested": self.requested,
+            "messages_generated": self.generated,
+            "progress": round(self.generated / self.requested, 4),
+            "rate": round(self.rate, 1),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "error": self.error,
+        }
+
+
+class GenerationJobs:
+    """
+    Background jobs that insert large numbers of test messages.
+
+    A job walks `utils.bulk_data_generator.insert_messages` one chunk at a
+    time on the database executor, so it never holds a worker thread for
+    longer than a chunk, and notifies the receiver's streams after every
+    committed chunk. Jobs live in the memory of the worker that started
+    them; the most recent GENERATE_JOB_HISTORY finished ones are kept.
+    """
+
+    def __init__(self, history: int = GENERATE_JOB_HISTORY):
+        self.history = history
+        self._jobs: "OrderedDict[str, GenerationJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        return self._jobs.get(job_id)
+
+    def start(
+        self,
+        bind,
+        ispb: str,
+        count: int,
+        chunk_size: int = GENERATE_JOB_CHUNK_SIZE,
+        payers: int = GENERATE_JOB_PAYERS,
+    ) -> GenerationJob:
+        """Start generating `count` messages received by `ispb`"""
+        job = GenerationJob(ispb, count)
+        self._jobs[job.job_id] = job
+        self._trim()
+
+        task = asyncio.create_task(
+            self._run(job, bind.engine, chunk_size, min(payers, count))
+        )
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+        return job
+
+    async def shutdown(self) -> None:
+        """Cancel the running jobs and wait for their current chunk"""
+        tasks = list(self._tasks.values())
+        for job in self._jobs.values():
+            job.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    async def _run(self, job: GenerationJob, engine, chunk_size: int, payers: int):
+        job.status = GenerationJob.RUNNING
+        job._started = time.monotonic()
+        try:
+            with Session(bind=engine) as session:
+                chunks = insert_messages(
+                    session, job.requested, [job.ispb], payers, chunk_size
+                )
+                while not job._cancel.is_set():
+                    inserted = await run_in_db_executor(next, chunks, None)
+                    if inserted is None:
+                        break
+                    job.generated += inserted
+                    notification_hub.notify(job.ispb)
+            if job.generated == job.requested:
+                job.status = GenerationJob.COMPLETED
+            else:
+                job.status = GenerationJob.CANCELLED
+        except Exception as e:
+            logger.exception("Generation job %s failed", job.job_id)
+            job.status = GenerationJob.FAILED
+            job.error = str(e)
+        finally:
+            job._finished = time.monotonic()
+            self._trim()
+
+
+generation_jobs = GenerationJobs()
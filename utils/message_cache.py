@@ -0,0 +1,20 @@
+import os
+
+from cache import ByteCache, per_engine
+
+# Upper bound, in bytes, of the encoded messages kept per database
+MESSAGE_CACHE_BYTES = int(os.getenv("MESSAGE_CACHE_BYTES", 32 * 1024 * 1024))
+
+
+@per_engine
+def message_cache() -> ByteCache:
+    """
+    Encoded JSON of recently sent messages for the bind's engine, keyed by
+    endToEndId.
+
+    A message is encoded the first time it is sent and the bytes are reused
+    when it is sent again (redelivery after its stream is reaped, retries)
+    until the message is acknowledged, which evicts it. The payload reflects
+    the account holders as they were when the message was first encoded.
+    """
+    return ByteCache(MESSAGE_CACHE_BYTES)
@@ -0,0 +1,32 @@
+from typing import Any, Dict, Iterable, List
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# The message dicts built by PixMessage.serialize_by_ids and to_dict keep
+# dataHoraPagamento as a datetime; orjson writes it natively in the same ISO
+# 8601 form as datetime.isoformat(), without a Python call per message.
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Encode one message in its wire format"""
+    return orjson.dumps(message)
+
+
+def encode_fragments(fragments: List[bytes]) -> bytes:
+    """Join messages encoded by `encode_message` into a JSON array"""
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def encode_ndjson(messages: Iterable[Dict[str, Any]]) -> bytes:
+    """Encode messages as newline-delimited JSON, one message per line"""
+    return b"".join(
+        orjson.dumps(message, option=orjson.OPT_APPEND_NEWLINE) for message in messages
+    )
+
+
+class MessageResponse(ORJSONResponse):
+    """Default response class of the PIX routes, encoded with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
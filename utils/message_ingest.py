@@ -0,0 +1,173 @@
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from amounts import to_centavos
+from database import upsert_insert
+from models.account_holder import AccountHolder
+from models.api_models import PixMessageIngestItem
+from models.pix_message import PixMessage
+from utils.notification_hub import notification_hub
+from validators import invalid_document_detail, validate_documents
+
+INSERT_CHUNK_SIZE = 5000
+
+
+def _error(index: int, end_to_end_id: Any, detail: str) -> Dict[str, Any]:
+    if not isinstance(end_to_end_id, str):
+        end_to_end_id = None
+    return {"index": index, "endToEndId": end_to_end_id, "detail": detail}
+
+
+def _validation_detail(exc: ValidationError) -> str:
+    error = exc.errors()[0]
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+def split_ingest_body(body: bytes, ndjson: bool) -> List[Any]:
+    """
+    Split an ingest request body into its items without validating them:
+    the non-blank lines of an NDJSON body, still encoded, or the elements of
+    a JSON array. Lets the batch size be checked before any per-item work.
+    """
+    if ndjson:
+        return [line for line in body.splitlines() if line.strip()]
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(payload, list):
+        raise ValueError("Body must be a JSON array of messages")
+    return payload
+
+
+def _end_to_end_id(raw: Any, ndjson: bool) -> Any:
+    """endToEndId of a rejected item, decoding NDJSON lines if needed"""
+    if ndjson:
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return None
+    return raw.get("endToEndId") if isinstance(raw, dict) else None
+
+
+def parse_ingest_items(
+    items: List[Any], ndjson: bool
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Validate the items returned by `split_ingest_body`. NDJSON lines are
+    parsed and validated in one step by pydantic's JSON parser, which skips
+    building intermediate dicts. Returns the valid messages with their
+    position in the batch and the errors for the rejected ones.
+    """
+    messages: List[Tuple[int, Dict[str, Any]]] = []
+    errors: List[Dict[str, Any]] = []
+
+    for index, raw in enumerate(items):
+        try:
+            if ndjson:
+                item = PixMessageIngestItem.model_validate_json(raw)
+            else:
+                item = PixMessageIngestItem.model_validate(raw)
+        except ValidationError as e:
+            end_to_end_id = _end_to_end_id(raw, ndjson)
+            errors.append(_error(index, end_to_end_id, _validation_detail(e)))
+            continue
+        messages.append((index, item.model_dump()))
+
+    return messages, errors
+
+
+def ingest_messages(
+    db: Session, messages: Iterable[Tuple[int, Dict[str, Any]]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Store a batch of parsed messages with set-based statements and signal the
+    receivers' streams.
+
+    Account holders are upserted once per batch and messages are inserted
+    with multi-row INSERT ... ON CONFLICT DO NOTHING, so a message whose
+    endToEndId already exists is reported instead of failing the batch.
+    Returns the stored messages and the per-item errors.
+    """
+    messages = list(messages)
+    errors: List[Dict[str, Any]] = []
+    candidates: List[Tuple[int, Dict[str, Any]]] = []
+    seen = set()
+
+    valid_payers = validate_documents(m["pagador"]["cpfCnpj"] for _, m in messages)
+    valid_receivers = validate_documents(m["recebedor"]["cpfCnpj"] for _, m in messages)
+
+    for position, (index, message) in enumerate(messages):
+        end_to_end_id = message["endToEndId"]
+        if end_to_end_id in seen:
+            errors.append(_error(index, end_to_end_id, "Duplicate endToEndId in batch"))
+            continue
+        if not valid_payers[position]:
+            detail = invalid_document_detail(message["pagador"]["cpfCnpj"])
+            errors.append(_error(index, end_to_end_id, detail))
+            continue
+        if not valid_receivers[position]:
+            detail = invalid_document_detail(message["recebedor"]["cpfCnpj"])
+            errors.append(_error(index, end_to_end_id, detail))
+            continue
+        seen.add(end_to_end_id)
+        candidates.append((index, message))
+
+    if not candidates:
+        return [], errors
+
+    holder_ids = AccountHolder.bulk_create_or_update(
+        db,
+        [m["pagador"] for _, m in candidates] + [m["recebedor"] for _, m in candidates],
+    )
+
+    rows = []
+    for _, message in candidates:
+        pagador, recebedor = message["pagador"], message["recebedor"]
+        rows.append(
+            {
+                "endToEndId": message["endToEndId"],
+                "valor_centavos": to_centavos(message["valor"]),
+                "payer_id": holder_ids[(pagador["cpfCnpj"], pagador["ispb"])],
+                "receiver_id": holder_ids[(recebedor["cpfCnpj"], recebedor["ispb"])],
+                "receiver_ispb": recebedor["ispb"],
+                "campoLivre": message.get("campoLivre"),
+                "txId": message["txId"],
+                "dataHoraPagamento": message["dataHoraPagamento"],
+                "delivered": False,
+            }
+        )
+
+    stmt = (
+        upsert_insert(db, PixMessage.__table__)
+        .on_conflict_do_nothing(index_elements=["endToEndId"])
+        .returning(PixMessage.endToEndId)
+    )
+
+    connection = db.connection()
+    inserted = set()
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        inserted.update(
+            connection.execute(stmt, rows[start : start + INSERT_CHUNK_SIZE]).scalars()
+        )
+
+    db.commit()
+
+    accepted = []
+    receiver_ispbs = set()
+    for index, message in candidates:
+        if message["endToEndId"] in inserted:
+            accepted.append(message)
+            receiver_ispbs.add(message["recebedor"]["ispb"])
+        else:
+            errors.append(_error(index, message["endToEndId"], "Duplicate endToEndId"))
+
+    for ispb in receiver_ispbs:
+        notification_hub.notify(ispb)
+
+    errors.sort(key=lambda error: error["index"])
+    return accepted, errors
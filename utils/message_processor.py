@@ -1,12 +1,34 @@
-import asyncio
+import datetime
+import os
 import time
 import uuid
-from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlencode
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
 from models.pix_message import PixMessage, MessageStream
+from utils import metrics
+from utils.db_executor import run_in_db_executor
+from utils.message_cache import message_cache
+from utils.message_encoding import encode_message, encode_ndjson
+from utils.notification_hub import notification_hub
+from utils.stream_registry import stream_registry
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Seconds a poll waits for messages before answering 204
+LONG_POLL_TIMEOUT = float(os.getenv("LONG_POLL_TIMEOUT", 8))
+
+DEFAULT_BATCH_SIZE = 10
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 1000))
+# Rows fetched at a time when streaming a batch as NDJSON
+NDJSON_YIELD_PER = int(os.getenv("NDJSON_YIELD_PER", 100))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Accept media types answered with a batch of messages
+BATCH_MEDIA_TYPES = ("multipart/json", NDJSON_MEDIA_TYPE)
 
 
 class MessageProcessor:
@@ -21,23 +43,38 @@ class MessageProcessor:
         """
         Acquire a stream for a specific ISPB, enforcing the limit of 6 active streams per ISPB
         """
+        started = time.monotonic()
+        result = await run_in_db_executor(MessageProcessor._acquire_stream, ispb, db)
+        metrics.acquire_stream_seconds.observe(
+            time.monotonic() - started, "acquired" if result[0] else "rejected"
+        )
+        return result
 
-        active_streams_count = MessageStream.get_active_streams_count_by_ispb(db, ispb)
+    @staticmethod
+    def _acquire_stream(
+        ispb: str, db: Session
+    ) -> Tuple[bool, Optional[str], Optional[str]]:
+        registry = stream_registry(db.get_bind())
+        if not registry.is_loaded(ispb):
+            registry.load(ispb, MessageStream.get_active_stream_ids(db, ispb))
 
-        if active_streams_count >= 6:
+        limit = MessageStream.MAX_ACTIVE_PER_ISPB
+        stream_id = str(uuid.uuid4())
+        if not registry.reserve(ispb, stream_id, limit):
             return (
                 False,
                 None,
-                "Maximum number of active streams (6) reached for this ISPB",
+                f"Maximum number of active streams ({limit}) reached for this ISPB",
             )
 
-        stream_id = str(uuid.uuid4())
-
-        stream = MessageStream.create_stream(db, ispb, stream_id)
-        if not stream:
+        try:
+            db.add(MessageStream(stream_id=stream_id, ispb=ispb))
+            db.commit()
+        except Exception:
+            db.rollback()
+            registry.discard(stream_id)
             return False, None, "Failed to create stream"
 
-        db.commit()
         return True, stream_id, None
 
     @staticmethod
@@ -45,12 +82,22 @@ class MessageProcessor:
         ispb: str,
         stream_id: Optional[str],
         db: Session,
-        max_wait: int = 8,
+        max_wait: float = LONG_POLL_TIMEOUT,
         single_message: bool = True,
-    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        cursor: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        serialize: bool = True,
+    ) -> Tuple[List[Any], Optional[str], Optional[str]]:
         """
         Fetch messages for a specific ISPB and stream with long polling support.
-        Returns a list of messages and the stream_id for continuation.
+        A `cursor` from a previous response acknowledges the batches sent up
+        to it before polling; a batch sent after it and not acknowledged,
+        whose response the client lost, is sent again before any new
+        messages are claimed. Returns the messages, encoded as JSON, the
+        stream_id for continuation and the cursor of the returned batch.
+
+        With `serialize=False` the batch is only claimed and the list holds
+        the claimed message ids; `iter_ndjson` streams it afterwards.
         """
 
         async def get_or_create_stream_id(
@@ -69,83 +116,336 @@ class MessageProcessor:
                     )
                 return new_stream_id
 
-            stream = MessageStream.get_by_stream_id(db, stream_id)
-            if not stream:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Stream {stream_id} not found",
-                )
-            if not stream.is_active:
-                raise HTTPException(
-                    status_code=status.HTTP_410_GONE,
-                    detail=f"Stream {stream_id} is no longer active",
-                )
-            stream.update_activity(db)
-            db.commit()
+            await MessageProcessor.resume_stream(ispb, stream_id, db)
             return stream_id
 
+        dispatched_until = MessageProcessor.decode_cursor(cursor) if cursor else None
+
         stream_id = await get_or_create_stream_id(ispb, stream_id, db)
 
-        start_time = time.time()
+        if dispatched_until is not None:
+            await MessageProcessor.acknowledge_batches(stream_id, dispatched_until, db)
+
+        started = time.monotonic()
+        deadline = started + max_wait
         messages: List[Dict[str, Any]] = []
-        message_limit = 1 if single_message else 10
+        batch_cursor = None
+        message_limit = 1 if single_message else batch_size
 
-        while time.time() - start_time < max_wait:
-            query = (
-                db.query(PixMessage)
-                .filter(
-                    PixMessage.stream_id == stream_id, PixMessage.delivered == False
-                )
-                .order_by(PixMessage.dataHoraPagamento)
-                .limit(message_limit)
+        while True:
+            # Read the version before querying so a notification sent while
+            # the query runs still wakes the wait below
+            version = notification_hub.version(ispb)
+
+            messages, dispatched_at = await MessageProcessor.poll_messages(
+                ispb, stream_id, message_limit, db, serialize, dispatched_until
             )
-            messages_db = query.all()
+            if messages:
+                batch_cursor = MessageProcessor.encode_cursor(dispatched_at)
+                metrics.time_to_first_message_seconds.observe(
+                    time.monotonic() - started
+                )
+                metrics.batch_size.observe(len(messages))
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
 
-            if messages_db:
-                messages = [msg.to_dict() for msg in messages_db]
-                for msg in messages_db:
-                    msg.stream_id = stream_id
-                db.commit()
+            # Sleep until new messages are signalled for this ISPB instead of
+            # re-running the query on a timer
+            if not await notification_hub.wait(ispb, version, remaining):
                 break
 
-            await asyncio.sleep(0.5)
+        metrics.poll_wait_seconds.observe(time.monotonic() - started)
+        return messages, stream_id, batch_cursor
 
-        return messages, stream_id
+    @staticmethod
+    async def resume_stream(ispb: str, stream_id: str, db: Session) -> None:
+        """
+        Check that a stream is active and belongs to the ISPB, raising 404
+        (or 410 for a closed stream) otherwise, and record activity on it
+        """
+        registry = stream_registry(db.get_bind())
+        if registry.get_ispb(stream_id) is None:
+            await run_in_db_executor(MessageProcessor._load_stream, ispb, stream_id, db)
+        if registry.get_ispb(stream_id) != ispb:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Stream {stream_id} not found",
+            )
+        registry.touch(stream_id)
 
     @staticmethod
-    def mark_messages_delivered(stream_id: str, db: Session) -> bool:
+    def _load_stream(ispb: str, stream_id: str, db: Session) -> None:
         """
-        Mark all messages in a stream as delivered
+        Look up a stream the registry has not cached yet and cache it if it
+        is active. Only reads, so no write transaction is opened.
+        """
+        stream = MessageStream.get_by_stream_id(db, stream_id)
+        found = (stream.ispb, stream.is_active) if stream else None
+        # Ends the read-only transaction; nothing was written
+        db.commit()
+
+        if not found or found[0] != ispb:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Stream {stream_id} not found",
+            )
+        if not found[1]:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail=f"Stream {stream_id} is no longer active",
+            )
+        stream_registry(db.get_bind()).add(ispb, stream_id)
+
+    @staticmethod
+    async def poll_messages(
+        ispb: str,
+        stream_id: str,
+        message_limit: int,
+        db: Session,
+        serialize: bool = True,
+        resend_after: Optional[datetime.datetime] = None,
+    ) -> Tuple[List[Any], Optional[datetime.datetime]]:
+        return await run_in_db_executor(
+            MessageProcessor._poll_messages,
+            ispb,
+            stream_id,
+            message_limit,
+            db,
+            serialize,
+            resend_after,
+        )
+
+    @staticmethod
+    def _poll_messages(
+        ispb: str,
+        stream_id: str,
+        message_limit: int,
+        db: Session,
+        serialize: bool = True,
+        resend_after: Optional[datetime.datetime] = None,
+    ) -> Tuple[List[Any], Optional[datetime.datetime]]:
+        """
+        Claim the next batch of pending messages for a stream. Returns the
+        encoded messages (their ids without `serialize`) and the dispatch
+        time stamped on them.
+
+        With `resend_after`, the first unacknowledged batch sent after that
+        time is returned again, unchanged, instead of claiming a new one.
+        """
+        claimed = []
+        if resend_after is not None:
+            dispatched_at, claimed = PixMessage.unacknowledged_batch(
+                db, stream_id, resend_after
+            )
+            if claimed and dispatched_at.tzinfo is None:
+                dispatched_at = dispatched_at.replace(tzinfo=datetime.timezone.utc)
+        if not claimed:
+            dispatched_at = datetime.datetime.now(datetime.timezone.utc)
+            claimed = PixMessage.claim_for_stream(
+                db,
+                stream_id,
+                ispb,
+                message_limit,
+                dispatched_at=dispatched_at,
+                keys=True,
+            )
+        if not claimed:
+            db.rollback()
+            return [], None
+
+        if serialize:
+            messages = MessageProcessor._encode_claimed(claimed, db)
+        else:
+            messages = [message_id for message_id, _ in claimed]
+        db.commit()
+        return messages, dispatched_at
+
+    @staticmethod
+    def _encode_claimed(claimed: List[Tuple[int, str]], db: Session) -> List[bytes]:
+        """
+        Encoded JSON of claimed (id, endToEndId) messages, in claim order.
+        Only the messages missing from the message cache are queried and
+        encoded; they are cached for later deliveries.
+        """
+        cache = message_cache(db.get_bind())
+        encoded = {key: cache.get(key) for _, key in claimed}
+        missing = [message_id for message_id, key in claimed if encoded[key] is None]
+        for message in PixMessage.serialize_by_ids(db, missing):
+            fragment = encode_message(message)
+            cache.put(message["endToEndId"], fragment)
+            encoded[message["endToEndId"]] = fragment
+        return [encoded[key] for _, key in claimed]
+
+    @staticmethod
+    def _acknowledge(
+        stream_id: str, db: Session, dispatched_until: Optional[datetime.datetime]
+    ) -> Tuple[int, List[str]]:
+        """
+        Acknowledge messages of a stream. Returns how many were acknowledged
+        and the endToEndIds to evict from the message cache once committed;
+        while the cache is empty there is nothing to evict, so the UPDATE
+        does not return them.
+        """
+        if not len(message_cache(db.get_bind())):
+            return PixMessage.acknowledge(db, stream_id, dispatched_until), []
+        keys = PixMessage.acknowledge(db, stream_id, dispatched_until, keys=True)
+        return len(keys), keys
+
+    @staticmethod
+    def _evict(keys: List[str], db: Session) -> None:
+        cache = message_cache(db.get_bind())
+        for key in keys:
+            cache.pop(key)
+
+    @staticmethod
+    def iter_ndjson(db: Session, stream_id: str, cursor: str) -> Iterator[bytes]:
+        """
+        Encode the batch identified by `cursor` as newline-delimited JSON,
+        one message per line, sending a chunk for every NDJSON_YIELD_PER rows
+        read from the database. Runs after the route has returned, so it
+        reads through its own session.
+        """
+        dispatched_at = MessageProcessor.decode_cursor(cursor)
+        chunk: List[Dict[str, Any]] = []
+        with Session(bind=db.get_bind()) as session:
+            for message in PixMessage.iter_serialized_batch(
+                session, stream_id, dispatched_at, yield_per=NDJSON_YIELD_PER
+            ):
+                chunk.append(message)
+                if len(chunk) >= NDJSON_YIELD_PER:
+                    yield encode_ndjson(chunk)
+                    chunk = []
+        if chunk:
+            yield encode_ndjson(chunk)
+
+    @staticmethod
+    async def acknowledge_batches(
+        stream_id: str, dispatched_until: datetime.datetime, db: Session
+    ) -> int:
+        return await run_in_db_executor(
+            MessageProcessor._acknowledge_batches, stream_id, dispatched_until, db
+        )
+
+    @staticmethod
+    def _acknowledge_batches(
+        stream_id: str, dispatched_until: datetime.datetime, db: Session
+    ) -> int:
+        """
+        Mark the messages a stream was sent up to `dispatched_until` as
+        delivered, keeping the stream open
         """
         try:
-            messages = (
-                db.query(PixMessage)
-                .filter(
-                    PixMessage.stream_id == stream_id, PixMessage.delivered == False
-                )
-                .all()
+            acknowledged, keys = MessageProcessor._acknowledge(
+                stream_id, db, dispatched_until
             )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        MessageProcessor._evict(keys, db)
+        metrics.acknowledged_messages.inc(acknowledged)
+        return acknowledged
+
+    @staticmethod
+    def negotiate_batch(
+        accept: Optional[str], batch: Optional[int] = None
+    ) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Media type and number of messages per response for a request, or
+        (None, None) when it asks for single messages. Batches are requested
+        with multipart/json or application/x-ndjson; their size comes from
+        the `batch` query parameter or an Accept parameter
+        (`multipart/json; batch=100`), defaults to 10 and is capped at
+        MAX_BATCH_SIZE.
+        """
+        if batch is not None and batch < 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="batch must be a positive integer",
+            )
+
+        for media_range in (accept or "").lower().split(","):
+            media_type, *params = media_range.split(";")
+            media_type = media_type.strip()
+            if media_type not in BATCH_MEDIA_TYPES:
+                continue
+            if batch is None:
+                for param in params:
+                    name, _, value = param.partition("=")
+                    if name.strip() == "batch":
+                        value = value.strip()
+                        if not value.isdigit() or int(value) < 1:
+                            raise HTTPException(
+                                status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="batch must be a positive integer",
+                            )
+                        batch = int(value)
+            return media_type, min(batch or DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE)
+
+        return None, None
 
-            for msg in messages:
-                msg.delivered = True
+    @staticmethod
+    def encode_cursor(dispatched_at: datetime.datetime) -> str:
+        """Opaque cursor for a batch: its dispatch time in epoch microseconds"""
+        return str((dispatched_at - _EPOCH) // datetime.timedelta(microseconds=1))
 
-            stream = MessageStream.get_by_stream_id(db, stream_id)
-            if stream:
-                stream.is_active = False
+    @staticmethod
+    def decode_cursor(cursor: str) -> datetime.datetime:
+        """Dispatch time encoded in a cursor; raises 400 if it is malformed"""
+        try:
+            return _EPOCH + datetime.timedelta(microseconds=int(cursor))
+        except (ValueError, OverflowError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
 
+    @staticmethod
+    def mark_messages_delivered(stream_id: str, db: Session) -> int:
+        """
+        Mark all messages in a stream as delivered and deactivate the stream
+        in one transaction. Returns the number of acknowledged messages.
+        """
+        started = time.monotonic()
+        try:
+            acknowledged, keys = MessageProcessor._acknowledge(stream_id, db, None)
+            MessageStream.deactivate(db, stream_id)
             db.commit()
-            return True
-        except Exception as _:
+        except Exception:
             db.rollback()
-            return False
+            raise
+
+        MessageProcessor._evict(keys, db)
+        stream_registry(db.get_bind()).discard(stream_id)
+        metrics.acknowledge_seconds.observe(time.monotonic() - started)
+        metrics.acknowledged_messages.inc(acknowledged)
+        return acknowledged
 
     @staticmethod
     def format_response_headers(
-        ispb: str, stream_id: str, has_messages: bool
+        ispb: str,
+        stream_id: str,
+        has_messages: bool,
+        cursor: Optional[str] = None,
+        batch: Optional[int] = None,
     ) -> Dict[str, str]:
         """
-        Format response headers according to the API specification
+        Format response headers according to the API specification. When a
+        batch was sent, Pull-Next carries its cursor so that following it
+        acknowledges the batch; a `batch` query parameter is carried over.
         """
-        headers = {"Pull-Next": f"/api/pix/{ispb}/stream/{stream_id}"}
+        params = {}
+        if has_messages and cursor:
+            params["cursor"] = cursor
+        if batch is not None:
+            params["batch"] = batch
+
+        pull_next = f"/api/pix/{ispb}/stream/{stream_id}"
+        if params:
+            pull_next += f"?{urlencode(params)}"
+        headers = {"Pull-Next": pull_next}
 
         return headers
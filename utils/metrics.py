@@ -0,0 +1,330 @@
+import bisect
+import functools
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from models.account_holder import holder_document_cache, holder_id_cache
+from models.pix_message import MessageStream, PixMessage
+from utils.message_cache import message_cache
+
+# Prometheus text exposition format, version 0.0.4 (the response adds the
+# utf-8 charset)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base of the metric types. Samples are recorded in memory under a lock
+    and only formatted when `collect` is called by a scrape.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing value per label set"""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            labels = _labels(self.labelnames, labelvalues)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """Value per label set that is replaced as a whole with `set_all`"""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set_all(self, values: Iterable[Tuple[Tuple[str, ...], float]]) -> None:
+        values = dict(values)
+        with self._lock:
+            self._values = values
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in sorted(values):
+            labels = _labels(self.labelnames, labelvalues)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class ExternalCounter(Gauge):
+    """
+    Counter kept by another object, such as the hit counts of a cache, and
+    copied in with `set_all` when scraped
+    """
+
+    type = "counter"
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values per label set. An observation is a
+    bisect over the bucket bounds and two additions; cumulative bucket
+    counts are only computed when collected.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0]
+                self._series[labelvalues] = series
+            series[0][index] += 1
+            series[1] += value
+
+    def _samples(self):
+        with self._lock:
+            series = [
+                (labelvalues, list(counts), total)
+                for labelvalues, (counts, total) in self._series.items()
+            ]
+        names = self.labelnames + ("le",)
+        for labelvalues, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(names, labelvalues + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(float(total))}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+poll_wait_seconds = registry.register(
+    Histogram(
+        "pix_poll_wait_seconds",
+        "Time a stream poll waited before answering, with or without messages",
+        LATENCY_BUCKETS,
+    )
+)
+time_to_first_message_seconds = registry.register(
+    Histogram(
+        "pix_time_to_first_message_seconds",
+        "Time from the start of a poll to the claim of its batch",
+        LATENCY_BUCKETS,
+    )
+)
+batch_size = registry.register(
+    Histogram(
+        "pix_batch_size_messages",
+        "Messages per non-empty batch sent to a stream",
+        BATCH_SIZE_BUCKETS,
+    )
+)
+acquire_stream_seconds = registry.register(
+    Histogram(
+        "pix_acquire_stream_seconds",
+        "Time to acquire a new stream",
+        LATENCY_BUCKETS,
+        ("result",),
+    )
+)
+acknowledge_seconds = registry.register(
+    Histogram(
+        "pix_mark_delivered_seconds",
+        "Time to acknowledge the messages of a stream and close it",
+        LATENCY_BUCKETS,
+    )
+)
+acknowledged_messages = registry.register(
+    Counter(
+        "pix_acknowledged_messages_total",
+        "Messages acknowledged, by closing their stream or through a cursor",
+    )
+)
+db_query_seconds = registry.register(
+    Histogram(
+        "pix_db_query_seconds",
+        "Database statement latency by statement kind and table",
+        LATENCY_BUCKETS,
+        ("statement",),
+    )
+)
+active_streams = registry.register(
+    Gauge("pix_active_streams", "Active streams per ISPB", ("ispb",))
+)
+undelivered_messages = registry.register(
+    Gauge(
+        "pix_undelivered_messages",
+        "Undelivered messages per receiver ISPB, waiting to be claimed "
+        "(pending) or sent and not yet acknowledged (dispatched)",
+        ("ispb", "state"),
+    )
+)
+cache_hits = registry.register(
+    ExternalCounter(
+        "pix_cache_hits_total", "Lookups answered by an in-process cache", ("cache",)
+    )
+)
+cache_misses = registry.register(
+    ExternalCounter(
+        "pix_cache_misses_total", "Lookups missed by an in-process cache", ("cache",)
+    )
+)
+
+_STATEMENT_TABLE = {
+    "select": re.compile(r"\bfrom\s+\"?(\w+)", re.IGNORECASE),
+    "insert": re.compile(r"\binto\s+\"?(\w+)", re.IGNORECASE),
+    "update": re.compile(r"^\s*update\s+\"?(\w+)", re.IGNORECASE),
+    "delete": re.compile(r"\bfrom\s+\"?(\w+)", re.IGNORECASE),
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_label(statement: str) -> str:
+    """Low-cardinality label for a statement: its verb and first table"""
+    words = statement.split(None, 1)
+    if not words:
+        return "other"
+    verb = words[0].lower()
+    pattern = _STATEMENT_TABLE.get(verb)
+    match = pattern.search(statement) if pattern else None
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        db_query_seconds.observe(
+            time.perf_counter() - started, statement_label(statement)
+        )
+
+
+def instrument_engine(engine) -> None:
+    """Record the latency of every statement run on the engine"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def refresh_database_gauges(session: Session) -> None:
+    """Read the stream and backlog gauges from the database"""
+    active_streams.set_all(
+        ((ispb,), count) for ispb, count in MessageStream.count_active_by_ispb(session)
+    )
+    undelivered_messages.set_all(
+        ((ispb, state), count)
+        for ispb, state, count in PixMessage.count_undelivered_by_ispb(session)
+    )
+    session.commit()
+
+
+def in_process_caches(bind) -> Dict[str, LRUCache]:
+    """The in-process caches of the bind's engine, by name"""
+    return {
+        "holder_documents": holder_document_cache(bind),
+        "holder_ids": holder_id_cache(bind),
+        "messages": message_cache(bind),
+    }
+
+
+def refresh_cache_counters(bind) -> None:
+    """Copy the hit and miss counts of the in-process caches"""
+    caches = in_process_caches(bind).items()
+    cache_hits.set_all(((name,), cache.hits) for name, cache in caches)
+    cache_misses.set_all(((name,), cache.misses) for name, cache in caches)
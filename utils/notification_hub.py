@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+class NotificationBackend(ABC):
+    """
+    Transport used by the NotificationHub to fan out "new messages" signals.
+
+    A backend receives the hub's listener in `start` and must call it with the
+    ISPB of every notification it sees, including the ones published by this
+    process. Backends spanning several nodes (Redis pub/sub, Postgres
+    LISTEN/NOTIFY, ...) must implement `start` and `publish`, and `stop` if
+    they hold resources.
+    """
+
+    @abstractmethod
+    def start(self, listener: Callable[[str], None]) -> None:
+        ...
+
+    @abstractmethod
+    def publish(self, ispb: str) -> None:
+        ...
+
+    def stop(self) -> None:
+        pass
+
+
+class InMemoryNotificationBackend(NotificationBackend):
+    """
+    Backend that delivers notifications to the current process only
+    """
+
+    def __init__(self):
+        self._listener: Optional[Callable[[str], None]] = None
+
+    def start(self, listener: Callable[[str], None]) -> None:
+        self._listener = listener
+
+    def publish(self, ispb: str) -> None:
+        if self._listener:
+            self._listener(ispb)
+
+    def stop(self) -> None:
+        self._listener = None
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class NotificationHub:
+    """
+    Wakes long-polling consumers when new messages are available for an ISPB.
+
+    Every ISPB has a version counter that is bumped on each notification.
+    Pollers read the version before querying the database and then wait for
+    it to change, so a notification sent between the query and the wait is
+    never lost. `notify` is thread-safe and may be called from outside the
+    event loop.
+    """
+
+    def __init__(self, backend: Optional[NotificationBackend] = None):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._waiters: Dict[
+            str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]
+        ] = defaultdict(set)
+        self._backend: Optional[NotificationBackend] = None
+        self.set_backend(backend or InMemoryNotificationBackend())
+
+    def set_backend(self, backend: NotificationBackend) -> None:
+        """Replace the transport used to publish notifications"""
+        if self._backend:
+            self._backend.stop()
+        self._backend = backend
+        backend.start(self._deliver)
+
+    def version(self, ispb: str) -> int:
+        """Current notification version for an ISPB"""
+        with self._lock:
+            return self._versions.get(ispb, 0)
+
+    def notify(self, ispb: str) -> None:
+        """Signal that new messages are available for an ISPB"""
+        self._backend.publish(ispb)
+
+    def _deliver(self, ispb: str) -> None:
+        with self._lock:
+            self._versions[ispb] += 1
+            waiters = self._waiters.pop(ispb, set())
+
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's event loop has already been closed
+                pass
+
+    async def wait(self, ispb: str, version: int, timeout: float) -> bool:
+        """
+        Wait until the ISPB version differs from `version` or the timeout expires.
+        Returns True if a notification arrived, False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+
+        with self._lock:
+            if self._versions.get(ispb, 0) != version:
+                return True
+            self._waiters[ispb].add(waiter)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(ispb)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[ispb]
+
+
+notification_hub = NotificationHub()
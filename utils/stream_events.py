@@ -0,0 +1,85 @@
+import datetime
+import os
+import time
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.orm import Session
+
+from utils import metrics
+from utils.message_processor import MessageProcessor
+from utils.notification_hub import notification_hub
+from utils.stream_registry import stream_registry
+
+# Seconds without messages after which a comment is sent to keep proxies
+# from closing the connection
+STREAM_EVENTS_HEARTBEAT = float(os.getenv("STREAM_EVENTS_HEARTBEAT", 15))
+# Seconds after which the server closes an event stream; clients reconnect
+# with Last-Event-ID, which also acknowledges what they received
+STREAM_EVENTS_MAX_DURATION = float(os.getenv("STREAM_EVENTS_MAX_DURATION", 300))
+# Milliseconds clients wait before reconnecting
+STREAM_EVENTS_RETRY_MS = int(os.getenv("STREAM_EVENTS_RETRY_MS", 1000))
+
+
+def format_event(message: bytes, event_id: Optional[str] = None) -> str:
+    """Format one encoded message as a Server-Sent Event"""
+    data = message.decode("utf-8")
+    if event_id:
+        return f"event: message\nid: {event_id}\ndata: {data}\n\n"
+    return f"event: message\ndata: {data}\n\n"
+
+
+async def iter_stream_events(
+    ispb: str,
+    stream_id: str,
+    db: Session,
+    batch_size: int,
+    resend_after: Optional[datetime.datetime] = None,
+) -> AsyncIterator[str]:
+    """
+    Push the messages of a stream as Server-Sent Events for as long as the
+    stream is active.
+
+    Batches are claimed as soon as the notification hub signals new messages
+    for the ISPB, so the connection replaces the long-poll loop. Every
+    message is one `message` event; the last event of a batch carries the
+    batch cursor as its id, so Last-Event-ID always names a batch that was
+    received in full. The event stream ends when the stream is terminated
+    (DELETE), reaped, or after STREAM_EVENTS_MAX_DURATION seconds.
+
+    With `resend_after` (the Last-Event-ID the client reconnected with),
+    batches sent after it and not acknowledged are pushed again first.
+
+    Runs after the route has returned, so it works on its own session.
+    """
+    registry = stream_registry(db.get_bind())
+    deadline = time.monotonic() + STREAM_EVENTS_MAX_DURATION
+
+    yield f"retry: {STREAM_EVENTS_RETRY_MS}\n\n"
+
+    with Session(bind=db.get_bind()) as session:
+        while (
+            registry.get_ispb(stream_id) == ispb and time.monotonic() < deadline
+        ):
+            registry.touch(stream_id)
+            version = notification_hub.version(ispb)
+
+            messages, dispatched_at = await MessageProcessor.poll_messages(
+                ispb, stream_id, batch_size, session, resend_after=resend_after
+            )
+            if messages:
+                if resend_after is not None:
+                    resend_after = dispatched_at
+                metrics.batch_size.observe(len(messages))
+                cursor = MessageProcessor.encode_cursor(dispatched_at)
+                last = len(messages) - 1
+                yield "".join(
+                    format_event(message, cursor if n == last else None)
+                    for n, message in enumerate(messages)
+                )
+                continue
+
+            remaining = deadline - time.monotonic()
+            if not await notification_hub.wait(
+                ispb, version, max(0, min(remaining, STREAM_EVENTS_HEARTBEAT))
+            ):
+                yield ": keep-alive\n\n"
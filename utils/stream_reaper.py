@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+import logging
+import os
+from typing import List, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.pix_message import MessageStream, PixMessage
+from utils.db_executor import run_in_db_executor
+from utils.notification_hub import notification_hub
+from utils.stream_registry import stream_registry
+
+# Seconds without a poll after which a stream is considered abandoned
+STREAM_IDLE_TIMEOUT = float(os.getenv("STREAM_IDLE_TIMEOUT", 300))
+# Seconds between reaper runs
+STREAM_REAPER_INTERVAL = float(os.getenv("STREAM_REAPER_INTERVAL", 30))
+
+logger = logging.getLogger(__name__)
+
+
+def reap_idle_streams(
+    session: Session, idle_timeout: float = STREAM_IDLE_TIMEOUT
+) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Deactivate the streams idle for longer than `idle_timeout` seconds and
+    put their unacknowledged messages back in the pending pool.
+
+    Activity recorded in the stream registry is written first so streams
+    that are still polling are not reaped. Both UPDATEs go through partial
+    indexes, so a run costs O(idle streams + released messages) whatever
+    the size of the tables. Returns the reaped (stream_id, ispb) pairs and
+    the number of released messages.
+    """
+    registry = stream_registry(session.get_bind())
+    registry.flush(session)
+
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        seconds=idle_timeout
+    )
+    try:
+        reaped = MessageStream.deactivate_idle_streams(session, cutoff)
+        released = PixMessage.release_streams(
+            session, [stream_id for stream_id, _ in reaped]
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    for stream_id, _ in reaped:
+        registry.discard(stream_id)
+    if released:
+        for ispb in {ispb for _, ispb in reaped}:
+            notification_hub.notify(ispb)
+
+    return reaped, released
+
+
+def reap_all(idle_timeout: float = STREAM_IDLE_TIMEOUT) -> int:
+    """Reap the idle streams of every database with a stream registry"""
+    reaped = 0
+    for engine, _ in stream_registry.items():
+        with Session(bind=engine) as session:
+            reaped += len(reap_idle_streams(session, idle_timeout)[0])
+    return reaped
+
+
+async def run_stream_reaper(
+    interval: float = STREAM_REAPER_INTERVAL,
+    idle_timeout: float = STREAM_IDLE_TIMEOUT,
+):
+    """Reap idle streams every `interval` seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_db_executor(reap_all, idle_timeout)
+        except Exception:
+            logger.exception("Failed to reap idle streams")
@@ -0,0 +1,164 @@
+import asyncio
+import datetime
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from cache import per_engine
+from models.pix_message import MessageStream
+from utils.db_executor import run_in_db_executor
+
+STREAM_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("STREAM_ACTIVITY_FLUSH_INTERVAL", 5))
+
+logger = logging.getLogger(__name__)
+
+
+class StreamRegistry:
+    """
+    In-process view of the active streams of one database.
+
+    Continue-polls validate their stream and record activity here instead of
+    reading and updating `message_streams`; the recorded `last_active` times
+    are written back in batches by `flush`. The active streams of an ISPB are
+    loaded from the database the first time the ISPB starts a stream, and
+    from then on the stream limit is checked against the in-memory count.
+    Streams the registry has not seen (created before a restart, or by
+    another process) are looked up in the database once and then cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Active stream_id -> ISPB
+        self._streams: Dict[str, str] = {}
+        # Active stream ids of the ISPBs whose streams have been fully loaded
+        self._by_ispb: Dict[str, Set[str]] = {}
+        # stream_id -> last activity not yet written to the database
+        self._activity: Dict[str, datetime.datetime] = {}
+
+    def get_ispb(self, stream_id: str) -> Optional[str]:
+        """ISPB of an active stream, or None when the stream is not cached"""
+        return self._streams.get(stream_id)
+
+    def touch(self, stream_id: str) -> None:
+        """Record activity on an active stream"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            if stream_id in self._streams:
+                self._activity[stream_id] = now
+
+    def add(self, ispb: str, stream_id: str) -> None:
+        """Cache a stream known to be active in the database"""
+        with self._lock:
+            self._streams[stream_id] = ispb
+            if ispb in self._by_ispb:
+                self._by_ispb[ispb].add(stream_id)
+
+    def is_loaded(self, ispb: str) -> bool:
+        return ispb in self._by_ispb
+
+    def load(self, ispb: str, stream_ids: Iterable[str]) -> None:
+        """Seed the active streams of an ISPB, unless already loaded"""
+        with self._lock:
+            if ispb in self._by_ispb:
+                return
+            self._by_ispb[ispb] = set(stream_ids)
+            for stream_id in self._by_ispb[ispb]:
+                self._streams[stream_id] = ispb
+
+    def active_count(self, ispb: str) -> int:
+        return len(self._by_ispb.get(ispb, ()))
+
+    def reserve(self, ispb: str, stream_id: str, limit: int) -> bool:
+        """
+        Take one of the ISPB's stream slots for a new stream. The ISPB must
+        be loaded. Returns False when all slots are taken.
+        """
+        with self._lock:
+            active = self._by_ispb[ispb]
+            if len(active) >= limit:
+                return False
+            active.add(stream_id)
+            self._streams[stream_id] = ispb
+            return True
+
+    def discard(self, stream_id: str) -> None:
+        """Forget a stream that was terminated, reaped or never created"""
+        with self._lock:
+            ispb = self._streams.pop(stream_id, None)
+            if ispb is not None and ispb in self._by_ispb:
+                self._by_ispb[ispb].discard(stream_id)
+            self._activity.pop(stream_id, None)
+
+    def flush(self, session: Session) -> int:
+        """
+        Write the pending `last_active` times with one batched UPDATE and
+        return the number of streams written. Inactive rows are left alone.
+        On failure the activity is kept for the next flush.
+        """
+        with self._lock:
+            pending, self._activity = self._activity, {}
+        if not pending:
+            return 0
+
+        table = MessageStream.__table__
+        stmt = (
+            update(table)
+            .where(table.c.stream_id == bindparam("b_stream_id"), table.c.is_active)
+            .values(last_active=bindparam("b_last_active"))
+        )
+        try:
+            session.connection().execute(
+                stmt,
+                [
+                    {"b_stream_id": stream_id, "b_last_active": last_active}
+                    for stream_id, last_active in pending.items()
+                ],
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            with self._lock:
+                for stream_id, last_active in pending.items():
+                    if stream_id in self._streams:
+                        self._activity.setdefault(stream_id, last_active)
+            raise
+        return len(pending)
+
+
+@per_engine
+def stream_registry() -> StreamRegistry:
+    """Stream registry of the bind's engine"""
+    return StreamRegistry()
+
+
+def flush_stream_activity() -> int:
+    """Write back the pending activity of every registry"""
+    written = 0
+    for engine, registry in stream_registry.items():
+        with Session(bind=engine) as session:
+            written += registry.flush(session)
+    return written
+
+
+async def _writeback() -> None:
+    try:
+        await run_in_db_executor(flush_stream_activity)
+    except Exception:
+        logger.exception("Failed to write back stream activity")
+
+
+async def run_activity_writeback(interval: float = STREAM_ACTIVITY_FLUSH_INTERVAL):
+    """
+    Flush stream activity every `interval` seconds until cancelled, then
+    one last time
+    """
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await _writeback()
+    finally:
+        await _writeback()
@@ -6,8 +6,7 @@ from typing import List, Dict, Any, Optional
 
 from sqlalchemy.orm import Session
 
-from models.account_holder import AccountHolder
-from models.pix_message import PixMessage
+from utils.message_ingest import ingest_messages
 
 faker_br = Faker("pt_BR")
 
@@ -90,7 +89,7 @@ def generate_random_pix_message(receiver_ispb: Optional[str] = None) -> Dict[str
     pagador_data = generate_random_account_holder()
     recebedor_data = generate_random_account_holder(receiver_ispb)
 
-    valor = round(random.uniform(1.0, 10000.0), 2)
+    valor = random.randint(100, 1000000) / 100
     end_to_end_id = str(uuid.uuid4())
     tx_id = str(uuid.uuid4())[:30]
 
@@ -122,31 +121,10 @@ def create_test_messages(ispb: str, count: int, db: Session) -> List[Dict[str, A
     """
     Create multiple test PIX messages and save them to the database
     """
-    created_messages = []
+    messages = [generate_random_pix_message(receiver_ispb=ispb) for _ in range(count)]
 
-    for _ in range(count):
-        message_data = generate_random_pix_message(receiver_ispb=ispb)
-
-        pagador = AccountHolder.create_or_update(db, message_data["pagador"])
-        db.flush()
-
-        recebedor = AccountHolder.create_or_update(db, message_data["recebedor"])
-        db.flush()
-
-        pix_message = PixMessage(
-            endToEndId=message_data["endToEndId"],
-            valor=message_data["valor"],
-            payer_id=pagador.id,
-            receiver_id=recebedor.id,
-            campoLivre=message_data["campoLivre"],
-            txId=message_data["txId"],
-            dataHoraPagamento=message_data["dataHoraPagamento"],
-            delivered=False,
-        )
-
-        db.add(pix_message)
-        created_messages.append(message_data)
-
-    db.commit()
+    created_messages, errors = ingest_messages(db, enumerate(messages))
+    if errors:
+        raise ValueError(errors[0]["detail"])
 
     return created_messages
@@ -0,0 +1,128 @@
+import functools
+import os
+from typing import Iterable
+
+import numpy as np
+
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", 65536))
+
+CPF_LENGTH = 11
+CNPJ_LENGTH = 14
+
+_CPF_WEIGHTS = (tuple(range(10, 1, -1)), tuple(range(11, 1, -1)))
+_CNPJ_WEIGHTS = (
+    (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+    (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+)
+
+
+def _cpf_check_digit(total):
+    return total * 10 % 11 % 10
+
+
+def _cnpj_check_digit(total):
+    remainder = total % 11
+    return 0 if remainder < 2 else 11 - remainder
+
+
+_RULES = {
+    CPF_LENGTH: (_CPF_WEIGHTS, _cpf_check_digit),
+    CNPJ_LENGTH: (_CNPJ_WEIGHTS, _cnpj_check_digit),
+}
+
+
+def _is_valid(document, length):
+    if len(document) != length or not (document.isascii() and document.isdigit()):
+        return False
+    if document.count(document[0]) == length:
+        return False
+    digits = [ord(char) - 48 for char in document]
+    (first_weights, second_weights), check_digit = _RULES[length]
+    first = check_digit(sum(d * w for d, w in zip(digits, first_weights)))
+    second = check_digit(sum(d * w for d, w in zip(digits, second_weights)))
+    return digits[-2] == first and digits[-1] == second
+
+
+def is_valid_cpf(cpf: str) -> bool:
+    """Check an unformatted CPF (11 digits) against its check digits"""
+    return _is_valid(cpf, CPF_LENGTH)
+
+
+def is_valid_cnpj(cnpj: str) -> bool:
+    """Check an unformatted CNPJ (14 digits) against its check digits"""
+    return _is_valid(cnpj, CNPJ_LENGTH)
+
+
+@functools.lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def is_valid_document(cpfCnpj: str) -> bool:
+    """Check a CPF or CNPJ, picked by length; results are memoized"""
+    return len(cpfCnpj) in _RULES and _is_valid(cpfCnpj, len(cpfCnpj))
+
+
+def invalid_document_detail(cpfCnpj: str) -> str:
+    """Reason why cpfCnpj, already known to be invalid, was rejected"""
+    if len(cpfCnpj) == CPF_LENGTH:
+        return "Invalid CPF"
+    if len(cpfCnpj) == CNPJ_LENGTH:
+        return "Invalid CNPJ"
+    return "cpfCnpj must be either 11 (CPF) or 14 (CNPJ) digits"
+
+
+def validate_document(cpfCnpj: str) -> None:
+    """Raise ValueError unless cpfCnpj is a valid CPF or CNPJ"""
+    if not is_valid_document(cpfCnpj):
+        raise ValueError(invalid_document_detail(cpfCnpj))
+
+
+def check_digits(base: np.ndarray, length: int) -> np.ndarray:
+    """
+    Complete a matrix of CPF (length 11) or CNPJ (length 14) base digits,
+    one document per row without its two check digits, with both check
+    digits computed by one matrix product each.
+    """
+    (first_weights, second_weights), _ = _RULES[length]
+    digits = np.empty((base.shape[0], length), dtype=np.int32)
+    digits[:, : length - 2] = base
+    for position, weights in (
+        (length - 2, first_weights),
+        (length - 1, second_weights),
+    ):
+        total = digits[:, :position] @ np.array(weights, dtype=np.int32)
+        if length == CPF_LENGTH:
+            digits[:, position] = total * 10 % 11 % 10
+        else:
+            remainder = total % 11
+            digits[:, position] = np.where(remainder < 2, 0, 11 - remainder)
+    return digits
+
+
+def validate_documents(documents: Iterable[str]) -> np.ndarray:
+    """
+    Check many CPFs/CNPJs at once and return a boolean array aligned with
+    the input. Documents of each kind are decoded into a digit matrix and
+    their check digits are recomputed with `check_digits`.
+    """
+    documents = list(documents)
+    result = np.zeros(len(documents), dtype=bool)
+
+    for length in _RULES:
+        positions = [
+            i
+            for i, document in enumerate(documents)
+            if len(document) == length and document.isascii()
+        ]
+        if not positions:
+            continue
+
+        raw = "".join(documents[i] for i in positions).encode("ascii")
+        digits = np.frombuffer(raw, dtype=np.uint8).reshape(-1, length).astype(np.int32)
+        digits -= 48
+
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        valid &= (digits != digits[:, :1]).any(axis=1)
+
+        expected = check_digits(np.clip(digits[:, : length - 2], 0, 9), length)
+        valid &= (digits[:, -2:] == expected[:, -2:]).all(axis=1)
+        result[positions] = valid
+
+    return result